@@ -0,0 +1,99 @@
+"""
+Аналитика истории курсов: полный расчёт баров против достройки кеша.
+
+Пишет --points точек пары (вперемешку с точками второй пары, как их
+пишет RatesUpdater), считает бары с нуля, затем дописывает --append
+точек и достраивает кеш. Бары из кеша сверяются с расчётом с нуля,
+пик памяти конвейера — через tracemalloc (история целиком в память
+не загружается).
+
+    python -m benchmarks.bench_analytics --points 1000000 --append 10000
+"""
+import argparse
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.suite import _configure
+
+PAIR = "BTC_USD"
+
+
+def _write_history(storage, start_ts: float, points: int, rng) -> float:
+    """Точки раз в ~10 с, пачками по 10 000 записей; возвращает время последней"""
+    ts = start_ts
+    for lo in range(0, points, 10000):
+        n = min(10000, points - lo)
+        stamps = ts + np.cumsum(rng.uniform(5, 15, n))
+        rates = 60000 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+        records = []
+        for t, rate in zip(stamps.tolist(), rates.tolist()):
+            moment = datetime.fromtimestamp(t, timezone.utc).isoformat()
+            records.append({"from_currency": "BTC", "to_currency": "USD", "rate": rate, "updated_at": moment})
+            records.append({"from_currency": "ETH", "to_currency": "USD", "rate": rate / 20, "updated_at": moment})
+        storage.save_history_batch(records)
+        ts = stamps[-1]
+    return ts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк баров и индикаторов по истории курсов")
+    parser.add_argument("--points", type=int, default=1000000, help="Точек пары в истории")
+    parser.add_argument("--append", type=int, default=10000, help="Точек, дописанных после расчёта")
+    parser.add_argument("--interval", default="1h")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="valutatrade-analytics-")
+    try:
+        _configure(data_dir, "json")
+        from valutatrade_hub.parser_service.analytics import BarCache, analyze, collect_bars, parse_interval
+        from valutatrade_hub.parser_service.history import RateHistory
+        from valutatrade_hub.parser_service.storage import RatesStorage
+
+        rng = np.random.default_rng(42)
+        storage = RatesStorage()
+        last_ts = _write_history(storage, 1_700_000_000.0, args.points, rng)
+        history = RateHistory(storage)
+        began = time.perf_counter()
+        history.refresh_index()
+        print(f"история: {args.points} точек {PAIR}, индексация {time.perf_counter() - began:.2f} c")
+
+        interval = parse_interval(args.interval)
+        cache = BarCache(history)
+        began = time.perf_counter()
+        bars = cache.bars(PAIR, interval)
+        full_s = time.perf_counter() - began
+        # память — отдельным проходом: tracemalloc замедляет каждое выделение
+        tracemalloc.start()
+        collect_bars(history.iter_points(PAIR), interval)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"бары {args.interval} с нуля: {full_s:.2f} c, баров {len(bars)}, пик памяти {peak / 2 ** 20:.1f} МБ")
+
+        _write_history(storage, last_ts, args.append, rng)
+        history.refresh_index()  # индексация новых точек — общая с rate-history, не часть кеша баров
+        began = time.perf_counter()
+        bars = cache.bars(PAIR, interval)
+        extend_s = time.perf_counter() - began
+        print(f"достройка кеша на {args.append} точек: {extend_s * 1e3:.0f} мс (в {full_s / extend_s:.0f} раз быстрее)")
+
+        began = time.perf_counter()
+        result = analyze(PAIR, args.interval, cache=cache)
+        print(f"SMA/EMA/волатильность по {len(bars)} барам из кеша: {(time.perf_counter() - began) * 1e3:.0f} мс")
+
+        expected = collect_bars(history.iter_points(PAIR), interval)
+        ok = np.array_equal(bars, expected) and len(result["bars"]) == len(bars)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print("бары из кеша: OK" if ok else "бары из кеша: НЕ СХОДЯТСЯ")
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Арифметика балансов: float против decimal.Decimal против целых минимальных единиц.
+
+Один и тот же поток сделок (суммы с 8 знаками, пополнения и снятия)
+проводится по трём представлениям баланса. Суммы разбираются из строк
+заранее — меряется только горячий путь сделки. Дополнительно меряется
+Wallet.deposit_units/withdraw_units из core.models и полный
+Wallet.deposit(float) с переводом суммы в единицы.
+
+    python -m benchmarks.bench_fixed_point --trades 1000000
+"""
+import argparse
+import random
+import time
+from decimal import Decimal
+
+from valutatrade_hub.core.currencies import format_minor, to_minor
+from valutatrade_hub.core.models import Wallet
+
+PRECISION = 8
+
+
+def _amounts(trades: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    # знак: пополнение или снятие; суммы вида 0.00012345
+    return [f"{rng.choice('+-')}{rng.randint(1, 10 ** 6) / 10 ** PRECISION:.{PRECISION}f}" for _ in range(trades)]
+
+
+def _run(values, zero):
+    balance = zero
+    began = time.perf_counter()
+    for v in values:
+        if v > zero or balance >= -v:
+            balance += v
+    return time.perf_counter() - began, balance
+
+
+def _run_wallet(units):
+    wallet = Wallet("BTC", units=0)
+    began = time.perf_counter()
+    for u in units:
+        if u > 0:
+            wallet.deposit_units(u)
+        elif wallet.units >= -u:
+            wallet.withdraw_units(-u)
+    return time.perf_counter() - began, wallet
+
+
+def main():
+    parser = argparse.ArgumentParser(description="float vs Decimal vs fixed-point для балансов")
+    parser.add_argument("--trades", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    raw = _amounts(args.trades)
+    floats = [float(a) for a in raw]
+    decimals = [Decimal(a) for a in raw]
+    units = [to_minor(a, PRECISION) for a in raw]
+
+    t_float, b_float = _run(floats, 0.0)
+    t_dec, b_dec = _run(decimals, Decimal(0))
+    t_int, b_int = _run(units, 0)
+    t_wallet, wallet = _run_wallet(units)
+
+    sample = floats[: min(len(floats), 100_000)]
+    began = time.perf_counter()
+    deposit_wallet = Wallet("BTC")
+    for f in sample:
+        deposit_wallet.deposit(abs(f))
+    t_deposit = (time.perf_counter() - began) / len(sample)
+
+    exact = format_minor(b_int, PRECISION)
+    print(f"{args.trades} сделок, точный итог {exact} BTC")
+    print(f"{'float':>22}: {t_float:6.3f} c  итог {b_float!r}  {'точно' if repr(b_float) == exact else 'ОШИБКА ОКРУГЛЕНИЯ'}")
+    print(f"{'Decimal':>22}: {t_dec:6.3f} c  итог {b_dec}  {'точно' if b_dec == Decimal(exact) else 'неточно'}")
+    print(f"{'int (мин. единицы)':>22}: {t_int:6.3f} c  итог {exact}  точно")
+    print(f"{'Wallet.*_units':>22}: {t_wallet:6.3f} c  итог {format_minor(wallet.units, PRECISION)}")
+    print(f"Wallet.deposit(float) с переводом суммы: {t_deposit * 1e6:.2f} мкс/операция")
+    print(f"fixed-point быстрее Decimal в {t_dec / t_int:.1f} раза")
+
+
+if __name__ == "__main__":
+    main()
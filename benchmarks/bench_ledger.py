@@ -0,0 +1,103 @@
+"""
+Балансы на момент времени: контрольная точка + хвост журнала против
+полного проигрывания журнала операций.
+
+Генерирует данные, проводит --orders ордеров партиями по --batch
+(каждая партия — одна проводка в журнал), запоминая моменты между
+партиями, и для нескольких моментов сравнивает Ledger.balances_at()
+с проигрыванием всего журнала от нулевой контрольной точки. Результаты
+обоих способов должны совпасть; на последнем моменте они же должны
+совпасть с портфелями в хранилище.
+
+    python -m benchmarks.bench_ledger --users 10000 --orders 200000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks import datagen
+from benchmarks.bench_orders import _write_orders
+from benchmarks.suite import _configure
+
+
+def _full_replay(ledger, moment: str) -> dict:
+    """Балансы проигрыванием журнала целиком от нулевой контрольной точки"""
+    genesis = ledger.checkpoints()[0]
+    balances = ledger.load_checkpoint(genesis)
+    for entry in ledger.read(tuple(genesis["position"])):
+        if entry["ts"] > moment:
+            break
+        wallets = balances.setdefault(entry["user_id"], {})
+        for code, delta in entry["legs"].items():
+            wallets[code] = wallets.get(code, 0) + delta
+    return balances
+
+
+def _nonzero(balances: dict) -> dict:
+    balances = {uid: {c: v for c, v in w.items() if v} for uid, w in balances.items()}
+    return {uid: w for uid, w in balances.items() if w}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк балансов на момент времени по журналу операций")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--batch", type=int, default=5000, help="Ордеров в одной партии")
+    parser.add_argument("--engine", choices=["json", "sqlite"], default="json")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="valutatrade-ledger-")
+    try:
+        datagen.generate(data_dir, users=args.users, history=0, fund_usd=1_000_000)
+        orders_file = os.path.join(data_dir, "orders.csv")
+        _write_orders(orders_file, args.users, args.orders)
+        _configure(data_dir, args.engine)
+
+        from valutatrade_hub.core import usecases
+        from valutatrade_hub.core.currencies import record_units
+        from valutatrade_hub.core.trading import load_orders
+        ledger = usecases._storage().ledger
+
+        orders = load_orders(orders_file)
+        moments = []
+        began = time.perf_counter()
+        for start in range(0, len(orders), args.batch):
+            usecases.execute_orders(orders[start:start + args.batch])
+            moments.append(datetime.now(timezone.utc).isoformat())
+        posting_s = time.perf_counter() - began
+
+        size = sum(os.path.getsize(ledger.segment_path(n)) for n in ledger.segments())
+        print(f"engine={args.engine} users={args.users} orders={len(orders)}")
+        print(f"проводка: {posting_s:.2f} c; журнал {size / 2 ** 20:.1f} МБ, "
+              f"сегментов {len(ledger.segments())}, контрольных точек {len(ledger.checkpoints())}")
+
+        ok = True
+        for moment in (moments[len(moments) // 4], moments[len(moments) // 2], moments[-1]):
+            began = time.perf_counter()
+            point = ledger.balances_at(moment)
+            point_s = time.perf_counter() - began
+            began = time.perf_counter()
+            replay = _full_replay(ledger, moment)
+            replay_s = time.perf_counter() - began
+            ok &= _nonzero(point) == _nonzero(replay)
+            print(f"{moment}: точка + хвост {point_s * 1e3:.0f} мс, полное проигрывание {replay_s * 1e3:.0f} мс "
+                  f"(в {replay_s / point_s:.1f} раза медленнее)")
+
+        stored = {
+            p["user_id"]: {code: record_units(code, info) for code, info in p["wallets"].items()}
+            for p in usecases._storage().load_portfolios()
+        }
+        ok &= _nonzero(point) == _nonzero(stored)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print("балансы по журналу: OK" if ok else "балансы по журналу: НЕ СХОДЯТСЯ")
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
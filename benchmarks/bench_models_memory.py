@@ -0,0 +1,87 @@
+"""
+Память и время построения доменных моделей: __slots__ против __dict__.
+
+Строит портфели (User + Portfolio + Wallet'ы) для заданного числа
+кошельков дважды: текущими классами из core.models (__slots__, общий
+объект строки кода валюты) и их копиями без __slots__ и без интернирования
+(как было раньше), и сравнивает пик tracemalloc и время.
+
+    python -m benchmarks.bench_models_memory --wallets 1000000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from valutatrade_hub.core.models import Portfolio, User, Wallet
+
+CODES = ("USD", "EUR", "BTC", "ETH", "RUB", "GBP", "SOL", "JPY")
+
+
+def _unslotted(cls, **overrides):
+    """Копия класса без __slots__: атрибуты экземпляра снова живут в __dict__"""
+    namespace = {
+        name: value for name, value in vars(cls).items()
+        if name not in ("__slots__", "__dict__", "__weakref__") and name not in cls.__slots__
+    }
+    namespace.update(overrides)
+    return type(cls.__name__, (), namespace)
+
+
+def _legacy_wallet_init(self, currency_code: str, balance: float = 0.0):
+    # прежний конструктор: своя строка кода у каждого кошелька
+    self.currency_code = currency_code.upper()
+    self._balance = balance
+
+
+def _build(user_cls, portfolio_cls, wallet_cls, users: int, per_user: int) -> list:
+    portfolios = []
+    for uid in range(1, users + 1):
+        user = user_cls.__new__(user_cls)
+        # хеширование пароля в замер не входит
+        user._user_id, user._username, user._salt = uid, f"user{uid}", "salt"
+        user._hashed_password, user._registration_date = "", "2026-01-01T00:00:00"
+        wallets = {code: wallet_cls(code, float(uid)) for code in CODES[:per_user]}
+        portfolios.append(portfolio_cls(user, wallets, 0))
+    return portfolios
+
+
+def measure(classes, users: int, per_user: int) -> tuple:
+    """(пик памяти в байтах, время построения в секундах); время — без tracemalloc"""
+    gc.collect()
+    began = time.perf_counter()
+    portfolios = _build(*classes, users, per_user)
+    elapsed = time.perf_counter() - began
+    del portfolios
+    gc.collect()
+
+    tracemalloc.start()
+    portfolios = _build(*classes, users, per_user)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del portfolios
+    return peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Память доменных моделей: __slots__ против __dict__")
+    parser.add_argument("--wallets", type=int, default=1_000_000, help="Всего кошельков")
+    parser.add_argument("--per-user", type=int, default=4, choices=range(1, len(CODES) + 1))
+    args = parser.parse_args()
+    users = args.wallets // args.per_user
+
+    slotted = (User, Portfolio, Wallet)
+    legacy = (_unslotted(User), _unslotted(Portfolio), _unslotted(Wallet, __init__=_legacy_wallet_init))
+
+    print(f"{users} пользователей × {args.per_user} кошелька = {users * args.per_user} кошельков")
+    results = {}
+    for name, classes in (("__dict__", legacy), ("__slots__", slotted)):
+        peak, elapsed = measure(classes, users, args.per_user)
+        results[name] = peak
+        print(f"{name:>10}: {peak / 2 ** 20:8.1f} MiB  {elapsed:6.2f} c  "
+              f"{peak / (users * args.per_user):6.0f} байт/кошелёк")
+    print(f"экономия памяти: {1 - results['__slots__'] / results['__dict__']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Пропускная способность исполнения ордеров.
+
+Генерирует данные (у каждого пользователя есть USD), файл из --orders
+случайных ордеров buy/sell и исполняет его партией через execute_orders:
+одно чтение портфелей и одна групповая запись. Для сравнения часть
+ордеров проводится по одному через buy_currency/sell_currency (полный
+цикл чтение-запись портфеля на каждый ордер).
+
+После партии проверяется баланс системы: по каждой валюте сумма
+в хранилище равна исходной плюс зачисления минус списания исполненных
+ордеров — обе ноги каждой сделки записаны, ничего не потеряно.
+
+    python -m benchmarks.bench_orders --users 10000 --orders 50000
+"""
+import argparse
+import csv
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks import datagen
+from benchmarks.suite import _configure
+
+CURRENCIES = ("BTC", "ETH", "EUR", "SOL")
+
+
+def _write_orders(path: str, users: int, orders: int, seed: int = 11):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["user_id", "side", "currency", "amount"])
+        for _ in range(orders):
+            code = rng.choice(CURRENCIES)
+            amount = round(rng.uniform(0.001, 0.05), 3) if code in ("BTC", "ETH") else round(rng.uniform(1, 50), 2)
+            writer.writerow([rng.randint(1, users), rng.choice(("buy", "buy", "sell")), code, amount])
+
+
+def _totals(backend) -> Counter:
+    from valutatrade_hub.core.usecases import _wallet_from_record
+    totals = Counter()
+    for record in backend.load_portfolios():
+        for code, info in record["wallets"].items():
+            totals[code] += _wallet_from_record(code, info).units
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк исполнения партии ордеров")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--single", type=int, default=20, help="Ордеров по одному для сравнения")
+    parser.add_argument("--engine", choices=["json", "sqlite"], default="json")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="valutatrade-orders-")
+    try:
+        datagen.generate(data_dir, users=args.users, history=0, fund_usd=1_000_000)
+        orders_file = os.path.join(data_dir, "orders.csv")
+        _write_orders(orders_file, args.users, args.orders)
+        _configure(data_dir, args.engine)
+
+        from valutatrade_hub.core import usecases
+        from valutatrade_hub.core.trading import BUY, load_orders
+        from valutatrade_hub.infra.database import DatabaseManager
+        backend = DatabaseManager().backend
+        before = _totals(backend)
+
+        began = time.perf_counter()
+        orders = load_orders(orders_file)
+        parse_s = time.perf_counter() - began
+        report = usecases.execute_orders(orders)
+
+        expected = Counter(before)
+        for fill in report.fills:
+            sign = 1 if fill.order.side == BUY else -1
+            expected[fill.order.currency] += sign * fill.units
+            expected[fill.order.quote] -= sign * fill.quote_units
+        after = _totals(backend)
+        balanced = +after == +expected
+
+        users = {u["user_id"]: u for u in backend.load_users()}
+        sample = orders[:args.single]
+        began = time.perf_counter()
+        for order in sample:
+            user = usecases._user_from_record(users[order.user_id])
+            trade = usecases.buy_currency if order.side == BUY else usecases.sell_currency
+            try:
+                trade(user, order.currency, order.amount, order.quote)
+            except ValueError:
+                pass
+        single_rate = len(sample) / (time.perf_counter() - began)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(f"engine={args.engine} users={args.users} orders={report.total}")
+    print(f"разбор файла: {parse_s:.3f} c")
+    print(f"партия: {report.elapsed:.3f} c, {report.orders_per_second:.0f} ордеров/с "
+          f"(исполнено {len(report.fills)}, отклонено {len(report.rejected)})")
+    print(f"по одному: {single_rate:.1f} ордеров/с — партия быстрее в {report.orders_per_second / single_rate:.0f} раз")
+    print("баланс системы: OK" if balanced else "баланс системы: НЕ СХОДИТСЯ")
+    if not balanced:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
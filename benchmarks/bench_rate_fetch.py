@@ -0,0 +1,102 @@
+"""
+Параллельный опрос API-клиентов против локального stub-сервера.
+
+Сравнивает последовательный и параллельный опрос при заданной задержке
+источников и проверяет, что клиент, превысивший свой deadline,
+не задерживает обновление. Затем проверяет реестр источников: выбор
+минимального набора под --source и подмножество пар, сведение пар,
+которые покрывают несколько источников, и отбраковку выброса.
+
+    python -m benchmarks.bench_rate_fetch --latency 0.3 --rounds 5
+"""
+import argparse
+import time
+
+from benchmarks.stub_rates_server import StubRatesServer
+from valutatrade_hub.parser_service.api_clients import CoinGeckoClient, ExchangeRateApiClient, FrankfurterClient
+from valutatrade_hub.parser_service.updater import RatesUpdater
+
+
+def _clients(server, slow_deadline=None):
+    return [
+        CoinGeckoClient(url=server.url("/coingecko")),
+        ExchangeRateApiClient(url=server.url("/exchangerate"), deadline=slow_deadline),
+        FrankfurterClient(url=server.url("/frankfurter")),
+    ]
+
+
+def _check_registry(server) -> bool:
+    updater = RatesUpdater(clients=_clients(server))
+    names = lambda clients: sorted(c.name for c in clients)  # noqa: E731
+    ok = True
+
+    chosen = names(updater.registry.select({"BTC_USD"}))
+    print(f"для BTC_USD опрашиваются: {chosen}")
+    ok &= chosen == ["coingecko"]
+    chosen = names(updater.registry.select({"EUR_USD", "RUB_USD"}))
+    print(f"для EUR_USD, RUB_USD: {chosen}")
+    ok &= chosen == ["exchangerate", "frankfurter"]
+    chosen = names(updater.registry.select(None, ["frankfurter"]))
+    print(f"--source frankfurter: {chosen}")
+    ok &= chosen == ["frankfurter"]
+
+    rates = updater.fetch_all(updater.registry.select({"EUR_USD", "GBP_USD"}), {"EUR_USD", "GBP_USD"})
+    eur = rates["EUR_USD"]
+    print(f"EUR_USD = {eur['rate']:.6f} ({eur['provenance']['method']} из {eur['source']})")
+    ok &= sorted(rates) == ["EUR_USD", "GBP_USD"] and len(eur["provenance"]["quotes"]) == 2
+
+    # третий источник с заведомо неверным курсом отбраковывается как выброс
+    updater.quotes["bogus"] = {"EUR_USD": {**updater.quotes["frankfurter"]["EUR_USD"], "rate": 2.5, "source": "Bogus"}}
+    eur = updater.aggregate({"EUR_USD"})["EUR_USD"]
+    rejected = [(r["source"], r["reason"]) for r in eur["provenance"]["rejected"]]
+    print(f"с выбросом: EUR_USD = {eur['rate']:.6f}, отброшены {rejected}")
+    ok &= rejected == [("Bogus", "outlier")]
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк параллельного опроса источников курсов")
+    parser.add_argument("--latency", type=float, default=0.3, help="Задержка каждого источника, с")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    server = StubRatesServer(latency={"/coingecko": args.latency, "/exchangerate": args.latency,
+                                      "/frankfurter": args.latency}).start()
+    try:
+        clients = _clients(server)
+
+        began = time.perf_counter()
+        for _ in range(args.rounds):
+            rates = {}
+            for client in clients:
+                rates.update(client.fetch_rates())
+        sequential = (time.perf_counter() - began) / args.rounds
+
+        updater = RatesUpdater(clients=clients)
+        began = time.perf_counter()
+        for _ in range(args.rounds):
+            rates = updater.fetch_all()
+        parallel = (time.perf_counter() - began) / args.rounds
+        print(f"последовательно: {sequential * 1000:.0f} мс/обновление")
+        print(f"параллельно:     {parallel * 1000:.0f} мс/обновление ({len(rates)} курсов)")
+
+        # медленный источник с коротким deadline не тормозит обновление
+        server.latency["/exchangerate"] = args.latency * 10
+        updater = RatesUpdater(clients=_clients(server, slow_deadline=args.latency * 2))
+        began = time.perf_counter()
+        rates = updater.fetch_all()
+        elapsed = time.perf_counter() - began
+        print(f"с зависшим источником: {elapsed * 1000:.0f} мс, получено {sorted(rates)}")
+
+        for path in server.latency:
+            server.latency[path] = 0.0
+        registry_ok = _check_registry(server)
+    finally:
+        server.stop()
+    print("реестр источников: OK" if registry_ok else "реестр источников: FAIL")
+    if not registry_ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Stale-while-revalidate: чтение устаревших курсов против stub-сервера
+с задержкой источников.
+
+--readers процессов одновременно читают курс из устаревшего snapshot'а:
+каждый должен получить старый курс сразу, не дожидаясь источников,
+а обновление должно пройти в фоне ровно один раз (по одному запросу
+к каждому источнику). Затем snapshot старше ttl + grace: курс для
+сделок (strict) недоступен, просмотр получает последний курс, и после
+фонового обновления курс снова читается и для сделок.
+
+    python -m benchmarks.bench_stale_rates --readers 16 --latency 0.5
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.stub_rates_server import COINGECKO_PAYLOAD, StubRatesServer
+
+STALE_RATE = 60000.0
+
+
+def _apply(overrides: dict):
+    from valutatrade_hub.parser_service.config import config
+    for key, value in overrides.items():
+        setattr(config, key, value)
+
+
+def _write_snapshot(path: str, age: timedelta):
+    refreshed = (datetime.now(timezone.utc) - age).isoformat()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"pairs": {"BTC_USD": {"rate": STALE_RATE, "updated_at": refreshed}}, "last_refresh": refreshed}, f)
+
+
+def _reader(overrides, start, results):
+    _apply(overrides)
+    from valutatrade_hub.core.rate_engine import RateResolver
+    resolver = RateResolver()
+    start.wait()
+    began = time.perf_counter()
+    rate = resolver.get_rate("BTC", "USD")
+    results.put((rate, time.perf_counter() - began))
+
+
+def _wait_refreshed(path: str, before: str, timeout: float = 30.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with open(path, "r", encoding="utf-8") as f:
+            if json.load(f).get("last_refresh") != before:
+                return True
+        time.sleep(0.05)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк чтения устаревших курсов с фоновым обновлением")
+    parser.add_argument("--readers", type=int, default=16, help="Параллельных процессов-читателей")
+    parser.add_argument("--latency", type=float, default=0.5, help="Задержка каждого источника, с")
+    args = parser.parse_args()
+
+    server = StubRatesServer(latency={"/coingecko": args.latency, "/frankfurter": args.latency}).start()
+    data_dir = tempfile.mkdtemp(prefix="valutatrade-stale-")
+    overrides = {
+        "RATES_FILE_PATH": os.path.join(data_dir, "rates.json"),
+        "CONFIRMATIONS_FILE_PATH": os.path.join(data_dir, "rates_confirmed.json"),
+        "HISTORY_FILE_PATH": os.path.join(data_dir, "exchange_rates.json"),
+        "HISTORY_DIR_PATH": os.path.join(data_dir, "history"),
+        "COINGECKO_URL": server.url("/coingecko"),
+        "FRANKFURTER_URL": server.url("/frankfurter"),
+        "EXCHANGERATE_API_KEY": None,
+    }
+    _apply(overrides)
+    from valutatrade_hub.core.exceptions import RateUnavailableError
+    from valutatrade_hub.core.rate_engine import RateResolver
+    from valutatrade_hub.parser_service.refresh import lock_path
+    from valutatrade_hub.parser_service.updater import RatesUpdater
+    rates_file = overrides["RATES_FILE_PATH"]
+    fresh_rate = COINGECKO_PAYLOAD["bitcoin"]["usd"]
+    ok = True
+    try:
+        began = time.perf_counter()
+        RatesUpdater().run_update()
+        sync_s = time.perf_counter() - began
+        sources = server.requests
+        print(f"синхронное обновление: {sync_s * 1e3:.0f} мс, запросов к источникам {sources}")
+
+        # 1. устаревший snapshot в пределах grace: все читатели сразу получают старый курс
+        os.unlink(overrides["CONFIRMATIONS_FILE_PATH"])
+        _write_snapshot(rates_file, timedelta(hours=2))
+        with open(rates_file, "r", encoding="utf-8") as f:
+            before = json.load(f)["last_refresh"]
+        requests_before = server.requests
+        ctx = mp.get_context("spawn")
+        start, results = ctx.Event(), ctx.Queue()
+        readers = [ctx.Process(target=_reader, args=(overrides, start, results)) for _ in range(args.readers)]
+        for p in readers:
+            p.start()
+        time.sleep(1.0)  # все процессы импортировались и ждут старта
+        start.set()
+        reads = [results.get(timeout=30) for _ in readers]
+        for p in readers:
+            p.join()
+        worst = max(elapsed for _, elapsed in reads)
+        served_stale = all(rate == STALE_RATE for rate, _ in reads)
+        print(f"{args.readers} читателей: худшее чтение {worst * 1e3:.1f} мс, старый курс у всех: {served_stale}")
+        ok &= served_stale and worst < args.latency
+
+        refreshed = _wait_refreshed(rates_file, before)
+        time.sleep(0.5)  # опоздавший дубль обновления успел бы обратиться к источникам
+        refreshes = (server.requests - requests_before) / sources
+        print(f"фоновое обновление: {'завершено' if refreshed else 'НЕ завершено'}, обновлений {refreshes:g}")
+        ok &= refreshed and refreshes == 1
+        ok &= RateResolver().get_rate("BTC", "USD") == fresh_rate
+
+        # 2. snapshot старше ttl + grace: сделкам курс недоступен, просмотру — отдаётся, обновление идёт в фоне
+        os.unlink(lock_path())  # снимаем паузу между попытками обновления
+        _write_snapshot(rates_file, timedelta(days=3))
+        with open(rates_file, "r", encoding="utf-8") as f:
+            before = json.load(f)["last_refresh"]
+        os.unlink(overrides["CONFIRMATIONS_FILE_PATH"])
+        resolver = RateResolver(grace_seconds=86400)
+        served = resolver.get_rate("BTC", "USD") == STALE_RATE
+        try:
+            resolver.get_rate("BTC", "USD", strict=True)
+            refused = False
+        except RateUnavailableError as e:
+            refused = True
+            print(f"сверх grace: {e}")
+        print(f"просмотр сверх grace: {'старый курс' if served else 'НЕТ курса'}")
+        ok &= refused and served and resolver.is_stale()
+        refreshed = _wait_refreshed(rates_file, before)
+        time.sleep(RateResolver.STALE_RECHECK_SECONDS)
+        rate = resolver.get_rate("BTC", "USD", strict=True) if refreshed else None
+        print(f"после фонового обновления: BTC→USD = {rate}")
+        ok &= rate == fresh_rate
+    finally:
+        server.stop()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print("stale-while-revalidate: OK" if ok else "stale-while-revalidate: FAIL")
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Генерация синтетических users.json, portfolios.json и exchange_rates.json.
+
+    python -m benchmarks.datagen --users 100000 --history 100000 --out /tmp/vt-data
+"""
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+PASSWORD = "bench-password"
+SALT = "0123456789abcdef"
+CURRENCIES = ("USD", "EUR", "BTC", "ETH", "SOL")
+BASE_RATES = {
+    "BTC_USD": 64491.0,
+    "ETH_USD": 1857.94,
+    "SOL_USD": 78.75,
+    "EUR_USD": 1.08,
+}
+
+
+def generate(out_dir: str, users: int, history: int, seed: int = 42, fund_usd: float = None):
+    """fund_usd — у каждого пользователя будет USD-кошелёк с этим балансом (для сделок с оплатой)"""
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    from valutatrade_hub.core.security import hash_password
+    hashed = hash_password(PASSWORD, SALT)  # один KDF с текущими параметрами на всех: вход без rehash
+    registered = datetime(2026, 1, 1).isoformat()
+
+    with open(os.path.join(out_dir, "users.json"), "w", encoding="utf-8") as f:
+        json.dump([
+            {
+                "user_id": i,
+                "username": f"user{i}",
+                "hashed_password": hashed,
+                "salt": SALT,
+                "registration_date": registered,
+            }
+            for i in range(1, users + 1)
+        ], f, indent=2)
+
+    with open(os.path.join(out_dir, "portfolios.json"), "w", encoding="utf-8") as f:
+        json.dump([
+            {
+                "user_id": i,
+                "wallets": {
+                    **{code: {"balance": round(rng.uniform(0, 1000), 2)}
+                       for code in rng.sample(CURRENCIES, rng.randint(1, 3))},
+                    **({"USD": {"balance": fund_usd}} if fund_usd else {}),
+                },
+                "version": 0,
+            }
+            for i in range(1, users + 1)
+        ], f, indent=2)
+
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    pairs = list(BASE_RATES)
+    records = []
+    for i in range(history):
+        pair = pairs[i % len(pairs)]
+        updated_at = (start + timedelta(seconds=60 * (i // len(pairs)))).isoformat()
+        rate = BASE_RATES[pair] * (1 + rng.gauss(0, 0.01))
+        src, dst = pair.split("_")
+        records.append({
+            "id": f"{pair}_{updated_at}",
+            "from_currency": src,
+            "to_currency": dst,
+            "rate": rate,
+            "updated_at": updated_at,
+            "source": "Synthetic",
+        })
+    with open(os.path.join(out_dir, "exchange_rates.json"), "w", encoding="utf-8") as f:
+        json.dump(records, f, indent=2)
+
+    now = datetime.now(timezone.utc).isoformat()
+    with open(os.path.join(out_dir, "rates.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "pairs": {
+                pair: {"rate": rate, "updated_at": now, "source": "Synthetic"}
+                for pair, rate in BASE_RATES.items()
+            },
+            "last_refresh": now,
+        }, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация синтетических данных")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--history", type=int, default=1000)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+    generate(args.out, args.users, args.history)
+
+
+if __name__ == "__main__":
+    main()
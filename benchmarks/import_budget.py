@@ -0,0 +1,71 @@
+"""
+Проверка бюджета импорта CLI на основе `python -X importtime`.
+
+Падает (код 1), если импорт valutatrade_hub.cli.interface тянет
+запрещённые тяжёлые модули или занимает больше бюджета:
+
+    python -m benchmarks.import_budget --budget-ms 60
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+TARGET = "valutatrade_hub.cli.interface"
+# нужны только командам, которые их явно импортируют
+FORBIDDEN = (
+    "requests",
+    "urllib3",
+    "numpy",
+    "prettytable",
+    "sqlite3",
+    "valutatrade_hub.parser_service.updater",
+    "valutatrade_hub.parser_service.api_clients",
+    # пароли и токены (hashlib, hmac), индексы и журнал операций — только командам, которые открывают хранилище
+    "valutatrade_hub.core.security",
+    "valutatrade_hub.infra.record_index",
+    "valutatrade_hub.infra.ledger",
+)
+BUDGET_MS = 60.0
+
+
+def measure(target: str = TARGET, runs: int = 5):
+    """Лучшее из нескольких запусков: (время импорта в мс, множество модулей)"""
+    best = None
+    modules = set()
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line.split("|")
+            name = name.strip()
+            modules.add(name)
+            if name == target and cumulative.strip().isdigit():
+                us = int(cumulative)
+                best = us if best is None else min(best, us)
+    return (best or 0) / 1000, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бюджет времени импорта CLI")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    elapsed_ms, modules = measure(runs=args.runs)
+    leaked = [m for m in FORBIDDEN if m in modules]
+    print(f"import {TARGET}: {elapsed_ms:.1f} мс (бюджет {args.budget_ms:.0f} мс)")
+    if leaked:
+        print(f"FAIL: при старте импортируются тяжёлые модули: {', '.join(leaked)}")
+    if elapsed_ms > args.budget_ms:
+        print("FAIL: бюджет импорта превышен")
+    sys.exit(1 if leaked or elapsed_ms > args.budget_ms else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Нагрузочный тест HTTP API (valutatrade_hub.api.server).
+
+Сервер запускается в отдельном процессе на временном каталоге данных,
+N клиентов на asyncio держат keep-alive соединения и в течение
+--duration секунд шлют смесь запросов buy / sell / portfolio / rate.
+В конце выводятся req/s и перцентили задержки; после остановки сервера
+проверяется, что портфели на диске совпадают с ожидаемыми балансами.
+
+    python -m benchmarks.load_test_api --clients 50 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import statistics
+import tempfile
+import time
+
+from benchmarks import datagen
+from benchmarks.suite import _configure
+
+AMOUNT = 0.001
+# USD на счёт каждого клиента: покупки списывают стоимость в USD
+FUNDING = 10_000_000
+
+
+def _serve(data_dir, engine, ready):
+    _configure(data_dir, engine)
+    from valutatrade_hub.api.server import ApiServer
+
+    async def main():
+        server = ApiServer("127.0.0.1", 0)
+        await server.start()
+        loop = asyncio.get_running_loop()
+        stopped = asyncio.Event()
+        loop.add_signal_handler(signal.SIGTERM, stopped.set)
+        ready.put(server.port)
+        await stopped.wait()
+        await server.stop()
+
+    asyncio.run(main())
+
+
+class Client:
+    """Одно keep-alive соединение HTTP/1.1"""
+
+    def __init__(self, port):
+        self.port = port
+        self.token = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port)
+
+    async def request(self, method, path, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else b""
+        headers = f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n"
+        if self.token:
+            headers += f"Authorization: Bearer {self.token}\r\n"
+        self.writer.write(headers.encode() + b"\r\n" + body)
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode().partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        return status, json.loads(await self.reader.readexactly(length))
+
+    def close(self):
+        self.writer.close()
+
+
+async def _connect(port, user_id):
+    """Вход и пополнение — до замера: KDF пароля не входит в окно нагрузки"""
+    client = Client(port)
+    await client.connect()
+    status, reply = await client.request(
+        "POST", "/login", {"username": f"user{user_id}", "password": datagen.PASSWORD}
+    )
+    if status != 200:
+        raise RuntimeError(f"login user{user_id}: {reply}")
+    client.token = reply["token"]
+    status, reply = await client.request("POST", "/deposit", {"currency": "USD", "amount": FUNDING})
+    if status != 200:
+        raise RuntimeError(f"deposit user{user_id}: {reply}")
+    return client
+
+
+async def _worker(client, user_id, deadline, latencies, errors):
+    buys = 0
+    plan = [
+        ("POST", "/buy", {"currency": "BTC", "amount": AMOUNT}),
+        ("GET", "/portfolio?base=USD", None),
+        ("POST", "/sell", {"currency": "BTC", "amount": AMOUNT}),
+        ("GET", "/rate?from=BTC&to=EUR", None),
+        ("POST", "/buy", {"currency": "BTC", "amount": AMOUNT}),
+    ]
+    i = 0
+    while time.perf_counter() < deadline:
+        method, path, payload = plan[i % len(plan)]
+        began = time.perf_counter()
+        status, _ = await client.request(method, path, payload)
+        latencies.append(time.perf_counter() - began)
+        if status != 200:
+            errors.append((path, status))
+        elif path == "/buy":
+            buys += 1
+        elif path == "/sell":
+            buys -= 1
+        i += 1
+    client.close()
+    return user_id, buys
+
+
+async def _load(port, clients, duration):
+    latencies, errors = [], []
+    connected = await asyncio.gather(*(_connect(port, user_id) for user_id in range(1, clients + 1)))
+    deadline = time.perf_counter() + duration
+    began = time.perf_counter()
+    results = await asyncio.gather(*(
+        _worker(client, user_id, deadline, latencies, errors)
+        for user_id, client in enumerate(connected, start=1)
+    ))
+    return time.perf_counter() - began, latencies, errors, dict(results)
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест HTTP API")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--users", type=int, default=1000, help="Пользователей в сгенерированных данных")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--engine", choices=["json", "sqlite"], default="json")
+    args = parser.parse_args()
+    if args.clients > args.users:
+        parser.error("--clients не может превышать --users")
+
+    data_dir = tempfile.mkdtemp(prefix="valutatrade-api-")
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        datagen.generate(data_dir, users=args.users, history=0)
+        with open(os.path.join(data_dir, "portfolios.json"), encoding="utf-8") as f:
+            initial = {p["user_id"]: p["wallets"].get("BTC", {}).get("balance", 0.0) for p in json.load(f)}
+
+        ready = ctx.Queue()
+        server = ctx.Process(target=_serve, args=(data_dir, args.engine, ready))
+        server.start()
+        port = ready.get(timeout=30)
+
+        elapsed, latencies, errors, buys = asyncio.run(_load(port, args.clients, args.duration))
+
+        server.terminate()  # SIGTERM: сервер сбрасывает изменения на диск
+        server.join(30)
+
+        _configure(data_dir, args.engine)
+        from valutatrade_hub.infra.database import DatabaseManager
+        stored = {p["user_id"]: p["wallets"].get("BTC", {}).get("balance", 0.0)
+                  for p in DatabaseManager().backend.load_portfolios()}
+        mismatched = [
+            uid for uid, count in buys.items()
+            if abs(stored[uid] - (initial[uid] + count * AMOUNT)) > 1e-9
+        ]
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    latencies.sort()
+    print(f"clients={args.clients} engine={args.engine} duration={elapsed:.1f}s")
+    print(f"requests: {len(latencies)}  errors: {len(errors)}  req/s: {len(latencies) / elapsed:.0f}")
+    print(
+        f"latency ms: mean {statistics.mean(latencies) * 1e3:.2f}  "
+        f"p50 {_percentile(latencies, 0.50) * 1e3:.2f}  "
+        f"p95 {_percentile(latencies, 0.95) * 1e3:.2f}  "
+        f"p99 {_percentile(latencies, 0.99) * 1e3:.2f}"
+    )
+    print("balances: OK" if not mismatched else f"balances: MISMATCH for users {mismatched[:10]}")
+    if errors or mismatched:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Стресс-тест конкурентных сделок.
+
+N процессов одновременно покупают и продают валюту в одном портфеле
+общего каталога данных по фиксированным курсам. После завершения балансы
+(включая USD, которым оплачиваются сделки) должны точно совпасть
+с ожидаемыми — ни одно обновление не потеряно, файл не повреждён.
+Балансы, восстановленные по журналу операций, совпадают с портфелем.
+
+    python -m benchmarks.stress_concurrent_trading --workers 8 --trades 50 --engine json
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+USERNAME = "stress"
+PASSWORD = "stress-password"
+BUY_AMOUNT = 1.0
+SELL_AMOUNT = 0.5
+ETH_AMOUNT = 0.25
+RATES = {"BTC_USD": 60000.0, "ETH_USD": 2000.0}
+FUNDING = 10 ** 9
+
+
+def _setup(data_dir, engine):
+    from valutatrade_hub.core import metrics
+    from valutatrade_hub.core.logging_config import configure_action_log
+    from valutatrade_hub.infra.database import DatabaseManager
+    from valutatrade_hub.parser_service.config import config
+    config.RATES_FILE_PATH = os.path.join(data_dir, "rates.json")
+    config.CONFIRMATIONS_FILE_PATH = os.path.join(data_dir, "rates_confirmed.json")
+    configure_action_log(os.path.join(data_dir, "actions.log"))
+    metrics.configure(os.path.join(data_dir, "metrics.prom"))
+    DatabaseManager(data_dir, engine)
+
+
+def _worker(data_dir, engine, trades, start):
+    _setup(data_dir, engine)
+    from valutatrade_hub.core.usecases import login_user, buy_currency, sell_currency
+
+    user = login_user(USERNAME, PASSWORD)
+    start.wait()
+    for i in range(trades):
+        buy_currency(user, "BTC", BUY_AMOUNT)
+        buy_currency(user, "ETH", ETH_AMOUNT)
+        if i % 2:
+            sell_currency(user, "BTC", SELL_AMOUNT)
+
+
+def expected_balances(workers, trades):
+    btc = workers * (trades * BUY_AMOUNT - (trades // 2) * SELL_AMOUNT)
+    eth = workers * trades * ETH_AMOUNT
+    usd = FUNDING - workers * (
+        trades * (BUY_AMOUNT * RATES["BTC_USD"] + ETH_AMOUNT * RATES["ETH_USD"])
+        - (trades // 2) * SELL_AMOUNT * RATES["BTC_USD"]
+    )
+    return {"USD": usd, "BTC": btc, "ETH": eth}
+
+
+def run(workers, trades, engine):
+    data_dir = tempfile.mkdtemp(prefix="valutatrade-stress-")
+    ctx = mp.get_context("spawn")
+    try:
+        with open(os.path.join(data_dir, "rates.json"), "w", encoding="utf-8") as f:
+            json.dump({"pairs": {k: {"rate": v} for k, v in RATES.items()},
+                       "last_refresh": datetime.now(timezone.utc).isoformat()}, f)
+        _setup(data_dir, engine)
+        from valutatrade_hub.core.usecases import (
+            register_user, get_user_portfolio, deposit_currency, get_balances_at, get_ledger_entries,
+        )
+        user = register_user(USERNAME, PASSWORD)
+        deposit_currency(user, "USD", FUNDING)
+
+        start = ctx.Event()
+        processes = [
+            ctx.Process(target=_worker, args=(data_dir, engine, trades, start))
+            for _ in range(workers)
+        ]
+        for p in processes:
+            p.start()
+        time.sleep(0.5)  # даём процессам импортироваться
+        began = time.perf_counter()
+        start.set()
+        for p in processes:
+            p.join()
+        elapsed = time.perf_counter() - began
+
+        failed = [p.exitcode for p in processes if p.exitcode != 0]
+        portfolio = get_user_portfolio(user)
+        actual = {code: w.balance for code, w in portfolio.wallets.items()}
+        expected = expected_balances(workers, trades)
+        operations = workers * (trades * 2 + trades // 2)
+        replayed = {code: w.units for code, w in get_balances_at(user, datetime.now(timezone.utc)).items()}
+        ledger_ok = (replayed == {code: w.units for code, w in portfolio.wallets.items() if w.units}
+                     and len(get_ledger_entries(user)) == operations + 1)
+
+        print(f"engine={engine} workers={workers} trades/worker={trades}")
+        print(f"{operations} операций за {elapsed:.2f} c ({operations / elapsed:.0f} оп/с)")
+        print(f"ожидалось {expected}, получено {actual}, версия портфеля {portfolio.version}")
+        print(f"журнал операций: {'сходится' if ledger_ok else 'НЕ СХОДИТСЯ'} с портфелем")
+        return not failed and actual == expected and ledger_ok
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Стресс-тест конкурентных сделок")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--trades", type=int, default=50)
+    parser.add_argument("--engine", choices=["json", "sqlite"], default="json")
+    args = parser.parse_args()
+
+    ok = run(args.workers, args.trades, args.engine)
+    print("OK" if ok else "FAIL: балансы не сошлись")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Локальный stub HTTP-сервер в формате CoinGecko, ExchangeRate-API v6 и Frankfurter
+с настраиваемой задержкой ответа для каждого пути и поддержкой ETag
+(If-None-Match → 304 Not Modified).
+
+    server = StubRatesServer(latency={"/coingecko": 0.5})
+    server.start()
+    CoinGeckoClient(url=server.url("/coingecko"))
+    ...
+    server.stop()
+"""
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+COINGECKO_PAYLOAD = {
+    "bitcoin": {"usd": 64491.0},
+    "ethereum": {"usd": 1857.94},
+    "solana": {"usd": 78.75},
+}
+EXCHANGERATE_PAYLOAD = {
+    "result": "success",
+    "base_code": "USD",
+    "conversion_rates": {"USD": 1, "EUR": 0.92, "GBP": 0.79, "RUB": 91.5},
+}
+FRANKFURTER_PAYLOAD = {
+    "amount": 1.0,
+    "base": "USD",
+    "rates": {"EUR": 0.921, "GBP": 0.789},
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        server = self.server
+        path = urlparse(self.path).path
+        with server.stats_lock:
+            server.requests += 1
+        time.sleep(server.latency.get(path, 0.0))
+        payload = server.payloads.get(path)
+        if payload is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps(payload).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            with server.stats_lock:
+                server.not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubRatesServer:
+    def __init__(self, latency: dict = None, host: str = "127.0.0.1", port: int = 0):
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.latency = latency or {}
+        self._server.payloads = {
+            "/coingecko": COINGECKO_PAYLOAD,
+            "/exchangerate": EXCHANGERATE_PAYLOAD,
+            "/frankfurter": FRANKFURTER_PAYLOAD,
+        }
+        self._server.requests = 0
+        self._server.not_modified = 0
+        self._server.stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def latency(self) -> dict:
+        return self._server.latency
+
+    @property
+    def payloads(self) -> dict:
+        return self._server.payloads
+
+    @property
+    def requests(self) -> int:
+        return self._server.requests
+
+    @property
+    def not_modified(self) -> int:
+        return self._server.not_modified
+
+    def url(self, path: str) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    server = StubRatesServer(port=8765)
+    print(f"stub server: {server.url('/coingecko')}, {server.url('/exchangerate')}, {server.url('/frankfurter')}")
+    server._server.serve_forever()
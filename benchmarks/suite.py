@@ -0,0 +1,193 @@
+"""
+Набор бенчмарков: сделки, оценка портфеля, обновление курсов, рост истории.
+
+Для каждого масштаба генерирует синтетические данные во временном каталоге,
+замеряет операции и пишет результаты в JSON, чтобы сравнивать коммиты:
+
+    python -m benchmarks.suite --scales 1k 100k --output bench_results.json
+    python -m benchmarks.suite --compare old.json new.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks import datagen
+
+SCALES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+
+class StubClient:
+    """Источник курсов без сети: каждый вызов слегка сдвигает курсы"""
+
+    name = "stub"
+    deadline = 5.0
+
+    def __init__(self):
+        self._tick = 0
+
+    def fetch_rates(self, pairs=None) -> dict:
+        self._tick += 1
+        now = datetime.now(timezone.utc).isoformat()
+        return {
+            pair: {"rate": rate * (1 + self._tick * 1e-4), "updated_at": now, "source": "Stub"}
+            for pair, rate in datagen.BASE_RATES.items()
+        }
+
+
+def _measure(func, iterations: int) -> dict:
+    samples = []
+    for i in range(iterations):
+        began = time.perf_counter()
+        func(i)
+        samples.append((time.perf_counter() - began) * 1000)
+    samples.sort()
+    return {
+        "n": iterations,
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "min_ms": samples[0],
+    }
+
+
+def _configure(data_dir: str, engine: str):
+    """Направляет хранилища и синглтоны на каталог бенчмарка"""
+    from valutatrade_hub.core import metrics, rate_engine
+    from valutatrade_hub.core.logging_config import configure_action_log
+    from valutatrade_hub.infra.database import DatabaseManager
+    from valutatrade_hub.parser_service.config import config
+
+    config.RATES_FILE_PATH = f"{data_dir}/rates.json"
+    config.HISTORY_FILE_PATH = f"{data_dir}/exchange_rates.json"
+    config.HISTORY_DIR_PATH = f"{data_dir}/history"
+    config.CONFIRMATIONS_FILE_PATH = f"{data_dir}/rates_confirmed.json"
+    DatabaseManager._instance = None
+    DatabaseManager(data_dir, engine)
+    rate_engine._resolver = None
+    configure_action_log(f"{data_dir}/actions.log")
+    metrics.configure(f"{data_dir}/metrics.prom")
+
+
+def run_scale(users: int, engine: str, iterations: int) -> dict:
+    from valutatrade_hub.cli import interface
+    from valutatrade_hub.core import usecases
+    from valutatrade_hub.parser_service.storage import RatesStorage
+    from valutatrade_hub.parser_service.updater import RatesUpdater
+
+    data_dir = tempfile.mkdtemp(prefix="valutatrade-bench-")
+    try:
+        began = time.perf_counter()
+        datagen.generate(data_dir, users=users, history=users)
+        setup_s = time.perf_counter() - began
+        _configure(data_dir, engine)
+        storage = RatesStorage()
+        storage.ensure_history_dir()  # разовая миграция истории — вне замеров
+        usecases.get_user_by_id(1)  # миграция в SQLite — тоже
+
+        user = usecases.login_user("user1", datagen.PASSWORD)
+        usecases.deposit_currency(user, "USD", 10 ** 9)
+        usecases.buy_currency(user, "BTC", 1.0)
+        results = {"setup_s": setup_s}
+        results["register_user"] = _measure(
+            lambda i: usecases.register_user(f"bench{i}", datagen.PASSWORD), iterations)
+        results["login_user"] = _measure(
+            lambda i: usecases.login_user(f"user{users - i}", datagen.PASSWORD), iterations)
+        token = usecases.issue_session(user)
+        results["resume_session"] = _measure(lambda i: usecases.resume_session(token), iterations)
+        results["buy_currency"] = _measure(
+            lambda i: usecases.buy_currency(user, "BTC", 0.5), iterations)
+        results["sell_currency"] = _measure(
+            lambda i: usecases.sell_currency(user, "BTC", 0.5), iterations)
+        results["get_user_portfolio"] = _measure(
+            lambda i: usecases.get_user_portfolio(user), iterations)
+
+        record = {"from_currency": "BTC", "to_currency": "USD", "rate": 1.0,
+                  "updated_at": datetime.now(timezone.utc).isoformat(), "source": "Bench"}
+        results["save_history"] = _measure(
+            lambda i: storage.save_history(None, {**record, "id": f"BTC_USD_{i}"}), iterations)
+
+        updater = RatesUpdater(clients=[StubClient()])
+        results["update_rates"] = _measure(lambda i: updater.run_update(), iterations)
+
+        def show_rates(_):
+            sys.argv = ["valutatrade", "show-rates"]
+            with contextlib.redirect_stdout(io.StringIO()):
+                interface.main()
+        argv = sys.argv
+        try:
+            results["show_rates"] = _measure(show_rates, iterations)
+        finally:
+            sys.argv = argv
+        return results
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(old_path: str, new_path: str):
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"{old['commit']} → {new['commit']}")
+    for scale, ops in new["results"].items():
+        for op, stats in ops.items():
+            before = old["results"].get(scale, {}).get(op)
+            if not isinstance(stats, dict) or not before:
+                continue
+            ratio = stats["p50_ms"] / before["p50_ms"] if before["p50_ms"] else float("inf")
+            print(f"{scale:>5} {op:<20} {before['p50_ms']:10.3f} → {stats['p50_ms']:10.3f} мс  x{ratio:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки ValutaTrade Hub")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["1k"])
+    parser.add_argument("--engine", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "engine": args.engine,
+        "iterations": args.iterations,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "results": {},
+    }
+    for scale in args.scales:
+        print(f"[{scale}] ...", file=sys.stderr)
+        report["results"][scale] = run_scale(SCALES[scale], args.engine, args.iterations)
+        for op, stats in report["results"][scale].items():
+            if isinstance(stats, dict):
+                print(f"[{scale}] {op:<20} p50={stats['p50_ms']:.3f} мс p95={stats['p95_ms']:.3f} мс",
+                      file=sys.stderr)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Результаты записаны в {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
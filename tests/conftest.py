@@ -0,0 +1,46 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+RATES = {"BTC_USD": 60000.0, "ETH_USD": 2000.0, "EUR_USD": 1.25}
+
+
+def write_rates(data_dir, rates=RATES, refreshed=None):
+    refreshed = (refreshed or datetime.now(timezone.utc)).isoformat()
+    with open(data_dir / "rates.json", "w", encoding="utf-8") as f:
+        json.dump({"pairs": {p: {"rate": r, "updated_at": refreshed} for p, r in rates.items()},
+                   "last_refresh": refreshed}, f)
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def data_dir(request, tmp_path, monkeypatch):
+    """
+    Каталог данных теста: хранилище (json или sqlite), курсы, журнал
+    действий и метрики направлены в tmp_path; пароли хешируются дёшево.
+    """
+    from valutatrade_hub.core import metrics, rate_engine, usecases
+    from valutatrade_hub.core.logging_config import configure_action_log
+    from valutatrade_hub.infra.database import DatabaseManager
+    from valutatrade_hub.infra.settings import SettingsLoader
+    from valutatrade_hub.parser_service.config import config
+
+    for key, name in (("RATES_FILE_PATH", "rates.json"), ("CONFIRMATIONS_FILE_PATH", "rates_confirmed.json"),
+                      ("HISTORY_FILE_PATH", "exchange_rates.json"), ("HISTORY_DIR_PATH", "history")):
+        monkeypatch.setattr(config, key, str(tmp_path / name))
+    settings = SettingsLoader()
+    monkeypatch.setitem(settings._data, "password_kdf", "pbkdf2_sha256")
+    monkeypatch.setitem(settings._data, "password_pbkdf2_iterations", 1000)
+    write_rates(tmp_path)
+    configure_action_log(str(tmp_path / "actions.log"))
+    metrics.configure(str(tmp_path / "metrics.prom"))
+    DatabaseManager._instance = None
+    DatabaseManager(str(tmp_path), request.param)
+    rate_engine._resolver = None
+    usecases._cache = None
+    yield tmp_path
+    if usecases._cache is not None:
+        usecases._cache.journal.release()
+        usecases._cache = None
+    DatabaseManager._instance = None
+    rate_engine._resolver = None
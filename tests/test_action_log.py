@@ -0,0 +1,78 @@
+import json
+import logging
+import queue
+import subprocess
+import sys
+
+import pytest
+
+from valutatrade_hub.core import usecases
+from valutatrade_hub.core.logging_config import JsonLinesFileHandler, JsonLinesFormatter, configure_action_log
+
+
+def _entries(path):
+    configure_action_log(str(path))  # останавливает поток записи: всё накопленное уже на диске
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+@pytest.mark.parametrize("data_dir", ["json"], indirect=True)
+def test_amount_is_a_string_in_ok_and_error_records(data_dir):
+    alice = usecases.register_user("alice", "pw")
+    usecases.deposit_currency(alice, "USD", 1000)
+    usecases.buy_currency(alice, "EUR", 10.5)
+    with pytest.raises(Exception):
+        usecases.sell_currency(alice, "EUR", 1e6)
+    trades = [e for e in _entries(data_dir / "actions.log") if e["action"] in ("BUY", "SELL")]
+    assert [e["result"] for e in trades] == ["OK", "ERROR"]
+    assert all(isinstance(e["amount"], str) for e in trades)
+    assert trades[1]["amount"] == "1000000.0"
+
+
+def _handler(path, max_bytes=300, backups=3):
+    handler = JsonLinesFileHandler(str(path), queue.SimpleQueue(), max_bytes, backups)
+    handler.setFormatter(JsonLinesFormatter())
+    return handler
+
+
+def _emit(handler, n):
+    record = logging.LogRecord("t", logging.INFO, "", 0, "x", None, None)
+    record.fields = {"action": "T", "n": n}
+    handler.handle(record)
+
+
+def test_rotation_by_one_process_is_not_repeated_by_another(tmp_path):
+    path = tmp_path / "actions.log"
+    first, second = _handler(path), _handler(path)
+    for n in range(10):
+        _emit(first if n % 2 else second, n)
+    first.close()
+    second.close()
+    files = [path] + [tmp_path / f"actions.log.{i}" for i in range(1, 4)]
+    written = sorted(
+        json.loads(line)["n"]
+        for f in files if f.exists()
+        for line in f.read_text(encoding="utf-8").splitlines()
+    )
+    assert written == list(range(10))
+    # каждый повёрнутый файл — полный, пустых и дважды повёрнутых нет
+    assert all(f.stat().st_size >= 300 for f in files[1:] if f.exists())
+
+
+def test_writer_follows_file_rotated_by_another_process(tmp_path):
+    path = tmp_path / "actions.log"
+    first, second = _handler(path, max_bytes=10 ** 6), _handler(path, max_bytes=10 ** 6)
+    _emit(first, 0)
+    _emit(second, 1)
+    path.rename(tmp_path / "actions.log.1")
+    _emit(first, 2)  # уже открыт повёрнутый файл — запись уходит туда, затем переход
+    _emit(first, 3)
+    first.close()
+    second.close()
+    assert [json.loads(line)["n"] for line in path.read_text(encoding="utf-8").splitlines()] == [3]
+
+
+def test_logging_handlers_is_imported_lazily():
+    code = ("import sys, valutatrade_hub.core.logging_config, valutatrade_hub.decorators; "
+            "print('logging.handlers' in sys.modules)")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
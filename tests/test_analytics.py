@@ -0,0 +1,117 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from valutatrade_hub.parser_service.analytics import BarCache, collect_bars, iter_bars, merge_bars
+from valutatrade_hub.parser_service.config import config
+from valutatrade_hub.parser_service.history import RateHistory
+from valutatrade_hub.parser_service.storage import RatesStorage
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _reference_bars(ts, rates, interval):
+    """Бары «в лоб» — по одной точке за раз"""
+    bars = []
+    for t, rate in zip(ts, rates):
+        start = t // interval * interval
+        if bars and bars[-1][0] == start:
+            bar = bars[-1]
+            bar[2], bar[3], bar[4], bar[5] = max(bar[2], rate), min(bar[3], rate), rate, bar[5] + 1
+        else:
+            bars.append([start, rate, rate, rate, rate, 1])
+    return np.array(bars, dtype=np.float64)
+
+
+def _chunks(ts, rates, cuts):
+    bounds = [0, *cuts, len(ts)]
+    return [(ts[lo:hi], rates[lo:hi]) for lo, hi in zip(bounds, bounds[1:])]
+
+
+# ===== Конвейер =====
+@pytest.mark.parametrize("cuts", [[], [1], [5, 6], [3, 3, 10], [2, 4, 6, 8, 10, 12, 14, 16, 18]])
+def test_bars_split_across_chunks_are_merged(cuts):
+    ts = np.arange(0, 200, 10, dtype=np.float64)
+    rates = np.sin(ts) + 10.0
+    expected = _reference_bars(ts, rates, 60)
+    assert np.array_equal(collect_bars(_chunks(ts, rates, cuts), 60), expected)
+
+
+def test_merge_bars_continues_last_bar_in_place():
+    parts = [np.array([[0, 1, 3, 1, 2, 2]], dtype=np.float64)]
+    merge_bars(parts, np.array([[0, 5, 5, 0.5, 4, 3], [60, 7, 7, 7, 7, 1]], dtype=np.float64))
+    assert parts[0].tolist() == [[0, 1, 5, 0.5, 4, 5]]
+    assert parts[1].tolist() == [[60, 7, 7, 7, 7, 1]]
+    merge_bars(parts, np.array([[60, 8, 9, 6, 6, 2]], dtype=np.float64))
+    assert len(parts) == 2 and parts[1].tolist() == [[60, 7, 9, 6, 6, 3]]
+
+
+def test_iter_bars_skips_empty_chunks():
+    empty = (np.empty(0), np.empty(0))
+    chunks = [empty, (np.array([0.0, 30.0]), np.array([1.0, 2.0])), empty]
+    assert [bars.tolist() for bars in iter_bars(chunks, 60)] == [[[0, 1, 2, 1, 2, 2]]]
+
+
+# ===== Кеш баров =====
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "HISTORY_FILE_PATH", str(tmp_path / "exchange_rates.json"))
+    monkeypatch.setattr(config, "HISTORY_DIR_PATH", str(tmp_path / "history"))
+    return RatesStorage()
+
+
+def _write(storage, minutes):
+    storage.save_history_batch([{
+        "id": f"BTC_USD_{minute}", "from_currency": "BTC", "to_currency": "USD",
+        "rate": 60000.0 + minute % 7, "updated_at": (START + timedelta(minutes=minute)).isoformat(),
+    } for minute in minutes])
+
+
+def _fresh_bars(storage, interval):
+    return collect_bars(RateHistory(storage).iter_points("BTC_USD", 0, 4), interval)
+
+
+def test_bar_cache_extends_from_last_counted_point(storage, monkeypatch):
+    cache = BarCache(RateHistory(storage), chunk_size=4)
+    _write(storage, range(0, 25))
+    first = cache.bars("BTC_USD", 600)
+    assert np.array_equal(first, _fresh_bars(storage, 600))
+
+    starts = []
+    iter_points = cache.history.iter_points
+    monkeypatch.setattr(cache.history, "iter_points",
+                        lambda pair, start, size: starts.append(start) or iter_points(pair, start, size))
+    _write(storage, range(25, 40))
+    extended = cache.bars("BTC_USD", 600)
+    # дочитаны только новые точки, бар 20-29 продолжен, а не пересчитан
+    assert starts == [25]
+    assert np.array_equal(extended, _fresh_bars(storage, 600))
+    # кеш актуален — точки не читаются вовсе
+    cache.bars("BTC_USD", 600)
+    assert starts == [25]
+
+
+def test_bar_cache_rebuilds_after_late_point(storage):
+    cache = BarCache(RateHistory(storage), chunk_size=4)
+    _write(storage, range(10, 30))
+    cache.bars("BTC_USD", 600)
+    _write(storage, [3, 30])
+    assert np.array_equal(cache.bars("BTC_USD", 600), _fresh_bars(storage, 600))
+
+
+def test_bar_cache_save_leaves_no_temporary_files(storage, monkeypatch):
+    cache = BarCache(RateHistory(storage))
+    _write(storage, range(5))
+    cache.bars("BTC_USD", 60)
+    assert os.listdir(cache.bars_dir) == ["BTC_USD.60s.npz"]
+
+    def broken_savez(f, **arrays):
+        f.write(b"partial")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(np, "savez", broken_savez)
+    with pytest.raises(OSError):
+        cache._save("BTC_USD", 120, np.empty((0, 6)), 0, 0.0)
+    assert os.listdir(cache.bars_dir) == ["BTC_USD.60s.npz"]
@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+from valutatrade_hub.api.server import ApiServer
+from valutatrade_hub.core import usecases
+from valutatrade_hub.core.exceptions import ConcurrentModificationError
+from valutatrade_hub.infra.database import DatabaseManager
+
+
+async def _request(port, method, path, payload=None, token=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode() if payload is not None else b""
+    auth = f"Authorization: Bearer {token}\r\n" if token else ""
+    writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n{auth}"
+                 f"Connection: close\r\n\r\n".encode() + body)
+    head = await reader.readuntil(b"\r\n\r\n")
+    data = await reader.read()
+    writer.close()
+    return int(head.split()[1]), json.loads(data)
+
+
+def _serve(scenario):
+    async def main():
+        server = ApiServer("127.0.0.1", 0, flush_interval=0.05)
+        await server.start()
+        try:
+            return await scenario(server.port)
+        finally:
+            await server.stop()
+    return asyncio.run(main())
+
+
+def test_register_retries_when_user_id_is_taken(data_dir, monkeypatch):
+    backend = DatabaseManager().backend
+    add_users = backend.add_users
+    taken = []
+
+    def racing_add_users(records):
+        if not taken:
+            # параллельный процесс занял тот же user_id
+            taken.append(records[0]["user_id"])
+            add_users([{**records[0], "username": "other"}])
+            raise ConcurrentModificationError("user_id занят")
+        add_users(records)
+
+    monkeypatch.setattr(backend, "add_users", racing_add_users)
+    user = usecases.register_user("alice", "pw")
+    assert user.user_id == taken[0] + 1
+    assert usecases.login_user("alice", "pw").user_id == user.user_id
+
+
+def test_registration_and_login_alongside_trades(data_dir):
+    async def scenario(port):
+        await _request(port, "POST", "/register", {"username": "trader", "password": "pw"})
+        _, login = await _request(port, "POST", "/login", {"username": "trader", "password": "pw"})
+        token = login["token"]
+        await _request(port, "POST", "/deposit", {"currency": "USD", "amount": 100000}, token)
+        calls = [_request(port, "POST", "/register", {"username": f"u{i}", "password": "pw"}) for i in range(10)]
+        calls += [_request(port, "POST", "/buy", {"currency": "ETH", "amount": 1}, token) for _ in range(10)]
+        calls += [_request(port, "POST", "/login", {"username": "trader", "password": "pw"}) for _ in range(5)]
+        results = await asyncio.gather(*calls)
+        return [status for status, _ in results], await _request(port, "GET", "/portfolio", token=token)
+
+    statuses, (_, portfolio) = _serve(scenario)
+    assert set(statuses) == {200}
+    assert portfolio["wallets"]["ETH"]["balance"] == 10
+    assert portfolio["wallets"]["USD"]["balance"] == 100000 - 10 * 2000
+    ids = sorted(u["user_id"] for u in DatabaseManager().backend.load_users())
+    assert ids == list(range(1, 12))
+
+
+def test_journal_sync_failure_returns_500(data_dir, monkeypatch):
+    def failing_sync():
+        raise OSError("No space left on device")
+
+    async def scenario(port):
+        await _request(port, "POST", "/register", {"username": "alice", "password": "pw"})
+        _, login = await _request(port, "POST", "/login", {"username": "alice", "password": "pw"})
+        monkeypatch.setattr(usecases, "sync_journal", failing_sync)
+        return await _request(port, "POST", "/deposit", {"currency": "USD", "amount": 10}, login["token"])
+
+    status, payload = _serve(scenario)
+    assert status == 500
+    assert payload == {"error": "Internal Server Error"}
+
+
+def test_expired_sessions_are_purged_on_login(monkeypatch):
+    from valutatrade_hub.api import server
+
+    clock = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: clock[0])
+    sessions = server.TokenSessions(ttl_seconds=60)
+    old = [sessions.create(f"user{i}") for i in range(100)]
+    clock[0] += 30
+    recent = sessions.create("recent")
+    clock[0] += 31
+    fresh = sessions.create("fresh")
+    assert len(sessions._sessions) == 2
+    assert sessions.get(old[0]) is None
+    assert sessions.get(recent) == "recent"
+    assert sessions.get(fresh) == "fresh"
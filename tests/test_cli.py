@@ -0,0 +1,83 @@
+import sys
+
+import pytest
+
+from valutatrade_hub.cli import interface
+from valutatrade_hub.core import usecases
+from valutatrade_hub.infra.database import DatabaseManager
+
+
+@pytest.fixture
+def cli(data_dir, monkeypatch):
+    """Сессия CLI в каталоге теста, без вошедшего пользователя"""
+    monkeypatch.setattr(interface, "SESSION_FILE", str(data_dir / "session.json"))
+    monkeypatch.setattr(interface, "current_user", None)
+    return data_dir
+
+
+def _batch(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_batch_runs_commands_against_one_warm_state(cli, monkeypatch, capsys):
+    backend = DatabaseManager().backend
+    reads = []
+    get_portfolio = backend.get_portfolio
+    monkeypatch.setattr(backend, "get_portfolio", lambda user_id: reads.append(user_id) or get_portfolio(user_id))
+    saves = []
+    save_portfolios = backend.save_portfolios
+    monkeypatch.setattr(backend, "save_portfolios",
+                        lambda items, entries=None: saves.append(len(items)) or save_portfolios(items, entries))
+
+    path = _batch(cli / "trades.txt", [
+        "# пакет сделок",
+        "register --username alice --password secret1",
+        "login --username alice --password secret1",
+        "deposit --currency USD --amount 1000",
+        "buy --currency BTC --amount 0.01",
+        "sell --currency BTC --amount 0.005",
+        "show-portfolio",
+        "commit",
+        "deposit --currency EUR --amount 10",
+    ])
+    assert interface.run_batch(path, interface.build_parser()) == 0
+
+    # портфель прочитан один раз, записан по commit и в конце пакета
+    assert reads == [1]
+    # пустой save_portfolios — доведение журнала операций при первом обращении к хранилищу
+    assert [n for n in saves if n] == [1, 1]
+    out = capsys.readouterr().out
+    assert "Ошибка" not in out
+    alice = usecases.login_user("alice", "secret1")
+    wallets = usecases.get_user_portfolio(alice).wallets
+    assert wallets["USD"].balance == pytest.approx(1000 - 600 + 300)
+    assert wallets["BTC"].balance == pytest.approx(0.005)
+    assert wallets["EUR"].balance == 10
+
+
+def test_failed_line_does_not_stop_batch_but_fails_exit_status(cli, monkeypatch, capsys):
+    path = _batch(cli / "trades.txt", [
+        "buy --currency BTC --amount 0.01",  # не выполнен login
+        "register --username bob --password secret1",
+        "login --username bob --password secret1",
+        "withdraw --currency USD --amount 5",  # средств нет
+        "buy --currency",  # ошибка разбора аргументов
+        "deposit --currency USD --amount 50",
+    ])
+    assert interface.run_batch(path, interface.build_parser()) == 3
+    assert "Строк с ошибкой: 3" in capsys.readouterr().out
+    bob = usecases.login_user("bob", "secret1")
+    assert usecases.get_user_portfolio(bob).wallets["USD"].balance == 50
+
+    monkeypatch.setattr(interface, "current_user", None)
+    monkeypatch.setattr(sys, "argv", ["valutatrade", "--batch", path])
+    with pytest.raises(SystemExit) as exit_info:
+        interface.main()
+    assert exit_info.value.code == 1
+
+    ok = _batch(cli / "ok.txt", ["login --username bob --password secret1", "show-portfolio"])
+    monkeypatch.setattr(sys, "argv", ["valutatrade", "--batch", ok])
+    with pytest.raises(SystemExit) as exit_info:
+        interface.main()
+    assert exit_info.value.code == 0
@@ -0,0 +1,151 @@
+import pytest
+
+from valutatrade_hub.parser_service.api_clients import CoinGeckoClient
+from valutatrade_hub.parser_service.config import config
+from valutatrade_hub.parser_service.daemon import RatesDaemon
+
+
+class _Client:
+    def __init__(self, name):
+        self.name = name
+
+
+class _Updater:
+    def __init__(self, names, fail=(), error=None):
+        self.clients = [_Client(name) for name in names]
+        self.fail = set(fail)
+        self.error = error
+        self.failed = []
+        self.calls = []
+
+    def run_update(self, clients):
+        self.calls.append([c.name for c in clients])
+        if self.error:
+            raise self.error
+        self.failed = [c.name for c in clients if c.name in self.fail]
+
+
+def _schedule(daemon, name):
+    return next(s for s in daemon.schedules if s.client.name == name)
+
+
+# ===== Расписание и backoff =====
+def test_sources_are_polled_on_their_own_intervals():
+    updater = _Updater(["fast", "slow"])
+    daemon = RatesDaemon(updater, {"fast": 10, "slow": 100})
+    pause = daemon.run_once()
+    assert updater.calls == [["fast", "slow"]]
+    assert 9 < pause <= 10
+    assert daemon.run_once() > 0
+    assert len(updater.calls) == 1
+    _schedule(daemon, "fast").next_run = 0
+    daemon.run_once()
+    assert updater.calls[-1] == ["fast"]
+
+
+def test_failures_back_off_exponentially_and_reset():
+    updater = _Updater(["flaky"], fail={"flaky"})
+    daemon = RatesDaemon(updater, {"flaky": 60})
+    schedule = _schedule(daemon, "flaky")
+    delays = []
+    for _ in range(4):
+        schedule.next_run = 0
+        delays.append(daemon.run_once())
+    assert schedule.failures == 4
+    for failures, delay in enumerate(delays, 1):
+        limit = min(config.BACKOFF_MAX_SECONDS, config.BACKOFF_BASE_SECONDS * 2 ** (failures - 1))
+        assert limit / 2 - 0.1 <= delay <= limit
+    updater.fail.clear()
+    schedule.next_run = 0
+    assert 59 < daemon.run_once() <= 60
+    assert schedule.failures == 0
+
+
+def test_backoff_is_capped():
+    daemon = RatesDaemon(_Updater([]), {})
+    assert daemon.backoff_delay(100) <= config.BACKOFF_MAX_SECONDS
+
+
+def test_update_error_counts_as_failure_of_every_due_source():
+    updater = _Updater(["a", "b"], error=OSError("disk full"))
+    daemon = RatesDaemon(updater, {"a": 60, "b": 60})
+    pause = daemon.run_once()
+    assert [s.failures for s in daemon.schedules] == [1, 1]
+    assert pause <= config.BACKOFF_BASE_SECONDS
+
+
+def test_no_sources_returns_default_interval():
+    daemon = RatesDaemon(_Updater([]), {})
+    assert daemon.run_once() == config.DEFAULT_REFRESH_INTERVAL
+
+
+# ===== Условные запросы =====
+class _Response:
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.headers = headers or {}
+
+    def json(self):
+        return self._payload
+
+
+class _Session:
+    """ETag зависит от версии данных и запрошенных ids; на совпадающий If-None-Match — 304"""
+
+    def __init__(self):
+        self.version = 1
+        self.prices = {"bitcoin": 64000.0, "ethereum": 3000.0}
+        self.sent = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        headers = headers or {}
+        self.sent.append(dict(headers))
+        ids = params["ids"]
+        etag = f'"v{self.version}-{ids}"'
+        if headers.get("If-None-Match") == etag:
+            return _Response(304, headers={"ETag": etag})
+        payload = {coin: {"usd": self.prices[coin]} for coin in ids.split(",")}
+        return _Response(200, payload, {"ETag": etag, "Last-Modified": "Mon, 01 Jan 2026 00:00:00 GMT"})
+
+
+@pytest.fixture
+def coingecko(monkeypatch):
+    monkeypatch.setattr(config, "CRYPTO_CURRENCIES", ("BTC", "ETH"))
+    session = _Session()
+    return CoinGeckoClient(url="http://stub/coingecko", session=session), session
+
+
+def _rates(result):
+    return {pair: quote["rate"] for pair, quote in result.items()}
+
+
+def test_etag_is_sent_and_304_reuses_last_response(coingecko):
+    client, session = coingecko
+    first = client.fetch_rates(["BTC_USD"])
+    assert _rates(first) == {"BTC_USD": 64000.0}
+    assert "If-None-Match" not in session.sent[0]
+
+    assert _rates(client.fetch_rates(["BTC_USD"])) == {"BTC_USD": 64000.0}
+    assert session.sent[1]["If-None-Match"] == '"v1-bitcoin"'
+    assert session.sent[1]["If-Modified-Since"] == "Mon, 01 Jan 2026 00:00:00 GMT"
+
+
+def test_validators_are_kept_per_requested_pairs(coingecko):
+    client, session = coingecko
+    client.fetch_rates(["BTC_USD"])
+    # другой набор пар — безусловный запрос, а не 304 с курсами прошлого набора
+    assert _rates(client.fetch_rates(["ETH_USD"])) == {"ETH_USD": 3000.0}
+    assert "If-None-Match" not in session.sent[1]
+    assert _rates(client.fetch_rates(["BTC_USD"])) == {"BTC_USD": 64000.0}
+    assert session.sent[2]["If-None-Match"] == '"v1-bitcoin"'
+    assert _rates(client.fetch_rates()) == {"BTC_USD": 64000.0, "ETH_USD": 3000.0}
+
+
+def test_changed_resource_is_fetched_again(coingecko):
+    client, session = coingecko
+    client.fetch_rates()
+    session.version, session.prices["bitcoin"] = 2, 65000.0
+    assert client.fetch_rates()["BTC_USD"]["rate"] == 65000.0
+    assert client.fetch_rates()["BTC_USD"]["rate"] == 65000.0
+    assert session.sent[-1]["If-None-Match"] == '"v2-bitcoin,ethereum"'
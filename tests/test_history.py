@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from valutatrade_hub.parser_service.config import config
+from valutatrade_hub.parser_service.history import ENTRY, RateHistory
+from valutatrade_hub.parser_service.storage import RatesStorage
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "HISTORY_FILE_PATH", str(tmp_path / "exchange_rates.json"))
+    monkeypatch.setattr(config, "HISTORY_DIR_PATH", str(tmp_path / "history"))
+    # по несколько записей на сегмент: запросы пересекают границы сегментов
+    monkeypatch.setattr(config, "HISTORY_SEGMENT_MAX_BYTES", 600)
+    return RatesStorage()
+
+
+def _at(minute):
+    return START + timedelta(minutes=minute)
+
+
+def _record(pair, minute, rate):
+    base, quote = pair.split("_")
+    return {"id": f"{pair}_{minute}", "from_currency": base, "to_currency": quote,
+            "rate": rate, "updated_at": _at(minute).isoformat()}
+
+
+def _write(storage, minutes, pair="BTC_USD"):
+    for minute in minutes:
+        storage.save_history_batch([_record(pair, minute, 60000.0 + minute), _record("ETH_USD", minute, 2000.0)])
+
+
+def _minutes(records):
+    return [int(r["id"].rsplit("_", 1)[1]) for r in records]
+
+
+def test_queries_across_segments(storage):
+    _write(storage, range(20))
+    assert len(storage.list_segments()) > 3
+    history = RateHistory(storage)
+    assert _minutes(history.range("BTC_USD", _at(3), _at(12))) == list(range(3, 13))
+    assert _minutes(history.range("BTC_USD")) == list(range(20))
+    assert _minutes(history.last("BTC_USD", 5)) == list(range(15, 20))
+    assert history.as_of("BTC_USD", _at(7) + timedelta(seconds=30))["rate"] == 60007.0
+    assert history.as_of("BTC_USD", _at(-1)) is None
+    assert history.range("XRP_USD") == []
+    assert history.pairs() == ["BTC_USD", "ETH_USD"]
+
+
+def test_incremental_refresh_picks_up_new_and_late_points(storage):
+    history = RateHistory(storage)
+    _write(storage, range(0, 20, 2))
+    assert history.count("BTC_USD") == 0
+    assert _minutes(history.last("BTC_USD", 3)) == [14, 16, 18]
+    _write(storage, [20, 22])
+    _write(storage, [5])  # запоздавшая точка — встаёт на своё место по времени
+    assert _minutes(history.range("BTC_USD", _at(4), _at(8))) == [4, 5, 6, 8]
+    assert _minutes(history.last("BTC_USD", 2)) == [20, 22]
+    assert history.count("BTC_USD") == 13
+
+
+def test_crash_before_state_save_does_not_duplicate_points(storage, monkeypatch):
+    history = RateHistory(storage)
+    _write(storage, range(5))
+    history.refresh_index()
+    _write(storage, range(5, 10))
+
+    def crash(state):
+        raise OSError("killed")
+
+    monkeypatch.setattr(history, "_save_state", crash)
+    with pytest.raises(OSError):
+        history.refresh_index()  # записи индекса дописаны, состояние — нет
+    assert history.count("BTC_USD") == 10
+    monkeypatch.undo()
+
+    assert _minutes(history.range("BTC_USD")) == list(range(10))
+    assert history.count("ETH_USD") == 10
+    assert history.as_of("BTC_USD", _at(9))["rate"] == 60009.0
+
+
+def test_torn_index_entry_is_dropped(storage):
+    history = RateHistory(storage)
+    _write(storage, range(3))
+    history.refresh_index()
+    with open(history._index_path("BTC_USD"), "ab") as f:
+        f.write(b"\0" * (ENTRY.size // 2))
+    _write(storage, [3])
+    assert _minutes(history.range("BTC_USD")) == [0, 1, 2, 3]
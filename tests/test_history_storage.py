@@ -0,0 +1,70 @@
+import json
+import multiprocessing
+
+import pytest
+
+from valutatrade_hub.parser_service.config import config
+from valutatrade_hub.parser_service.storage import RatesStorage
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "HISTORY_FILE_PATH", str(tmp_path / "exchange_rates.json"))
+    monkeypatch.setattr(config, "HISTORY_DIR_PATH", str(tmp_path / "history"))
+    monkeypatch.setattr(config, "HISTORY_SEGMENT_MAX_BYTES", 4096)
+    return RatesStorage()
+
+
+def _record(writer, n):
+    return {"id": f"BTC_USD_{writer}_{n}", "pair": "BTC_USD", "rate": 60000.0 + n,
+            "timestamp": "2026-01-01T00:00:00", "writer": writer}
+
+
+def _write(writer, batches):
+    storage = RatesStorage()
+    for batch in range(batches):
+        storage.save_history_batch([_record(writer, batch * 3 + i) for i in range(3)])
+
+
+def _migrate(barrier):
+    barrier.wait()
+    RatesStorage().ensure_history_dir()
+
+
+def _run(target, args_list):
+    ctx = multiprocessing.get_context("fork")
+    processes = [ctx.Process(target=target, args=args) for args in args_list]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join(30)
+    assert all(p.exitcode == 0 for p in processes)
+
+
+def test_torn_tail_is_cut_before_append(storage):
+    storage.save_history_batch([_record(0, 0)])
+    segment = storage.list_segments()[-1]
+    with open(segment, "ab") as f:
+        f.write(b'{"id": "torn"')
+    storage.save_history_batch([_record(0, 1)])
+    assert [r["id"] for r in storage.iter_history()] == ["BTC_USD_0_0", "BTC_USD_0_1"]
+
+
+def test_concurrent_writers_keep_every_line_whole(storage):
+    _run(_write, [(writer, 20) for writer in range(4)])
+    records = list(storage.iter_history())
+    assert len(records) == 4 * 20 * 3
+    assert len(storage.list_segments()) > 1
+    for path in storage.list_segments():
+        with open(path, "rb") as f:
+            for line in f:
+                json.loads(line)
+
+
+def test_legacy_history_is_migrated_once_under_race(storage, tmp_path):
+    legacy = [_record(9, n) for n in range(5)]
+    (tmp_path / "exchange_rates.json").write_text(json.dumps(legacy), encoding="utf-8")
+    barrier = multiprocessing.get_context("fork").Barrier(4)
+    _run(_migrate, [(barrier,)] * 4)
+    assert [r["id"] for r in storage.iter_history()] == [r["id"] for r in legacy]
+    assert not (tmp_path / "history.tmp").exists()
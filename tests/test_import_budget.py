@@ -0,0 +1,8 @@
+from benchmarks.import_budget import BUDGET_MS, FORBIDDEN, TARGET, measure
+
+
+def test_cli_import_stays_within_budget():
+    elapsed_ms, modules = measure(runs=5)
+    assert TARGET in modules
+    assert [m for m in FORBIDDEN if m in modules] == []
+    assert elapsed_ms <= BUDGET_MS, f"import {TARGET}: {elapsed_ms:.1f} мс > {BUDGET_MS:.0f} мс"
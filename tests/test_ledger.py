@@ -0,0 +1,95 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from valutatrade_hub.core import usecases
+from valutatrade_hub.infra.database import DatabaseManager
+
+
+def _units(user_id):
+    stored = DatabaseManager().backend.get_portfolio(user_id)
+    return {code: info["units"] for code, info in stored["wallets"].items()}
+
+
+def test_every_operation_is_posted_to_the_ledger(data_dir):
+    alice = usecases.register_user("alice", "pw")
+    usecases.deposit_currency(alice, "USD", 1000)
+    usecases.buy_currency(alice, "BTC", 0.01, "USD")
+    usecases.withdraw_currency(alice, "USD", 100)
+    entries = usecases.get_ledger_entries(alice)
+    assert [e["type"] for e in entries] == ["deposit", "buy", "withdraw"]
+    assert entries[1]["legs"] == {"BTC": 1000000, "USD": -60000}
+    assert [e["version"] for e in entries] == [1, 2, 3]
+
+
+def test_entries_posted_without_portfolio_save_are_replayed(data_dir):
+    alice = usecases.register_user("alice", "pw")
+    usecases.deposit_currency(alice, "USD", 10)
+    backend = DatabaseManager().backend
+    # процесс упал между записью журнала операций и сохранением портфеля
+    backend.ledger.append([{"user_id": alice.user_id, "type": "deposit", "legs": {"USD": 500}}],
+                          {alice.user_id: 2})
+    backend.recover_ledger()
+    assert _units(alice.user_id) == {"USD": 1500}
+    assert backend.get_portfolio(alice.user_id)["version"] == 2
+    # повторное проведение идемпотентно
+    backend.recover_ledger()
+    assert _units(alice.user_id) == {"USD": 1500}
+
+
+def test_checkpoints_are_incremental_and_answer_balance_at(data_dir):
+    backend = DatabaseManager().backend
+    backend.ledger.checkpoint_bytes = 300
+    alice = usecases.register_user("alice", "pw")
+    for _ in range(20):
+        usecases.deposit_currency(alice, "USD", 1)
+    usecases.deposit_currency(alice, "EUR", 2)
+    checkpoints = backend.ledger.checkpoints()
+    assert len(checkpoints) > 2
+    # контрольная точка = прошлая точка + хвост журнала
+    last = backend.ledger.load_checkpoint(checkpoints[-1])
+    assert 0 < last[alice.user_id]["USD"] <= 2000
+
+    now = datetime.now(timezone.utc)
+    balances = {code: w.units for code, w in usecases.get_balances_at(alice, now).items()}
+    assert balances == {"USD": 2000, "EUR": 200} == _units(alice.user_id)
+
+    first_ts = datetime.fromisoformat(backend.ledger.checkpoints()[0]["ts"])
+    with pytest.raises(ValueError):
+        usecases.get_balances_at(alice, first_ts - timedelta(days=1))
+
+
+class _FailingCommit:
+    """Соединение, у которого COMMIT не проходит (как при SQLITE_BUSY)"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def execute(self, sql, *args):
+        if sql == "COMMIT":
+            raise sqlite3.OperationalError("database is locked")
+        return self._conn.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+@pytest.mark.parametrize("data_dir", ["sqlite"], indirect=True)
+def test_failed_commit_rolls_back_ledger_entries(data_dir):
+    alice = usecases.register_user("alice", "pw")
+    usecases.deposit_currency(alice, "USD", 10)
+    backend = DatabaseManager().backend
+    end = backend.ledger.end()
+    conn, backend._conn = backend._conn, _FailingCommit(backend._conn)
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            usecases.deposit_currency(alice, "USD", 5)
+    finally:
+        backend._conn = conn
+    assert not conn.in_transaction
+    assert backend.ledger.end() == end
+    # следующее сохранение не доигрывает неудавшуюся сделку
+    usecases.deposit_currency(alice, "USD", 1)
+    assert _units(alice.user_id) == {"USD": 1100}
+    assert [e["legs"]["USD"] for e in usecases.get_ledger_entries(alice)] == [1000, 100]
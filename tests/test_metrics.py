@@ -0,0 +1,89 @@
+import multiprocessing
+import os
+
+import pytest
+
+from valutatrade_hub.core import metrics
+from valutatrade_hub.core.metrics import Histogram
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    """Пустой реестр процесса и файл экспорта в tmp_path"""
+    monkeypatch.setattr(metrics, "_series", {})
+    monkeypatch.setattr(metrics, "_path", None)
+    monkeypatch.setattr(metrics, "_enabled", None)
+    metrics.configure(str(tmp_path / "metrics.prom"), enabled=True)
+    return tmp_path / "metrics.prom"
+
+
+def _observed(*seconds):
+    h = Histogram()
+    for value in seconds:
+        h.observe(value)
+    return h
+
+
+def test_render_parse_round_trip():
+    series = {
+        ("usecase_seconds", (("function", "buy"), ("outcome", "ok"))): _observed(0.00001, 0.002, 0.002, 120.0),
+        ("storage_json_seconds", (("file", 'we"ird\\name\n.json'), ("outcome", "error"))): _observed(0.5),
+        ("plain_seconds", ()): _observed(3.0),
+        ("never_seconds", ()): Histogram(),
+    }
+    parsed = metrics.parse(metrics.render(series))
+    assert set(parsed) == set(series) - {("never_seconds", ())}
+    for key, h in parsed.items():
+        assert h.counts == series[key].counts
+        assert h.count == series[key].count
+        assert h.total == series[key].total
+    # значение за последним бакетом попадает в +Inf
+    assert parsed[("usecase_seconds", (("function", "buy"), ("outcome", "ok")))].counts[-1] == 1
+
+
+def test_configure_is_deferred_to_first_use(monkeypatch):
+    monkeypatch.setattr(metrics, "_path", None)
+    monkeypatch.setattr(metrics, "_enabled", None)
+    with metrics.timer("lazy_seconds"):
+        pass
+    assert metrics._enabled is True
+    # относительный metrics_path из настроек — от корня проекта, а не от текущего каталога
+    assert os.path.isabs(metrics.metrics_path())
+    assert metrics.metrics_path().startswith(metrics._ROOT)
+
+
+def test_disabled_metrics_skip_observation(registry, monkeypatch):
+    monkeypatch.setattr(metrics, "_enabled", False)
+    with metrics.timer("off_seconds"):
+        pass
+    assert metrics.histogram("off_seconds", outcome="ok").count == 0
+
+
+def _record_and_flush(path, seconds):
+    with metrics.timer("flush_seconds", op="child"):
+        pass
+    metrics.histogram("flush_seconds", op="shared", outcome="ok").observe(seconds)
+    metrics.flush(path)
+
+
+def test_flush_merges_processes_into_one_file(registry):
+    metrics.histogram("flush_seconds", op="shared", outcome="ok").observe(0.001)
+    assert metrics.flush() == 1
+    ctx = multiprocessing.get_context("fork")
+    processes = [ctx.Process(target=_record_and_flush, args=(str(registry), 0.2)) for _ in range(3)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+    metrics.histogram("flush_seconds", op="shared", outcome="ok").observe(0.002)
+    metrics.flush()
+
+    merged = metrics.load(str(registry))
+    shared = merged[("flush_seconds", (("op", "shared"), ("outcome", "ok")))]
+    assert shared.count == 5
+    assert shared.total == pytest.approx(0.001 + 0.002 + 3 * 0.2)
+    assert merged[("flush_seconds", (("op", "child"), ("outcome", "ok")))].count == 3
+    # счётчики процесса обнулены после слива, повторный слив ничего не добавляет
+    assert metrics.flush() == 0
+    assert not [name for name in os.listdir(registry.parent) if name.endswith(".tmp")]
@@ -0,0 +1,67 @@
+import copy
+import pickle
+
+import pytest
+
+from valutatrade_hub.core import usecases
+from valutatrade_hub.core.models import Portfolio, User, Wallet
+from valutatrade_hub.infra.settings import SettingsLoader
+
+
+@pytest.fixture
+def user(monkeypatch):
+    settings = SettingsLoader()
+    monkeypatch.setitem(settings._data, "password_kdf", "pbkdf2_sha256")
+    monkeypatch.setitem(settings._data, "password_pbkdf2_iterations", 1000)
+    return User(1, "alice", "secret1", "2026-01-01T00:00:00")
+
+
+def _portfolio(user):
+    return Portfolio(user, {"USD": Wallet("USD", units=123456), "BTC": Wallet("btc", 0.015)}, version=7)
+
+
+# ===== __slots__ =====
+def test_models_have_no_instance_dict(user):
+    for obj in (user, Wallet("USD", 1.5), _portfolio(user)):
+        assert not hasattr(obj, "__dict__")
+        with pytest.raises(AttributeError):
+            obj.unknown_attribute = 1
+
+
+def test_slots_keep_property_validation(user):
+    wallet = Wallet("USD", 1.0)
+    with pytest.raises(ValueError):
+        wallet.balance = -1
+    with pytest.raises(ValueError):
+        user.username = ""
+    # свойство без сеттера не становится атрибутом экземпляра
+    with pytest.raises(AttributeError):
+        wallet.units = 5
+
+
+# ===== Сериализация =====
+def test_pickle_round_trip(user):
+    portfolio = _portfolio(user)
+    for restored in (pickle.loads(pickle.dumps(portfolio)), copy.deepcopy(portfolio)):
+        assert restored.version == 7
+        assert restored.user.user_id == 1 and restored.user.username == "alice"
+        assert restored.user.registration_date == "2026-01-01T00:00:00"
+        assert restored.user.verify_password("secret1")
+        assert {code: (w.units, w.precision) for code, w in restored.wallets.items()} == {
+            "USD": (123456, 2), "BTC": (1500000, 8),
+        }
+        restored.get_wallet("USD").withdraw(1)
+        assert restored.get_wallet("USD").units == 123356
+        assert portfolio.get_wallet("USD").units == 123456
+
+
+def test_storage_record_round_trip(user):
+    restored = usecases._user_from_record(usecases._user_record(user))
+    assert usecases._user_record(restored) == usecases._user_record(user)
+    assert restored.verify_password("secret1")
+
+    portfolio = _portfolio(user)
+    records = usecases._wallet_records(portfolio.wallets)
+    wallets = {code: usecases._wallet_from_record(code, info) for code, info in records.items()}
+    assert {code: w.units for code, w in wallets.items()} == {"USD": 123456, "BTC": 1500000}
+    assert usecases._wallet_records(wallets) == records
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from valutatrade_hub.parser_service.config import config
+from valutatrade_hub.parser_service.providers import ProviderRegistry, aggregate_pair
+
+NOW = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setattr(config, "MAX_QUOTE_AGE_SECONDS", {"slow": 60})
+    monkeypatch.setattr(config, "DEFAULT_MAX_QUOTE_AGE_SECONDS", 600)
+    monkeypatch.setattr(config, "OUTLIER_MAX_DEVIATION", 0.05)
+
+
+def _quote(source, rate, age=0, weight=1.0):
+    return source, ({"source": source, "rate": rate, "updated_at": (NOW - timedelta(seconds=age)).isoformat()},
+                    weight)
+
+
+def _aggregate(*quotes, method="median"):
+    return aggregate_pair(dict(quotes), NOW, method)
+
+
+# ===== Сведение котировок =====
+def test_median_and_weighted_mean():
+    quotes = (_quote("a", 100.0, weight=1.0), _quote("b", 102.0, weight=3.0), _quote("c", 101.0, weight=1.0))
+    median = _aggregate(*quotes)
+    assert median["rate"] == 101.0
+    assert median["provenance"]["method"] == "median"
+    weighted = _aggregate(*quotes, method="weighted")
+    assert weighted["rate"] == pytest.approx((100.0 + 3 * 102.0 + 101.0) / 5)
+    assert weighted["provenance"]["method"] == "weighted"
+    assert weighted["source"] == "a, b, c"
+    assert weighted["updated_at"] == NOW.isoformat()
+
+    # две котировки: медиана — среднее
+    assert _aggregate(_quote("a", 100.0), _quote("b", 104.0))["rate"] == 102.0
+    single = _aggregate(_quote("a", 100.0), method="weighted")
+    assert single["rate"] == 100.0 and single["provenance"]["method"] == "single"
+
+
+def test_stale_provider_is_dropped():
+    # порог возраста — свой у источника slow (60 с), у остальных — по умолчанию (600 с)
+    result = _aggregate(_quote("fresh", 100.0, age=300), _quote("slow", 90.0, age=120))
+    assert result["rate"] == 100.0
+    assert result["provenance"]["method"] == "single"
+    assert [(r["source"], r["reason"]) for r in result["provenance"]["rejected"]] == [("slow", "stale")]
+
+    assert _aggregate(_quote("slow", 90.0, age=120), _quote("old", 95.0, age=601)) is None
+
+
+def test_outlier_is_dropped_from_three_or_more():
+    result = _aggregate(_quote("a", 100.0), _quote("b", 101.0), _quote("c", 99.5), _quote("bad", 130.0))
+    assert result["rate"] == 100.0
+    assert [e["source"] for e in result["provenance"]["quotes"]] == ["a", "b", "c"]
+    assert [(r["source"], r["reason"]) for r in result["provenance"]["rejected"]] == [("bad", "outlier")]
+
+    # из двух котировок выброс не определить — сводятся обе
+    assert _aggregate(_quote("a", 100.0), _quote("bad", 130.0))["rate"] == 115.0
+
+
+def test_stale_and_outlier_together():
+    result = _aggregate(_quote("a", 100.0), _quote("b", 100.4), _quote("c", 80.0),
+                        _quote("slow", 100.2, age=61), method="weighted")
+    assert result["rate"] == pytest.approx(100.2)
+    assert sorted((r["source"], r["reason"]) for r in result["provenance"]["rejected"]) == [
+        ("c", "outlier"), ("slow", "stale"),
+    ]
+
+
+# ===== Выбор источников =====
+class _Client:
+    def __init__(self, name, pairs, weight=1.0, available=True):
+        self.name, self.pairs, self.weight, self.available = name, frozenset(pairs), weight, available
+
+
+def test_registry_selects_heaviest_sources_per_pair(monkeypatch):
+    monkeypatch.setattr(config, "PROVIDERS_PER_PAIR", 2)
+    clients = [_Client("light", {"BTC_USD"}, 0.5), _Client("heavy", {"BTC_USD", "ETH_USD"}, 2.0),
+               _Client("mid", {"BTC_USD"}, 1.0), _Client("down", {"ETH_USD"}, 3.0, available=False)]
+    registry = ProviderRegistry(clients)
+    assert [c.name for c in registry.select()] == ["heavy", "mid"]
+    assert [c.name for c in registry.select(sources=["down", "light"])] == ["down", "light"]
+    with pytest.raises(ValueError, match="Неизвестный источник"):
+        registry.select(sources=["nope"])
@@ -0,0 +1,119 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from valutatrade_hub.core.exceptions import RateUnavailableError
+from valutatrade_hub.core.rate_engine import RateResolver, build_closure
+
+
+def _snapshot(path, pairs, age=timedelta(0)):
+    refreshed = (datetime.now(timezone.utc) - age).isoformat()
+    path.write_text(json.dumps({
+        "pairs": {pair: {"rate": rate, "updated_at": refreshed} for pair, rate in pairs.items()},
+        "last_refresh": refreshed,
+    }), encoding="utf-8")
+
+
+def _resolver(path, refreshes, grace=None):
+    return RateResolver(rates_file=str(path), ttl_seconds=3600, grace_seconds=grace,
+                        refresh=lambda: refreshes.append(1))
+
+
+# ===== Граф курсов =====
+def test_closure_direct_inverse_and_cross():
+    closure = build_closure({"BTC_USD": {"rate": 60000.0}, "EUR_USD": {"rate": 1.2}})
+    assert closure[("BTC", "USD")] == 60000.0
+    assert closure[("USD", "EUR")] == pytest.approx(1 / 1.2)
+    # BTC → USD → EUR
+    assert closure[("BTC", "EUR")] == pytest.approx(50000.0)
+    assert closure[("EUR", "BTC")] == pytest.approx(1 / 50000.0)
+
+
+def test_closure_prefers_direct_pair_over_inverse():
+    closure = build_closure({"EUR_USD": {"rate": 1.2}, "USD_EUR": {"rate": 0.8}})
+    assert closure[("EUR", "USD")] == 1.2
+    assert closure[("USD", "EUR")] == 0.8
+
+
+def test_closure_skips_unreachable_and_invalid():
+    closure = build_closure({"BTC_USD": {"rate": 60000.0}, "GBP_JPY": {"rate": 190.0}, "BAD": {"rate": 1.0},
+                             "ETH_USD": {"rate": 0}})
+    assert ("BTC", "JPY") not in closure
+    assert ("ETH", "USD") not in closure
+
+
+def test_resolver_rates_to_base(tmp_path):
+    path = tmp_path / "rates.json"
+    _snapshot(path, {"BTC_USD": 60000.0, "EUR_USD": 1.2})
+    rates = _resolver(path, []).rates_to("eur")
+    assert rates["EUR"] == 1.0
+    assert rates["BTC"] == pytest.approx(50000.0)
+    assert rates["USD"] == pytest.approx(1 / 1.2)
+
+
+def test_resolver_unknown_pair(tmp_path):
+    path = tmp_path / "rates.json"
+    _snapshot(path, {"BTC_USD": 60000.0})
+    resolver = _resolver(path, [])
+    assert resolver.get_rate("usd", "USD") == 1.0
+    with pytest.raises(RateUnavailableError):
+        resolver.get_rate("BTC", "JPY")
+
+
+# ===== Устаревание =====
+def test_fresh_snapshot_does_not_refresh(tmp_path):
+    path = tmp_path / "rates.json"
+    refreshes = []
+    _snapshot(path, {"BTC_USD": 60000.0}, age=timedelta(minutes=5))
+    resolver = _resolver(path, refreshes)
+    assert resolver.get_rate("BTC", "USD") == 60000.0
+    assert not resolver.is_stale()
+    assert refreshes == []
+
+
+def test_stale_snapshot_is_served_and_refreshed_in_background(tmp_path):
+    path = tmp_path / "rates.json"
+    refreshes = []
+    _snapshot(path, {"BTC_USD": 60000.0}, age=timedelta(hours=2))
+    resolver = _resolver(path, refreshes)
+    assert resolver.get_rate("BTC", "USD") == 60000.0
+    assert resolver.is_stale()
+    assert refreshes == [1]
+
+
+def test_without_grace_even_old_rates_are_usable_for_trades(tmp_path):
+    path = tmp_path / "rates.json"
+    _snapshot(path, {"BTC_USD": 60000.0}, age=timedelta(days=300))
+    resolver = _resolver(path, [])
+    assert resolver.get_rate("BTC", "USD", strict=True) == 60000.0
+
+
+def test_grace_cutoff_applies_to_strict_reads_only(tmp_path):
+    path = tmp_path / "rates.json"
+    _snapshot(path, {"BTC_USD": 60000.0}, age=timedelta(days=3))
+    resolver = _resolver(path, [], grace=86400)
+    assert resolver.get_rate("BTC", "USD") == 60000.0
+    assert resolver.rates_to("USD")["BTC"] == 60000.0
+    with pytest.raises(RateUnavailableError):
+        resolver.get_rate("BTC", "USD", strict=True)
+    with pytest.raises(RateUnavailableError):
+        resolver.rates_to("USD", strict=True)
+
+
+def test_within_grace_strict_reads_succeed(tmp_path):
+    path = tmp_path / "rates.json"
+    _snapshot(path, {"BTC_USD": 60000.0}, age=timedelta(hours=2))
+    resolver = _resolver(path, [], grace=86400)
+    assert resolver.get_rate("BTC", "USD", strict=True) == 60000.0
+
+
+def test_new_snapshot_is_picked_up(tmp_path):
+    path = tmp_path / "rates.json"
+    _snapshot(path, {"BTC_USD": 60000.0}, age=timedelta(hours=2))
+    resolver = _resolver(path, [])
+    assert resolver.get_rate("BTC", "USD") == 60000.0
+    _snapshot(path, {"BTC_USD": 61000.0})
+    resolver.invalidate()
+    assert resolver.get_rate("BTC", "USD") == 61000.0
+    assert not resolver.is_stale()
@@ -0,0 +1,93 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+from valutatrade_hub.infra.database import _append_records, _save_records
+from valutatrade_hub.infra.record_index import RecordIndex, scan_records
+
+_lock = threading.Lock()
+
+
+@contextmanager
+def _locked():
+    with _lock:
+        yield
+
+
+def _users(ids):
+    return [{"user_id": i, "username": f"user{i}", "salt": "ü" if i % 7 == 0 else "s"} for i in ids]
+
+
+def _index(path):
+    return RecordIndex(str(path), ("username", "user_id"), _locked)
+
+
+def test_scan_records_offsets_point_at_records(tmp_path):
+    path = tmp_path / "users.json"
+    path.write_text(json.dumps(_users(range(1, 5)) + [{"user_id": 5, "username": "юзер"}], indent=2),
+                    encoding="utf-8")
+    data = path.read_bytes()
+    scanned = list(scan_records(data, ("username", "user_id")))
+    assert [keys["user_id"] for keys, _, _ in scanned] == [1, 2, 3, 4, 5]
+    assert scanned[-1][0]["username"] == "юзер"
+    for keys, offset, length in scanned:
+        assert json.loads(data[offset:offset + length])["user_id"] == keys["user_id"]
+
+
+def test_lookup_builds_missing_index(tmp_path):
+    path = tmp_path / "users.json"
+    path.write_text(json.dumps(_users(range(1, 101)), indent=2), encoding="utf-8")
+    index = _index(path)
+    assert index.get("username", "user42")["user_id"] == 42
+    assert index.get("user_id", 99)["username"] == "user99"
+    assert index.get("username", "nobody") is None
+    assert index.get("user_id", 1000) is None
+    assert index.max_id() == 100
+    assert os.path.exists(index.path)
+
+
+def test_missing_file(tmp_path):
+    index = _index(tmp_path / "users.json")
+    assert index.get("username", "user1") is None
+    assert index.max_id() == 0
+
+
+def test_lookup_after_append_grows_table(tmp_path):
+    path = tmp_path / "users.json"
+    index = _index(path)
+    index.rebuilt(*_save_records(str(path), _users(range(1, 4))))
+    for start in range(4, 200, 20):
+        index.ensure()
+        index.appended(*_append_records(str(path), _users(range(start, start + 20))))
+    records = json.loads(path.read_text(encoding="utf-8"))
+    assert [r["user_id"] for r in records] == list(range(1, 204))
+    assert index.max_id() == 203
+    for i in (1, 3, 4, 77, 203):
+        assert index.get("username", f"user{i}")["user_id"] == i
+        assert index.get("user_id", i)["username"] == f"user{i}"
+
+
+def test_lookup_after_rewrite(tmp_path):
+    path = tmp_path / "users.json"
+    index = _index(path)
+    index.rebuilt(*_save_records(str(path), _users(range(1, 50))))
+    changed = _users(range(10, 60))
+    changed[0]["username"] = "renamed"
+    index.rebuilt(*_save_records(str(path), changed))
+    assert index.get("username", "renamed")["user_id"] == 10
+    assert index.get("username", "user10") is None
+    assert index.get("user_id", 5) is None
+    assert index.max_id() == 59
+
+
+def test_file_replaced_behind_index_is_detected(tmp_path):
+    path = tmp_path / "users.json"
+    index = _index(path)
+    index.rebuilt(*_save_records(str(path), _users(range(1, 10))))
+    # файл переписан в обход индекса: смещения другие, заголовок индекса не совпадает
+    path.write_text(json.dumps([{"user_id": 500, "username": "manual"}] + _users(range(1, 10))),
+                    encoding="utf-8")
+    assert index.get("username", "manual")["user_id"] == 500
+    assert index.get("username", "user3")["user_id"] == 3
+    assert index.max_id() == 500
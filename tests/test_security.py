@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import time
+
+import pytest
+
+from valutatrade_hub.core import security, usecases
+from valutatrade_hub.infra.database import DatabaseManager
+from valutatrade_hub.infra.settings import SettingsLoader
+
+KEY = b"k" * 32
+
+
+# ===== Хеширование паролей =====
+def test_hash_records_kdf_and_parameters():
+    encoded = security.hash_password("secret", "salt", "pbkdf2_sha256", {"i": 1000})
+    assert encoded.startswith("pbkdf2_sha256$i=1000$")
+    assert security.verify_password("secret", "salt", encoded)
+    assert not security.verify_password("Secret", "salt", encoded)
+    assert not security.verify_password("secret", "other", encoded)
+
+    encoded = security.hash_password("secret", "salt", "scrypt", {"n": 1024, "r": 8, "p": 1})
+    assert encoded.startswith("scrypt$n=1024,r=8,p=1$")
+    assert security.verify_password("secret", "salt", encoded)
+
+
+def test_legacy_sha256_hash_verifies_and_needs_rehash():
+    legacy = hashlib.sha256(b"secretsalt").hexdigest()
+    assert security.verify_password("secret", "salt", legacy)
+    assert not security.verify_password("wrong", "salt", legacy)
+    assert security.needs_rehash(legacy)
+
+
+def test_needs_rehash_follows_settings(monkeypatch):
+    settings = SettingsLoader()
+    monkeypatch.setitem(settings._data, "password_kdf", "pbkdf2_sha256")
+    monkeypatch.setitem(settings._data, "password_pbkdf2_iterations", 1000)
+    encoded = security.hash_password("secret", "salt")
+    assert not security.needs_rehash(encoded)
+    monkeypatch.setitem(settings._data, "password_pbkdf2_iterations", 2000)
+    assert security.needs_rehash(encoded)
+
+
+def test_unknown_kdf_is_rejected(monkeypatch):
+    monkeypatch.setitem(SettingsLoader()._data, "password_kdf", "md5")
+    with pytest.raises(ValueError):
+        security.kdf_params()
+
+
+def test_login_rehashes_legacy_hash(data_dir):
+    backend = DatabaseManager().backend
+    backend.add_user({"user_id": 1, "username": "old", "salt": "abcd",
+                      "hashed_password": hashlib.sha256(b"pwabcd").hexdigest(),
+                      "registration_date": "2026-01-01T00:00:00"})
+    with pytest.raises(ValueError):
+        usecases.login_user("old", "wrong")
+    assert "$" not in backend.get_user_by_id(1)["hashed_password"]
+
+    user = usecases.login_user("old", "pw")
+    stored = backend.get_user_by_id(1)
+    assert stored["hashed_password"].startswith("pbkdf2_sha256$i=1000$")
+    assert stored["salt"] != "abcd"
+    assert stored["hashed_password"] == user._hashed_password
+    # повторный вход — по новому хешу, без пересчёта
+    assert usecases.login_user("old", "pw")._hashed_password == stored["hashed_password"]
+
+
+# ===== Токены сессии =====
+def test_token_round_trip():
+    token = security.issue_token(KEY, 7, "hash", 60)
+    assert security.token_user_id(token) == 7
+    assert security.verify_token(KEY, token, "hash")
+
+
+def test_expired_token_is_rejected():
+    token = security.issue_token(KEY, 7, "hash", -1)
+    assert not security.verify_token(KEY, token, "hash")
+
+
+@pytest.mark.parametrize("tamper", [
+    lambda t: t[:-1] + ("0" if t[-1] != "0" else "1"),          # подпись
+    lambda t: t.replace("v1.7.", "v1.8.", 1),                   # user_id
+    lambda t: "v1.7.{}.{}".format(int(time.time()) + 10 ** 6, t.rsplit(".", 1)[1]),  # срок
+])
+def test_tampered_token_is_rejected(tamper):
+    token = security.issue_token(KEY, 7, "hash", 60)
+    assert not security.verify_token(KEY, tamper(token), "hash")
+
+
+def test_token_is_bound_to_key_and_password_hash():
+    token = security.issue_token(KEY, 7, "hash", 60)
+    assert not security.verify_token(b"x" * 32, token, "hash")
+    assert not security.verify_token(KEY, token, "new-hash")
+
+
+@pytest.mark.parametrize("token", ["", "garbage", "v2.1.1.ab", "v1.x.1.ab", "v1.1.1"])
+def test_malformed_token(token):
+    assert security.token_user_id(token) is None or not security.verify_token(KEY, token, "hash")
+
+
+def test_load_key_is_created_once_with_owner_only_access(tmp_path):
+    path = str(tmp_path / "session.key")
+    key = security.load_key(path)
+    assert len(key) == security.KEY_BYTES
+    assert security.load_key(path) == key
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+
+def test_resume_session(data_dir, monkeypatch):
+    user = usecases.register_user("alice", "pw")
+    token = usecases.issue_session(user)
+    assert usecases.resume_session(token).username == "alice"
+    assert usecases.resume_session(token + "0") is None
+    # смена параметров KDF и вход с rehash отзывают старый токен
+    monkeypatch.setitem(SettingsLoader()._data, "password_pbkdf2_iterations", 1001)
+    usecases.login_user("alice", "pw")
+    assert usecases.resume_session(token) is None
+    assert (data_dir / usecases.SESSION_KEY_FILE).exists()
+
+
+def test_register_users_in_bulk(data_dir):
+    usecases.register_user("taken", "pw")
+    users, skipped = usecases.register_users(
+        [("a", "1"), ("b", "2"), ("taken", "3"), ("a", "4"), ("", "5")], workers=1)
+    assert [u.username for u in users] == ["a", "b"]
+    assert [u.user_id for u in users] == [2, 3]
+    assert [name for name, _ in skipped] == ["taken", "a", ""]
+    assert usecases.login_user("b", "2").user_id == 3
+    assert DatabaseManager().backend.get_portfolio(3)["version"] == 0
+
+
+@pytest.mark.parametrize("data_dir", ["json"], indirect=True)
+def test_registration_reuses_orphaned_portfolio(data_dir):
+    # регистрация упала после записи портфеля, но до записи пользователя
+    with open(data_dir / "portfolios.json", "w", encoding="utf-8") as f:
+        json.dump([{"user_id": 1, "wallets": {}, "version": 0}], f)
+    user = usecases.register_user("alice", "pw")
+    assert user.user_id == 1
+    with open(data_dir / "portfolios.json", "r", encoding="utf-8") as f:
+        assert [p["user_id"] for p in json.load(f)] == [1]
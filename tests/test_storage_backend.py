@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from valutatrade_hub.core.currencies import record_units, units_record
+from valutatrade_hub.infra.database import DatabaseManager
+from valutatrade_hub.infra.settings import SettingsLoader
+
+
+def test_sqlite_is_default_and_imports_json_data(tmp_path, monkeypatch):
+    monkeypatch.delitem(SettingsLoader()._data, "storage_backend", raising=False)
+    (tmp_path / "users.json").write_text(json.dumps([{
+        "user_id": 1, "username": "alice", "hashed_password": "h", "salt": "s",
+        "registration_date": "2026-01-01T00:00:00",
+    }]), encoding="utf-8")
+    (tmp_path / "portfolios.json").write_text(json.dumps([{
+        "user_id": 1, "version": 3, "wallets": {"USD": {"balance": 10.5, "units": 1050}},
+    }]), encoding="utf-8")
+    DatabaseManager._instance = None
+    try:
+        backend = DatabaseManager(str(tmp_path)).backend
+        assert type(backend).__name__ == "SqliteStorageBackend"
+        assert (tmp_path / "valutatrade.db").exists()
+        assert backend.get_user_by_username("alice")["user_id"] == 1
+        portfolio = backend.get_portfolio(1)
+        assert portfolio["version"] == 3
+        assert portfolio["wallets"]["USD"]["units"] == 1050
+    finally:
+        DatabaseManager._instance = None
+
+
+@pytest.mark.parametrize("data_dir", ["sqlite"], indirect=True)
+@pytest.mark.parametrize("expected_version", [None, 0])
+def test_sqlite_portfolio_of_unknown_user_is_rejected(data_dir, expected_version):
+    backend = DatabaseManager().backend
+    end = backend.ledger.end()
+    with pytest.raises(ValueError, match="не найден"):
+        backend.save_portfolio(42, {"USD": {"balance": 1.0, "units": 100}}, expected_version=expected_version,
+                               entries=[{"user_id": 42, "type": "deposit", "legs": {"USD": 100}}])
+    # транзакция и запись журнала операций откатены
+    assert backend.get_portfolio(42) is None
+    assert backend.ledger.end() == end
+
+
+def test_sqlite_keeps_wallet_precision_marker(tmp_path, monkeypatch):
+    monkeypatch.delitem(SettingsLoader()._data, "storage_backend", raising=False)
+    (tmp_path / "users.json").write_text(json.dumps([{
+        "user_id": 1, "username": "alice", "hashed_password": "h", "salt": "s",
+        "registration_date": "2026-01-01T00:00:00",
+    }]), encoding="utf-8")
+    (tmp_path / "portfolios.json").write_text(json.dumps([{
+        "user_id": 1, "version": 0, "wallets": {
+            "USD": {"balance": 10.5, "units": 1050000000, "precision": 8},
+            "EUR": {"balance": 2.0, "units": 200},
+        },
+    }]), encoding="utf-8")
+    DatabaseManager._instance = None
+    try:
+        backend = DatabaseManager(str(tmp_path)).backend
+        wallets = backend.get_portfolio(1)["wallets"]
+        assert wallets["USD"] == {"balance": 10.5, "units": 1050000000, "precision": 8}
+        assert wallets["EUR"] == {"balance": 2.0, "units": 200}
+        assert record_units("USD", wallets["USD"]) == 1050
+        backend.save_portfolio(1, {"USD": units_record("USD", 1050)}, expected_version=0)
+        assert backend.get_portfolio(1)["wallets"]["USD"] == {"balance": 10.5, "units": 1050, "precision": 2}
+    finally:
+        DatabaseManager._instance = None
@@ -0,0 +1,70 @@
+from decimal import Decimal
+
+import pytest
+
+from valutatrade_hub.core.models import Wallet
+from valutatrade_hub.core.trading import BUY, SELL, Order, TradeEngine
+
+
+class FixedRates:
+    def __init__(self, rates: dict):
+        self.rates = rates
+
+    def get_rate(self, currency, quote, strict=False):
+        return self.rates[(currency, quote)]
+
+
+def _engine(rate):
+    return TradeEngine(FixedRates({("BTC", "USD"): rate}))
+
+
+def test_buy_cost_is_rounded_up():
+    # 0.00001 BTC * 64491.13 = 0.6449113 USD
+    fill = _engine(64491.13).quote(Order(1, BUY, "BTC", 0.00001, "USD"))
+    assert fill.units == 1000
+    assert fill.quote_units == 65  # -> 0.65
+    assert fill.price == Decimal("64491.13")
+
+
+def test_sell_proceeds_are_rounded_down():
+    fill = _engine(64491.13).quote(Order(1, SELL, "BTC", 0.00001, "USD"))
+    assert fill.quote_units == 64  # 0.6449113 USD -> 0.64
+
+
+def test_exact_amounts_are_not_rounded():
+    engine = _engine(60000.0)
+    assert engine.quote(Order(1, BUY, "BTC", 0.5, "USD")).quote_units == 3000000
+    assert engine.quote(Order(1, SELL, "BTC", 0.5, "USD")).quote_units == 3000000
+
+
+def test_sell_worth_less_than_minor_unit_is_rejected():
+    with pytest.raises(ValueError):
+        _engine(0.5).quote(Order(1, SELL, "BTC", 0.00000001, "USD"))
+
+
+def test_round_trip_never_creates_money():
+    engine = _engine(64491.13)
+    wallets = {"USD": Wallet("USD", 1000.0)}
+    for _ in range(100):
+        engine.execute(wallets, Order(1, BUY, "BTC", 0.00001, "USD"))
+        engine.execute(wallets, Order(1, SELL, "BTC", 0.00001, "USD"))
+    assert wallets["BTC"].units == 0
+    assert wallets["USD"].units == 100000 - 100
+
+
+def test_failed_debit_changes_nothing():
+    engine = _engine(60000.0)
+    wallets = {"USD": Wallet("USD", 10.0)}
+    with pytest.raises(ValueError):
+        engine.execute(wallets, Order(1, BUY, "BTC", 1, "USD"))
+    assert wallets["USD"].units == 1000
+    assert "BTC" not in wallets
+
+
+def test_order_validation():
+    with pytest.raises(ValueError):
+        Order(1, "hold", "BTC", 1, "USD")
+    with pytest.raises(ValueError):
+        Order(1, BUY, "USD", 1, "USD")
+    with pytest.raises(ValueError):
+        _engine(60000.0).quote(Order(1, BUY, "BTC", 0, "USD"))
@@ -0,0 +1,92 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from valutatrade_hub.parser_service.config import config
+from valutatrade_hub.parser_service.history import RateHistory
+from valutatrade_hub.parser_service.updater import RatesUpdater
+
+
+class _Client:
+    """Источник с заданными котировками"""
+
+    deadline = 5.0
+    weight = 1.0
+
+    def __init__(self, name, rates):
+        self.name = name
+        self.rates = rates
+
+    def fetch_rates(self, pairs=None):
+        now = datetime.now(timezone.utc).isoformat()
+        return {pair: {"rate": rate, "updated_at": now, "source": self.name} for pair, rate in self.rates.items()}
+
+
+@pytest.fixture
+def updater(tmp_path, monkeypatch):
+    for key, name in (("RATES_FILE_PATH", "rates.json"), ("CONFIRMATIONS_FILE_PATH", "rates_confirmed.json"),
+                      ("HISTORY_FILE_PATH", "exchange_rates.json"), ("HISTORY_DIR_PATH", "history")):
+        monkeypatch.setattr(config, key, str(tmp_path / name))
+    monkeypatch.setattr(config, "DEFAULT_RATE_EPSILON", ("rel", 0.001))
+    monkeypatch.setattr(config, "RATE_EPSILONS", {"BTC_USD": ("abs", 5.0)})
+    client = _Client("fake", {})
+    updater = RatesUpdater([client])
+    updater.storage.update_rates_snapshot({
+        "BTC_USD": {"rate": 60000.0, "updated_at": "2026-01-01T00:00:00+00:00", "source": "seed"},
+        "ETH_USD": {"rate": 2000.0, "updated_at": "2026-01-01T00:00:00+00:00", "source": "seed"},
+    })
+    return updater, client
+
+
+# ===== Порог изменения =====
+def test_relative_epsilon_by_default(updater):
+    assert not RatesUpdater.is_changed("ETH_USD", 2000.0, 2001.0)
+    assert not RatesUpdater.is_changed("ETH_USD", 2000.0, 1999.0)
+    assert RatesUpdater.is_changed("ETH_USD", 2000.0, 2002.5)
+    assert RatesUpdater.is_changed("ETH_USD", 2000.0, 1997.5)
+    assert RatesUpdater.is_changed("ETH_USD", None, 2000.0)
+
+
+def test_per_pair_epsilon_overrides_default(updater):
+    # для BTC_USD абсолютный порог 5: относительный 0.1 % (60) пропустил бы оба изменения
+    assert not RatesUpdater.is_changed("BTC_USD", 60000.0, 60004.0)
+    assert RatesUpdater.is_changed("BTC_USD", 60000.0, 60006.0)
+    assert RatesUpdater.is_changed("BTC_USD", 60000.0, 59994.0)
+
+
+def test_zero_epsilon_reports_any_change(monkeypatch):
+    monkeypatch.setattr(config, "DEFAULT_RATE_EPSILON", ("rel", 0.0))
+    monkeypatch.setattr(config, "RATE_EPSILONS", {})
+    assert RatesUpdater.is_changed("BTC_USD", 60000.0, 60000.000001)
+    assert not RatesUpdater.is_changed("BTC_USD", 60000.0, 60000.0)
+
+
+# ===== Запись курсов =====
+def test_change_below_epsilon_only_confirms(updater):
+    updater, client = updater
+    client.rates = {"BTC_USD": 60003.0, "ETH_USD": 2001.0}
+    assert updater.run_update() is False
+
+    snapshot = updater.storage.load_snapshot()
+    assert snapshot["pairs"]["BTC_USD"]["rate"] == 60000.0
+    assert snapshot["pairs"]["ETH_USD"]["rate"] == 2000.0
+    assert RateHistory(updater.storage).range("BTC_USD") == []
+    # курсы не записаны, но подтверждены источником
+    confirmations = updater.storage.load_confirmations()
+    assert confirmations["last_confirmed"] is not None
+    assert confirmations["pairs"] == {"BTC_USD": confirmations["last_confirmed"],
+                                      "ETH_USD": confirmations["last_confirmed"]}
+
+
+def test_change_above_epsilon_writes_only_changed_pairs(updater):
+    updater, client = updater
+    client.rates = {"BTC_USD": 60010.0, "ETH_USD": 2001.0}
+    assert updater.run_update() is True
+
+    snapshot = updater.storage.load_snapshot()
+    assert snapshot["pairs"]["BTC_USD"]["rate"] == 60010.0
+    assert snapshot["pairs"]["ETH_USD"]["rate"] == 2000.0
+    history = RateHistory(updater.storage)
+    assert [r["rate"] for r in history.range("BTC_USD")] == [60010.0]
+    assert history.range("ETH_USD") == []
+    assert set(updater.storage.load_confirmations()["pairs"]) == {"BTC_USD", "ETH_USD"}
@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+from valutatrade_hub.core import usecases
+from valutatrade_hub.core.currencies import units_record
+from valutatrade_hub.core.models import Portfolio, Wallet
+from valutatrade_hub.core.valuation import build_balance_matrix, value_portfolios
+
+RATES = {"USD": 1.0, "EUR": 1.25, "BTC": 60000.0, "ETH": 2000.0}
+
+
+def _scalar_total(record, rates):
+    """Оценка одного портфеля скалярным путём — Portfolio.get_total_value"""
+    wallets = {code: Wallet(code, units=info["units"]) for code, info in record["wallets"].items()}
+    return Portfolio(None, wallets).get_total_value("USD", rates)
+
+
+def _portfolios(count, seed=7):
+    rng = random.Random(seed)
+    portfolios = []
+    for user_id in range(1, count + 1):
+        codes = rng.sample(["USD", "EUR", "BTC", "ETH", "XYZ"], rng.randint(1, 5))
+        portfolios.append({"user_id": user_id, "wallets": {
+            code: units_record(code, rng.randint(0, 10 ** 9)) for code in codes
+        }})
+    return portfolios
+
+
+def test_matrix_valuation_matches_scalar_path():
+    portfolios = _portfolios(200)
+    portfolios.insert(50, {"user_id": 999, "wallets": {}})
+    report = value_portfolios(portfolios, "usd", RATES)
+
+    expected = {p["user_id"]: _scalar_total(p, RATES) for p in portfolios}
+    totals = dict(report.top())
+    assert set(totals) == set(expected)
+    for user_id, total in totals.items():
+        assert total == pytest.approx(expected[user_id], rel=1e-12)
+    assert totals[999] == 0.0
+    # по убыванию, равные итоги — в исходном порядке
+    assert report.totals.tolist() == sorted(report.totals.tolist(), reverse=True)
+    assert report.base == "USD"
+
+
+def test_currency_without_rate_is_reported_and_excluded():
+    portfolios = [
+        {"user_id": 1, "wallets": {"XYZ": units_record("XYZ", 10 ** 9), "EUR": units_record("EUR", 200)}},
+        {"user_id": 2, "wallets": {"USD": units_record("USD", 100)}},
+    ]
+    report = value_portfolios(portfolios, "USD", RATES)
+    assert report.missing_rates == ["XYZ"]
+    assert report.top() == [(1, 2.5), (2, 1.0)]
+    assert dict(report.top())[1] == _scalar_total(portfolios[0], RATES)
+
+
+def test_empty_portfolios():
+    user_ids, codes, matrix = build_balance_matrix([])
+    assert codes == [] and matrix.shape == (0, 0) and len(user_ids) == 0
+    report = value_portfolios([], "USD", RATES)
+    assert report.top() == [] and report.missing_rates == []
+
+    report = value_portfolios([{"user_id": 1, "wallets": {}}, {"user_id": 2}], "USD", RATES)
+    assert report.top() == [(1, 0.0), (2, 0.0)]
+
+
+def test_value_all_portfolios_matches_user_portfolios(data_dir):
+    alice = usecases.register_user("alice", "pw")
+    bob = usecases.register_user("bob", "pw")
+    carol = usecases.register_user("carol", "pw")  # пустой портфель
+    usecases.deposit_currency(alice, "USD", 1000)
+    usecases.buy_currency(alice, "BTC", 0.01, "USD")
+    usecases.deposit_currency(bob, "EUR", 300)
+    usecases.buy_currency(bob, "ETH", 0.1, "EUR")
+
+    report = usecases.value_all_portfolios("USD")
+    totals = dict(report.top())
+    for user in (alice, bob):
+        expected = usecases.get_user_portfolio(user).get_total_value("USD")
+        assert totals[user.user_id] == pytest.approx(expected, rel=1e-12)
+    assert totals[carol.user_id] == 0.0
+    assert report.missing_rates == []
@@ -0,0 +1,73 @@
+import pytest
+
+from valutatrade_hub.core.currencies import format_minor, record_units, to_minor, units_record
+from valutatrade_hub.core.models import Wallet
+
+
+# ===== Минимальные единицы =====
+def test_to_minor_uses_decimal_representation_of_float():
+    assert to_minor(0.0065, 8) == 650000
+    assert to_minor(0.1 + 0.2, 2) == 30
+    assert to_minor(7, 2) == 700
+    assert to_minor("1.005", 2) == 100  # банковское округление: половина — к чётному
+
+
+@pytest.mark.parametrize("amount", [float("nan"), float("inf"), "abc", None])
+def test_to_minor_rejects_invalid_amounts(amount):
+    with pytest.raises(ValueError):
+        to_minor(amount, 2)
+
+
+def test_format_minor_is_exact():
+    assert format_minor(650000, 8) == "0.0065"
+    assert format_minor(-150, 2) == "-1.5"
+    assert format_minor(100, 2) == "1"
+
+
+def test_record_units_recomputes_legacy_float_balance():
+    assert record_units("USD", {"balance": 10.005}) == 1000
+    assert record_units("BTC", {"balance": 0.1, "units": 10000000}) == 10000000
+    assert units_record("USD", 1234) == {"balance": 12.34, "units": 1234, "precision": 2}
+
+
+def test_record_units_trusts_units_regardless_of_balance():
+    # balance в записи лишь для чтения — расхождение с units не меняет формат
+    assert record_units("USD", {"balance": 0.0, "units": 1000}) == 1000
+    assert record_units("USD", {"balance": 10.0, "units": 1000, "precision": 2}) == 1000
+
+
+def test_record_units_rescales_by_precision_marker():
+    # валюту перенесли в реестр: units записаны с точностью по умолчанию (8)
+    assert record_units("USD", {"balance": 12.345, "units": 1234500000, "precision": 8}) == 1234
+    assert record_units("USD", {"balance": 12.355, "units": 1235500000, "precision": 8}) == 1236
+    assert record_units("BTC", {"balance": 1.5, "units": 150, "precision": 2}) == 150000000
+
+
+def test_units_record_round_trips():
+    for code, units in (("USD", 1234), ("BTC", 650000), ("ZZZ", 7)):
+        assert record_units(code, units_record(code, units)) == units
+
+
+# ===== Кошелёк =====
+def test_repeated_deposits_do_not_drift():
+    wallet = Wallet("USD")
+    for _ in range(1000):
+        wallet.deposit(0.1)
+    assert wallet.units == 10000
+    assert wallet.balance == 100.0
+
+
+def test_withdraw_more_than_balance_leaves_wallet_unchanged():
+    wallet = Wallet("BTC", 0.5)
+    with pytest.raises(ValueError):
+        wallet.withdraw(0.50000001)
+    assert wallet.units == 50000000
+
+
+def test_amount_below_minor_unit_is_rejected():
+    wallet = Wallet("USD", 1.0)
+    with pytest.raises(ValueError):
+        wallet.deposit(0.001)
+    with pytest.raises(ValueError):
+        wallet.withdraw(-1)
+    assert wallet.units == 100
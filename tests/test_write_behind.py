@@ -0,0 +1,163 @@
+import glob
+import multiprocessing
+import os
+
+import pytest
+
+from valutatrade_hub.core import usecases
+from valutatrade_hub.core.exceptions import ConcurrentModificationError
+from valutatrade_hub.infra.database import DatabaseManager
+from valutatrade_hub.infra.journal import recover_journals
+
+
+def _balances(user_id):
+    stored = DatabaseManager().backend.get_portfolio(user_id)
+    return {code: info["units"] for code, info in stored["wallets"].items()}, stored["version"]
+
+
+def _journals(data_dir):
+    return glob.glob(os.path.join(data_dir, "portfolios.*.journal"))
+
+
+def test_commit_writes_all_dirty_portfolios_at_once(data_dir):
+    alice = usecases.register_user("alice", "pw")
+    bob = usecases.register_user("bob", "pw")
+    usecases.begin_batch()
+    usecases.deposit_currency(alice, "USD", 100)
+    usecases.deposit_currency(bob, "USD", 50)
+    usecases.deposit_currency(alice, "USD", 1)
+    assert _balances(alice.user_id) == ({}, 0)
+    assert usecases.commit() == 2
+    assert _balances(alice.user_id) == ({"USD": 10100}, 1)
+    assert _balances(bob.user_id) == ({"USD": 5000}, 1)
+    assert usecases.end_batch() == 0
+    assert _journals(data_dir) == []
+
+
+def test_conflicting_write_is_rebased_not_lost(data_dir):
+    alice = usecases.register_user("alice", "pw")
+    usecases.deposit_currency(alice, "USD", 1000)
+    usecases.begin_batch()
+    usecases.deposit_currency(alice, "EUR", 100)  # подтверждена, лежит в памяти и журнале
+    usecases.buy_currency(alice, "BTC", 0.01, "USD")
+
+    # другой процесс выводит 400 USD от той же версии портфеля
+    backend = DatabaseManager().backend
+    backend.save_portfolio(alice.user_id, {"USD": {"balance": 600.0, "units": 60000}}, expected_version=1,
+                           entries=[{"user_id": alice.user_id, "type": "withdraw", "legs": {"USD": -40000}}])
+
+    assert usecases.commit() == 1
+    balances, version = _balances(alice.user_id)
+    assert balances == {"USD": 60000 - 60000, "EUR": 10000, "BTC": 1000000}
+    assert version == 3
+    # портфель в памяти перенесён на новую версию: следующая сделка не конфликтует
+    usecases.deposit_currency(alice, "USD", 5)
+    assert usecases.end_batch() == 1
+    assert _balances(alice.user_id) == ({"USD": 500, "EUR": 10000, "BTC": 1000000}, 4)
+
+
+def test_failed_flush_keeps_pending_trades_and_journal(data_dir, monkeypatch):
+    alice = usecases.register_user("alice", "pw")
+    usecases.begin_batch()
+    usecases.deposit_currency(alice, "EUR", 100)
+
+    backend = DatabaseManager().backend
+    save = backend.save_portfolios
+
+    def conflict(items, entries=None):
+        raise ConcurrentModificationError("занято")
+
+    monkeypatch.setattr(backend, "save_portfolios", conflict)
+    with pytest.raises(ConcurrentModificationError):
+        usecases.commit()
+    assert alice.user_id in usecases._cache.dirty
+    with pytest.raises(ConcurrentModificationError):
+        usecases.end_batch()
+    assert len(_journals(data_dir)) == 1
+
+    # следующий запуск доигрывает журнал
+    monkeypatch.setattr(backend, "save_portfolios", save)
+    assert recover_journals(str(data_dir), backend) == 1
+    assert _balances(alice.user_id) == ({"EUR": 10000}, 1)
+    assert _journals(data_dir) == []
+
+
+def _withdraw_in_other_process(user_id, amount):
+    """Второй писатель: отдельный процесс без отложенной записи"""
+    def run():
+        usecases._cache = None
+        DatabaseManager._instance = None
+        DatabaseManager(path, engine)
+        usecases.withdraw_currency(usecases.get_user_by_id(user_id), "USD", amount)
+
+    manager = DatabaseManager()
+    path, engine = manager.path, type(manager.backend).__name__
+    engine = "sqlite" if engine == "SqliteStorageBackend" else "json"
+    process = multiprocessing.get_context("fork").Process(target=run)
+    process.start()
+    process.join(30)
+    assert process.exitcode == 0
+
+
+def test_rebase_rejects_trade_that_no_longer_fits(data_dir):
+    alice = usecases.register_user("alice", "pw")
+    usecases.deposit_currency(alice, "USD", 1000)
+    usecases.begin_batch()
+    usecases.buy_currency(alice, "ETH", 0.4, "USD")  # 800 USD — подтверждена, лежит в памяти
+    usecases.deposit_currency(alice, "EUR", 5)
+    _withdraw_in_other_process(alice.user_id, 500)
+
+    assert usecases.commit() == 1
+    balances, _ = _balances(alice.user_id)
+    assert balances["USD"] == 50000
+    assert balances.get("ETH", 0) == 0
+    assert balances["EUR"] == 500
+    rejected = usecases.take_rejected()
+    assert [e["type"] for e in rejected] == ["buy"]
+    assert usecases.take_rejected() == []
+    assert usecases.end_batch() == 0
+
+
+def _crash():
+    """Процесс «падает» с несохранёнными сделками: журнал остаётся на диске"""
+    usecases._cache.journal.release()
+    usecases._cache = None
+
+
+def test_recovery_rebases_journal_onto_portfolio_changed_after_crash(data_dir):
+    alice = usecases.register_user("alice", "pw")
+    usecases.deposit_currency(alice, "USD", 1000)
+    usecases.begin_batch()
+    usecases.deposit_currency(alice, "EUR", 100)
+    usecases.buy_currency(alice, "ETH", 0.4, "USD")  # 800 USD
+    _crash()
+    # уже работающий процесс (своё восстановление он прошёл до падения) выводит 500 USD
+    backend = DatabaseManager().backend
+    backend.save_portfolio(alice.user_id, {"USD": {"balance": 500.0, "units": 50000}}, expected_version=1,
+                           entries=[{"user_id": alice.user_id, "type": "withdraw", "legs": {"USD": -50000}}])
+
+    assert recover_journals(str(data_dir), backend) == 1
+    balances, version = _balances(alice.user_id)
+    # пополнение EUR перенесено, покупке не хватает средств — отклонена, а не ушла в минус
+    assert balances["USD"] == 50000
+    assert balances["EUR"] == 10000
+    assert balances.get("ETH", 0) == 0
+    assert version == 3
+    assert _journals(data_dir) == []
+    reverted = [e for e in backend.ledger.entries(alice.user_id) if e["type"] == "buy"]
+    assert reverted == []
+
+
+def test_recovery_does_not_repeat_entries_already_flushed(data_dir, monkeypatch):
+    alice = usecases.register_user("alice", "pw")
+    usecases.begin_batch()
+    usecases.deposit_currency(alice, "USD", 100)
+    # падение между сохранением портфелей и очисткой журнала
+    monkeypatch.setattr(usecases._cache.journal, "truncate", lambda: None)
+    assert usecases.commit() == 1
+    _crash()
+    usecases.deposit_currency(alice, "USD", 1)  # другой писатель после падения
+
+    assert recover_journals(str(data_dir), DatabaseManager().backend) == 0
+    assert _balances(alice.user_id) == ({"USD": 10100}, 2)
+    assert _journals(data_dir) == []
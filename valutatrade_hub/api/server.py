@@ -0,0 +1,372 @@
+import asyncio
+import json
+import secrets
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from ..core import metrics, usecases
+from ..core.exceptions import (
+    ConcurrentModificationError,
+    CurrencyNotFoundError,
+    InsufficientFundsError,
+    RateUnavailableError,
+)
+from ..core.logging_config import get_logger
+from ..core.rate_engine import get_resolver
+from ..infra.settings import SettingsLoader
+
+logger = get_logger("api")
+
+MAX_BODY_SIZE = 64 * 1024
+REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+           405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large",
+           500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class TokenSessions:
+    """Сессии по токенам в памяти сервера: сколько угодно пользователей одновременно"""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._sessions = {}
+
+    def create(self, user) -> str:
+        now = time.monotonic()
+        self._purge(now)
+        token = secrets.token_urlsafe(32)
+        self._sessions[token] = (user, now + self.ttl_seconds)
+        return token
+
+    def _purge(self, now: float):
+        """
+        Удаляет истёкшие сессии. TTL у всех один, поэтому порядок вставки
+        словаря — порядок истечения: просматриваются только истёкшие.
+        """
+        expired = []
+        for token, (_, expires) in self._sessions.items():
+            if expires > now:
+                break
+            expired.append(token)
+        for token in expired:
+            del self._sessions[token]
+
+    def get(self, token: str):
+        entry = self._sessions.get(token)
+        if entry is None:
+            return None
+        user, expires = entry
+        if time.monotonic() > expires:
+            del self._sessions[token]
+            return None
+        return user
+
+    def drop(self, token: str):
+        self._sessions.pop(token, None)
+
+
+class ApiServer:
+    """
+    HTTP/JSON API поверх core.usecases на asyncio (только stdlib).
+
+    Портфели и snapshot курсов остаются в памяти процесса: сделки идут
+    через режим отложенной записи usecases, а изменения сбрасываются
+    на диск одной групповой записью раз в flush_interval секунд
+    и при остановке сервера. Ответ на сделку уходит после fsync журнала,
+    общего для всех сделок одной итерации цикла событий.
+
+    Регистрация и вход выполняются в пуле потоков; всё остальное —
+    в цикле событий под usecases.state_lock, которую пул берёт только
+    на обращения к хранилищу, но не на KDF.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8080, flush_interval: float = None):
+        settings = SettingsLoader()
+        self.host = host
+        self.port = port
+        self.flush_interval = flush_interval if flush_interval is not None else settings.get(
+            "api_flush_interval_seconds", 1.0)
+        self.sessions = TokenSessions(settings.get("api_token_ttl_seconds", 86400))
+        self._server = None
+        self._flusher = None
+        self._connections = {}
+        self._sync_waiter = None
+        self.routes = {
+            ("POST", "/register"): self.register,
+            ("POST", "/login"): self.login,
+            ("POST", "/logout"): self.logout,
+            ("GET", "/portfolio"): self.portfolio,
+            ("POST", "/buy"): self.buy,
+            ("POST", "/sell"): self.sell,
+            ("POST", "/deposit"): self.deposit,
+            ("POST", "/withdraw"): self.withdraw,
+            ("GET", "/rate"): self.rate,
+            ("GET", "/rates"): self.rates,
+        }
+        self.offloaded = {("POST", "/register"), ("POST", "/login")}
+
+    # ===== Жизненный цикл =====
+    async def start(self):
+        usecases.begin_batch(group_sync=True)
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._flusher = asyncio.create_task(self._flush_loop())
+        logger.info(f"API server listening on http://{self.host}:{self.port}")
+
+    async def stop(self):
+        if self._flusher:
+            self._flusher.cancel()
+        if self._server:
+            self._server.close()
+            # открытые keep-alive соединения закрываем сами, иначе обработчики ждут клиентов
+            for writer in self._connections.values():
+                writer.close()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+        with usecases.state_lock:
+            flushed = usecases.end_batch()
+            rejected = usecases.take_rejected()
+        for entry in rejected:
+            logger.error(f"Acknowledged {entry.get('type')} of user {entry['user_id']} reverted on flush: "
+                         f"insufficient funds after a concurrent change {entry['legs']}")
+        logger.info(f"API server stopped, flushed {flushed} portfolios")
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                with usecases.state_lock:
+                    flushed = usecases.commit()
+                    rejected = usecases.take_rejected()
+                if flushed:
+                    logger.info(f"Flushed {flushed} portfolios")
+                for entry in rejected:
+                    logger.error(f"Acknowledged {entry.get('type')} of user {entry['user_id']} reverted on flush: "
+                                 f"insufficient funds after a concurrent change {entry['legs']}")
+                metrics.flush()
+            except Exception as e:
+                logger.error(f"Flush failed, pending trades kept for the next flush: {e}")
+
+    # ===== HTTP =====
+    async def _handle_connection(self, reader, writer):
+        self._connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_SIZE:
+                    self._write(writer, 413, {"error": REASONS[413]}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                if (method, urlsplit(target).path) in self.offloaded:
+                    # KDF пароля — десятки миллисекунд CPU: в пуле потоков, цикл событий не ждёт
+                    status, payload = await asyncio.get_running_loop().run_in_executor(
+                        None, self._dispatch, method, target, headers, body)
+                else:
+                    with usecases.state_lock:
+                        status, payload = self._dispatch(method, target, headers, body)
+                if method == "POST" and status == 200:
+                    try:
+                        await self._durable()
+                    except OSError as e:
+                        # сделка не попала на диск — подтверждать её нельзя
+                        logger.error(f"{method} {urlsplit(target).path} journal sync failed: {e}")
+                        status, payload = 500, {"error": REASONS[500]}
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and version == "HTTP/1.1")
+                self._write(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._connections.pop(asyncio.current_task(), None)
+            writer.close()
+
+    async def _durable(self):
+        """Ждёт fsync журнала; один fsync на все запросы текущей итерации цикла"""
+        if self._sync_waiter is None:
+            self._sync_waiter = asyncio.get_running_loop().create_future()
+            asyncio.get_running_loop().call_soon(self._sync_journal)
+        await asyncio.shield(self._sync_waiter)
+
+    def _sync_journal(self):
+        waiter, self._sync_waiter = self._sync_waiter, None
+        try:
+            with usecases.state_lock:
+                usecases.sync_journal()
+            waiter.set_result(None)
+        except OSError as e:
+            waiter.set_exception(e)
+
+    @staticmethod
+    def _write(writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+
+    def _dispatch(self, method, target, headers, body):
+        url = urlsplit(target)
+        handler = self.routes.get((method, url.path))
+        if handler is None:
+            known = any(path == url.path for _, path in self.routes)
+            return (405, {"error": REASONS[405]}) if known else (404, {"error": REASONS[404]})
+        try:
+            request = {
+                "query": {k: v[-1] for k, v in parse_qs(url.query).items()},
+                "json": json.loads(body) if body else {},
+                "token": self._bearer(headers),
+            }
+            return 200, handler(request)
+        except HttpError as e:
+            return e.status, {"error": str(e)}
+        except json.JSONDecodeError:
+            return 400, {"error": "Некорректный JSON"}
+        except (CurrencyNotFoundError, RateUnavailableError) as e:
+            return 404, {"error": str(e)}
+        except ConcurrentModificationError as e:
+            return 409, {"error": str(e)}
+        except (ValueError, InsufficientFundsError) as e:
+            return 400, {"error": str(e)}
+        except Exception as e:
+            logger.error(f"{method} {url.path} failed: {e}")
+            return 500, {"error": REASONS[500]}
+
+    @staticmethod
+    def _bearer(headers):
+        value = headers.get("authorization", "")
+        return value[7:].strip() if value.lower().startswith("bearer ") else None
+
+    def _user(self, request):
+        user = self.sessions.get(request["token"]) if request["token"] else None
+        if user is None:
+            raise HttpError(401, "Требуется вход: POST /login")
+        return user
+
+    @staticmethod
+    def _field(request, name, cast=str):
+        value = request["json"].get(name)
+        if value is None:
+            raise HttpError(400, f"Не указано поле '{name}'")
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            raise HttpError(400, f"Некорректное значение поля '{name}'")
+
+    # ===== Обработчики =====
+    def register(self, request):
+        user = usecases.register_user(self._field(request, "username"), self._field(request, "password"))
+        return {"user_id": user.user_id, "username": user.username}
+
+    def login(self, request):
+        user = usecases.login_user(self._field(request, "username"), self._field(request, "password"))
+        return {"token": self.sessions.create(user), "user_id": user.user_id}
+
+    def logout(self, request):
+        self._user(request)
+        self.sessions.drop(request["token"])
+        return {"ok": True}
+
+    def portfolio(self, request):
+        user = self._user(request)
+        base = request["query"].get("base", "USD").upper()
+        rates = get_resolver().rates_to(base)
+        portfolio = usecases.get_user_portfolio(user)
+        wallets = {}
+        total = 0.0
+        for code, wallet in portfolio.wallets.items():
+            rate = rates.get(code)
+            value = wallet.balance * rate if rate is not None else None
+            if value is not None:
+                total += value
+            wallets[code] = {"balance": wallet.balance, "value": value}
+        return {"username": user.username, "base": base, "wallets": wallets, "total": total,
+                "stale": get_resolver().is_stale()}
+
+    def buy(self, request):
+        return self._fill(usecases.buy_currency(*self._order_args(request)))
+
+    def sell(self, request):
+        return self._fill(usecases.sell_currency(*self._order_args(request)))
+
+    def deposit(self, request):
+        user = self._user(request)
+        currency = self._field(request, "currency").upper()
+        amount = self._field(request, "amount", float)
+        usecases.deposit_currency(user, currency, amount)
+        return {"ok": True, "currency": currency, "amount": amount}
+
+    def withdraw(self, request):
+        user = self._user(request)
+        currency = self._field(request, "currency").upper()
+        amount = self._field(request, "amount", float)
+        usecases.withdraw_currency(user, currency, amount)
+        return {"ok": True, "currency": currency, "amount": amount}
+
+    def _order_args(self, request):
+        user = self._user(request)
+        quote = request["json"].get("quote")
+        return user, self._field(request, "currency"), self._field(request, "amount", float), quote
+
+    @staticmethod
+    def _fill(fill):
+        return {
+            "ok": True, "side": fill.order.side, "currency": fill.order.currency, "amount": fill.amount,
+            "quote": fill.order.quote, "cost": fill.cost, "price": str(fill.price),
+        }
+
+    def rate(self, request):
+        query = request["query"]
+        if "from" not in query or "to" not in query:
+            raise HttpError(400, "Нужны параметры from и to")
+        from_code, to_code = query["from"].upper(), query["to"].upper()
+        rate = usecases.get_rate(from_code, to_code)
+        return {"from": from_code, "to": to_code, "rate": rate, "stale": get_resolver().is_stale()}
+
+    def rates(self, request):
+        resolver = get_resolver()
+        currency = request["query"].get("currency", "").upper()
+        pairs = {k: v for k, v in resolver.pairs.items() if k.startswith(currency)}
+        top = request["query"].get("top")
+        ordered = sorted(pairs.items(), key=lambda x: x[1]["rate"], reverse=True)
+        if top:
+            ordered = ordered[:int(top)]
+        return {"last_refresh": resolver.last_refresh, "stale": resolver.is_stale(), "pairs": dict(ordered)}
+
+
+def run_server(host: str = "127.0.0.1", port: int = 8080):
+    server = ApiServer(host, port)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
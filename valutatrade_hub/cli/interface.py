@@ -1,5 +1,8 @@
 import argparse
+import math
+import shlex
 import sys
+import time
 import os
 import json
 from ..core.usecases import (
@@ -8,14 +11,28 @@ from ..core.usecases import (
     get_user_portfolio,
     buy_currency,
     sell_currency,
+    deposit_currency,
+    withdraw_currency,
+    execute_orders,
+    get_balances_at,
+    get_ledger_entries,
     get_rate,
-    _load_json,
-    USERS_FILE,
+    value_all_portfolios,
+    list_usernames,
+    register_users,
+    issue_session,
+    resume_session,
+    begin_batch,
+    commit,
+    end_batch,
+    take_rejected,
     User
 )
-from ..parser_service.updater import RatesUpdater
-from ..parser_service.storage import RatesStorage
 from ..core.exceptions import ApiRequestError
+from ..core.rate_engine import get_resolver
+
+# Тяжёлые модули (requests и API-клиенты, numpy) импортируются внутри
+# веток команд, которым они нужны: офлайн-команды стартуют без них.
 
 # ===== Файл для хранения текущей сессии =====
 SESSION_FILE = os.path.join(os.path.dirname(__file__), "../../data/session.json")
@@ -23,36 +40,41 @@ current_user = None
 
 # ===== Функции работы с сессией =====
 def save_session(user: User):
+    """Сессия — подписанный токен (HMAC), файл доступен только владельцу"""
     os.makedirs(os.path.dirname(SESSION_FILE), exist_ok=True)
-    with open(SESSION_FILE, "w", encoding="utf-8") as f:
-        json.dump({"user_id": user.user_id}, f)
+    fd = os.open(SESSION_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    os.fchmod(fd, 0o600)  # файл прежней версии мог быть создан с правами по умолчанию
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"user_id": user.user_id, "token": issue_session(user)}, f)
 
 def load_session():
+    """Пользователь по токену сессии; сессия без токена, с истёкшим или чужим токеном — не вход"""
     if not os.path.exists(SESSION_FILE):
         return None
     with open(SESSION_FILE, "r", encoding="utf-8") as f:
         data = json.load(f)
-    user_id = data.get("user_id")
-    if not user_id:
+    token = data.get("token")
+    if not token:
         return None
-    # Ищем пользователя в users.json
-    users = _load_json(USERS_FILE)
-    u = next((u for u in users if u["user_id"] == user_id), None)
-    if u:
-        user = User(user_id=u["user_id"], username=u["username"], password="")
-        user._salt = u["salt"]
-        user._hashed_password = u["hashed_password"]
-        return user
-    return None
+    return resume_session(token)
 
-# ===== MAIN CLI =====
-def main():
-    global current_user
-    current_user = load_session()
+# ===== Разбор аргументов =====
+def _fmt(value, spec: str = ".6g", suffix: str = "") -> str:
+    """Число для вывода; nan (индикатор ещё не набрал окно) — прочерк"""
+    return "—" if math.isnan(value) else format(value, spec) + suffix
 
+
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Консольный интерфейс валютного кошелька")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="Выполнить команды из файла (по одной в строке) в одном процессе")
+    parser.add_argument("--profile", action="store_true",
+                        help="Профилировать команду (cProfile): дамп .prof в --profile-dir")
+    parser.add_argument("--profile-dir", default="logs/profile", help="Каталог профилей --profile")
     subparsers = parser.add_subparsers(dest="command")
 
+    subparsers.add_parser("repl", help="Интерактивная оболочка: состояние сохраняется между командами")
+
     # --- Регистрация и логин ---
     reg_parser = subparsers.add_parser("register", help="Создать нового пользователя")
     reg_parser.add_argument("--username", required=True)
@@ -72,10 +94,31 @@ def main():
     buy_parser = subparsers.add_parser("buy", help="Купить валюту")
     buy_parser.add_argument("--currency", required=True)
     buy_parser.add_argument("--amount", required=True, type=float)
+    buy_parser.add_argument("--quote", help="Валюта оплаты (по умолчанию default_base из настроек)")
 
     sell_parser = subparsers.add_parser("sell", help="Продать валюту")
     sell_parser.add_argument("--currency", required=True)
     sell_parser.add_argument("--amount", required=True, type=float)
+    sell_parser.add_argument("--quote", help="Валюта выручки (по умолчанию default_base из настроек)")
+
+    deposit_parser = subparsers.add_parser("deposit", help="Пополнить кошелёк")
+    deposit_parser.add_argument("--currency", required=True)
+    deposit_parser.add_argument("--amount", required=True, type=float)
+
+    withdraw_parser = subparsers.add_parser("withdraw", help="Вывести средства из кошелька")
+    withdraw_parser.add_argument("--currency", required=True)
+    withdraw_parser.add_argument("--amount", required=True, type=float)
+
+    ledger_parser = subparsers.add_parser("ledger", help="Журнал операций пользователя")
+    ledger_parser.add_argument("--last", type=int, default=20, help="Последние N операций")
+
+    balance_at_parser = subparsers.add_parser("balance-at", help="Балансы на момент времени по журналу операций")
+    balance_at_parser.add_argument("--at", required=True, help="Момент времени (ISO 8601)")
+
+    orders_parser = subparsers.add_parser("execute-orders", help="Исполнить партию ордеров из CSV или JSONL")
+    orders_parser.add_argument("--file", required=True, help="CSV: user_id,side,currency,amount[,quote]")
+    orders_parser.add_argument("--quote", help="Валюта расчёта для ордеров без своей")
+    orders_parser.add_argument("--show-rejected", type=int, default=10, help="Сколько отклонённых показать")
 
     # --- Получить курс ---
     rate_parser = subparsers.add_parser("get-rate", help="Получить курс валют")
@@ -84,15 +127,61 @@ def main():
 
     # --- Parser Service команды ---
     update_parser = subparsers.add_parser("update-rates", help="Обновить курсы валют")
-    update_parser.add_argument("--source", choices=["coingecko", "exchangerate"], default="all")
+    update_parser.add_argument("--source", default="all",
+                               help="Источники через запятую: coingecko, exchangerate, frankfurter (по умолчанию все)")
+    update_parser.add_argument("--currencies", help="Только эти валюты, через запятую (например BTC,EUR)")
+
+    subparsers.add_parser("rates-daemon", help="Непрерывно обновлять курсы по расписанию (до SIGTERM)")
+
+    serve_parser = subparsers.add_parser("serve", help="HTTP/JSON API на asyncio")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8080)
 
     show_parser = subparsers.add_parser("show-rates", help="Показать курсы из кеша")
     show_parser.add_argument("--currency", type=str)
     show_parser.add_argument("--top", type=int)
     show_parser.add_argument("--base", type=str, default="USD")
 
-    args = parser.parse_args()
+    valuation_parser = subparsers.add_parser("valuation-report", help="Оценка портфелей всех пользователей")
+    valuation_parser.add_argument("--base", default="USD")
+    valuation_parser.add_argument("--top", type=int)
+
+    history_parser = subparsers.add_parser("rate-history", help="История курса валютной пары")
+    history_parser.add_argument("--pair", required=True, help="Например BTC_USD")
+    history_parser.add_argument("--from", dest="start", help="Начало интервала (ISO 8601)")
+    history_parser.add_argument("--to", dest="end", help="Конец интервала (ISO 8601)")
+    history_parser.add_argument("--last", type=int, help="Последние N точек")
+    history_parser.add_argument("--at", help="Значение курса на момент времени (ISO 8601)")
+
+    analytics_parser = subparsers.add_parser("rate-analytics", help="OHLC-бары, скользящие средние и волатильность курса")
+    analytics_parser.add_argument("--pair", required=True, help="Например BTC_USD")
+    analytics_parser.add_argument("--interval", default="1h", help="Интервал баров: 15m, 1h, 1d...")
+    analytics_parser.add_argument("--from", dest="start", help="Начало интервала (ISO 8601)")
+    analytics_parser.add_argument("--to", dest="end", help="Конец интервала (ISO 8601)")
+    analytics_parser.add_argument("--last", type=int, default=20, help="Последние N баров")
+    analytics_parser.add_argument("--sma", type=int, default=20, help="Окно SMA, баров")
+    analytics_parser.add_argument("--ema", type=int, default=20, help="Период EMA, баров")
+    analytics_parser.add_argument("--vol", type=int, default=20, help="Окно волатильности, баров")
+
+    import_parser = subparsers.add_parser("import-users", help="Массовая регистрация пользователей из CSV")
+    import_parser.add_argument("--file", required=True, help="CSV: username,password")
+    import_parser.add_argument("--workers", type=int, help="Процессов для хеширования паролей (по умолчанию — по числу ядер)")
+    import_parser.add_argument("--show-skipped", type=int, default=10, help="Сколько пропущенных показать")
+
+    calibrate_parser = subparsers.add_parser("kdf-calibrate", help="Подобрать параметры хеширования паролей под эту машину")
+    calibrate_parser.add_argument("--kdf", choices=("scrypt", "pbkdf2_sha256"), default="scrypt")
+    calibrate_parser.add_argument("--target-ms", type=float, default=250, help="Целевое время хеша одного пароля, мс")
+
+    stats_parser = subparsers.add_parser("stats", help="Латентности по метрикам: p50/p95/p99")
+    stats_parser.add_argument("--metric", help="Только метрики с этим префиксом, например usecase")
+    stats_parser.add_argument("--reset", action="store_true", help="Очистить накопленные метрики")
 
+    return parser
+
+
+# ===== Выполнение одной команды =====
+def execute(args, parser):
+    global current_user
     try:
         # --- REGISTER ---
         if args.command == "register":
@@ -122,66 +211,388 @@ def main():
                 print("Сначала выполните login")
                 sys.exit(1)
             portfolio = get_user_portfolio(current_user)
+            base = args.base.upper()
+            rates = get_resolver().rates_to(base)
             total = 0.0
-            print(f"Портфель пользователя '{current_user.username}' (база: {args.base}):")
+            print(f"Портфель пользователя '{current_user.username}' (база: {base}):")
             for code, wallet in portfolio.wallets.items():
-                converted = wallet.balance  # курс 1:1 для простоты
+                rate = rates.get(code)
+                if rate is None:
+                    print(f"- {code}: {wallet.balance:.4f} → курс к {base} недоступен")
+                    continue
+                converted = wallet.balance * rate
                 total += converted
-                print(f"- {code}: {wallet.balance:.4f} → {converted:.2f} {args.base}")
+                print(f"- {code}: {wallet.balance:.4f} → {converted:.2f} {base}")
             print("-" * 40)
-            print(f"ИТОГО: {total:.2f} {args.base}")
+            print(f"ИТОГО: {total:.2f} {base}")
+            if get_resolver().is_stale():
+                print(f"Оценка по устаревшим курсам (обновлены {get_resolver().last_refresh}): обновление запущено в фоне")
 
         # --- BUY ---
         elif args.command == "buy":
             if not current_user:
                 print("Сначала выполните login")
                 sys.exit(1)
-            buy_currency(current_user, args.currency, args.amount)
-            print(f"Куплено {args.amount} {args.currency} для пользователя '{current_user.username}'")
+            fill = buy_currency(current_user, args.currency, args.amount, args.quote)
+            print(f"Куплено {fill.amount} {fill.order.currency} за {fill.cost} {fill.order.quote} "
+                  f"(курс {fill.price}) для пользователя '{current_user.username}'")
 
         # --- SELL ---
         elif args.command == "sell":
             if not current_user:
                 print("Сначала выполните login")
                 sys.exit(1)
-            sell_currency(current_user, args.currency, args.amount)
-            print(f"Продано {args.amount} {args.currency} для пользователя '{current_user.username}'")
+            fill = sell_currency(current_user, args.currency, args.amount, args.quote)
+            print(f"Продано {fill.amount} {fill.order.currency} за {fill.cost} {fill.order.quote} "
+                  f"(курс {fill.price}) для пользователя '{current_user.username}'")
+
+        # --- DEPOSIT ---
+        elif args.command == "deposit":
+            if not current_user:
+                print("Сначала выполните login")
+                sys.exit(1)
+            deposit_currency(current_user, args.currency, args.amount)
+            print(f"Кошелёк {args.currency.upper()} пополнен на {args.amount}")
+
+        # --- WITHDRAW ---
+        elif args.command == "withdraw":
+            if not current_user:
+                print("Сначала выполните login")
+                sys.exit(1)
+            withdraw_currency(current_user, args.currency, args.amount)
+            print(f"С кошелька {args.currency.upper()} выведено {args.amount}")
+
+        # --- LEDGER ---
+        elif args.command == "ledger":
+            if not current_user:
+                print("Сначала выполните login")
+                sys.exit(1)
+            from ..core.currencies import format_minor, get_precision
+            entries = get_ledger_entries(current_user, args.last)
+            if not entries:
+                print("Журнал операций пуст")
+            for e in entries:
+                legs = ", ".join(
+                    f"{'+' if units > 0 else ''}{format_minor(units, get_precision(code))} {code}"
+                    for code, units in e["legs"].items()
+                )
+                price = f" по {e['price']}" if "price" in e else ""
+                print(f"- {e['ts']}: {e['type']} {legs}{price}")
+
+        # --- BALANCE AT ---
+        elif args.command == "balance-at":
+            if not current_user:
+                print("Сначала выполните login")
+                sys.exit(1)
+            from ..core.currencies import format_minor
+            wallets = get_balances_at(current_user, args.at)
+            print(f"Балансы пользователя '{current_user.username}' на {args.at}:")
+            if not wallets:
+                print("- нет средств")
+            for code, wallet in wallets.items():
+                print(f"- {code}: {format_minor(wallet.units, wallet.precision)}")
+
+        # --- EXECUTE ORDERS ---
+        elif args.command == "execute-orders":
+            from ..core.trading import load_orders
+            report = execute_orders(load_orders(args.file, args.quote))
+            print(f"Ордеров: {report.total}, исполнено: {len(report.fills)}, отклонено: {len(report.rejected)}")
+            print(f"Время: {report.elapsed:.3f} c ({report.orders_per_second:.0f} ордеров/с)")
+            for number, order, reason in report.rejected[:args.show_rejected]:
+                print(f"- #{number} user {order.user_id} {order.side} {order.amount} {order.currency}: {reason}")
 
         # --- GET RATE ---
         elif args.command == "get-rate":
             rate_value = get_rate(args.from_code.upper(), args.to_code.upper())
             print(f"Курс {args.from_code.upper()} → {args.to_code.upper()}: {rate_value}")
+            if get_resolver().is_stale():
+                print(f"Курс устарел (обновлён {get_resolver().last_refresh}): обновление запущено в фоне")
 
         # --- UPDATE RATES ---
         elif args.command == "update-rates":
+            from ..parser_service.config import config
+            from ..parser_service.updater import RatesUpdater
+            sources = None if args.source == "all" else [s.strip().lower() for s in args.source.split(",")]
+            pairs = None
+            if args.currencies:
+                pairs = {f"{c.strip().upper()}_{config.BASE_CURRENCY}" for c in args.currencies.split(",")}
             try:
                 updater = RatesUpdater()
-                updater.run_update()
+                updater.run_update(sources=sources, pairs=pairs)
+                get_resolver().invalidate()
+                if updater.failed:
+                    print(f"Источники без ответа: {', '.join(updater.failed)}")
                 print("Обновление курсов завершено")
             except ApiRequestError as e:
                 print(f"Ошибка обновления: {e}")
 
+        # --- RATES DAEMON ---
+        elif args.command == "rates-daemon":
+            from ..parser_service.daemon import RatesDaemon
+            daemon = RatesDaemon()
+            daemon.install_signal_handlers()
+            daemon.run()
+
+        # --- HTTP API ---
+        elif args.command == "serve":
+            from ..api.server import run_server
+            run_server(args.host, args.port)
+
         # --- SHOW RATES ---
         elif args.command == "show-rates":
-            storage = RatesStorage()
-            if not os.path.exists(storage.rates_file):
-                print("Локальный кеш курсов пуст. Выполните 'update-rates'")
-                sys.exit(1)
-            with open(storage.rates_file, "r", encoding="utf-8") as f:
-                snapshot = json.load(f)
-            pairs = snapshot.get("pairs", {})
-            filtered = {k: v for k, v in pairs.items() if args.currency is None or k.startswith(args.currency.upper())}
-            top_n = args.top or len(filtered)
-            sorted_pairs = sorted(filtered.items(), key=lambda x: x[1]["rate"], reverse=True)[:top_n]
-            print(f"Rates from cache (updated at {snapshot.get('last_refresh')}):")
-            for k, v in sorted_pairs:
-                print(f"- {k}: {v['rate']}")
+            resolver = get_resolver()
+            pairs = resolver.pairs
+            if not pairs:
+                # snapshot'а ещё нет: резолвер уже запустил фоновое обновление
+                print("Локальный кеш курсов пуст: запущено фоновое обновление, повторите позже "
+                      "(или выполните 'update-rates')")
+            else:
+                filtered = {k: v for k, v in pairs.items() if args.currency is None or k.startswith(args.currency.upper())}
+                top_n = args.top or len(filtered)
+                sorted_pairs = sorted(filtered.items(), key=lambda x: x[1]["rate"], reverse=True)[:top_n]
+                print(f"Rates from cache (updated at {resolver.last_refresh}):")
+                for k, v in sorted_pairs:
+                    print(f"- {k}: {v['rate']}")
+                if resolver.is_stale():
+                    print("Курсы устарели: обновление запущено в фоне")
+
+        # --- VALUATION REPORT ---
+        elif args.command == "valuation-report":
+            report = value_all_portfolios(args.base)
+            usernames = list_usernames()
+            print(f"Оценка портфелей (база: {report.base}):")
+            for user_id, total in report.top(args.top):
+                print(f"- {usernames.get(user_id, user_id)}: {total:.2f} {report.base}")
+            if get_resolver().is_stale():
+                print(f"Оценка по устаревшим курсам (обновлены {get_resolver().last_refresh}): обновление запущено в фоне")
+            if report.missing_rates:
+                print(f"Без курса к {report.base} (не учтены): {', '.join(report.missing_rates)}")
+
+        # --- RATE HISTORY ---
+        elif args.command == "rate-history":
+            from ..parser_service.history import RateHistory
+            history = RateHistory()
+            pair = args.pair.upper()
+            if args.at:
+                record = history.as_of(pair, args.at)
+                records = [record] if record else []
+            elif args.last:
+                records = history.last(pair, args.last)
+            else:
+                records = history.range(pair, args.start, args.end)
+            if not records:
+                print(f"Нет истории для {pair}")
+            for r in records:
+                print(f"- {r['updated_at']}: {r['rate']} ({r.get('source', '')})")
+
+        # --- RATE ANALYTICS ---
+        elif args.command == "rate-analytics":
+            from datetime import datetime, timezone
+            from ..parser_service.analytics import analyze
+            pair = args.pair.upper()
+            result = analyze(pair, args.interval, args.start, args.end, args.sma, args.ema, args.vol)
+            rows = range(max(0, len(result["bars"]) - args.last), len(result["bars"]))
+            if not rows:
+                print(f"Нет истории для {pair}")
+            else:
+                print(f"{pair}, бары {args.interval}: open / high / low / close, "
+                      f"SMA({args.sma}), EMA({args.ema}), волатильность({args.vol}), точек")
+            for i in rows:
+                start, open_, high, low, close, count = result["bars"][i].tolist()
+                moment = datetime.fromtimestamp(start, timezone.utc).isoformat()
+                vol = result["volatility"][i] * 100
+                print(f"- {moment}: {_fmt(open_)} / {_fmt(high)} / {_fmt(low)} / {_fmt(close)}, "
+                      f"SMA {_fmt(result['sma'][i])}, EMA {_fmt(result['ema'][i])}, "
+                      f"vol {_fmt(vol, '.3f', '%')}, {int(count)}")
+
+        # --- IMPORT USERS ---
+        elif args.command == "import-users":
+            import csv
+            with open(args.file, "r", encoding="utf-8", newline="") as f:
+                rows = [row for row in csv.reader(f) if row and not row[0].startswith("#")]
+            if rows and [cell.strip().lower() for cell in rows[0][:2]] == ["username", "password"]:
+                rows = rows[1:]
+            began = time.perf_counter()
+            users, skipped = register_users([(row[0].strip(), row[1] if len(row) > 1 else "") for row in rows],
+                                            workers=args.workers)
+            elapsed = time.perf_counter() - began
+            print(f"Зарегистрировано: {len(users)}, пропущено: {len(skipped)}")
+            print(f"Время: {elapsed:.3f} c ({len(users) / elapsed if elapsed else 0:.1f} пользователей/с)")
+            for username, reason in skipped[:args.show_skipped]:
+                print(f"- '{username}': {reason}")
+
+        # --- KDF CALIBRATE ---
+        elif args.command == "kdf-calibrate":
+            from ..core import security
+            params = security.calibrate(args.kdf, args.target_ms / 1e3)
+            print(f"{args.kdf}: {params.pop('seconds') * 1e3:.1f} мс на хеш")
+            keys = {"n": "password_scrypt_n", "r": "password_scrypt_r", "p": "password_scrypt_p",
+                    "i": "password_pbkdf2_iterations"}
+            suggested = {"password_kdf": args.kdf, **{keys[k]: v for k, v in params.items()}}
+            print("Настройки (data/settings.json):")
+            print(json.dumps(suggested, indent=2))
+
+        # --- STATS ---
+        elif args.command == "stats":
+            from ..core import metrics
+            metrics.flush()
+            path = metrics.metrics_path()
+            if args.reset:
+                if os.path.exists(path):
+                    os.remove(path)
+                print(f"Метрики очищены: {path}")
+            else:
+                series = sorted(
+                    (key, h) for key, h in metrics.load(path).items()
+                    if h.count and (args.metric is None or key[0].startswith(args.metric))
+                )
+                if not series:
+                    print(f"Метрик пока нет ({path})")
+                else:
+                    print(f"Метрики из {path}: вызовов, среднее, p50 / p95 / p99 (мс)")
+                for (name, labels), h in series:
+                    ms = [h.mean * 1e3] + [h.quantile(q) * 1e3 for q in (0.5, 0.95, 0.99)]
+                    tags = ",".join(f"{k}={v}" for k, v in labels)
+                    print(f"- {name}{{{tags}}}: {h.count}, {ms[0]:.3f}, {ms[1]:.3f} / {ms[2]:.3f} / {ms[3]:.3f}")
 
         else:
             parser.print_help()
 
     except Exception as e:
         print(f"Ошибка: {e}")
+        return False
+    return True
+
+
+def run_command(args, parser) -> bool:
+    """execute() с профилированием по --profile: дамп cProfile на каждую команду; False — команда не выполнена"""
+    if not args.profile:
+        return execute(args, parser)
+    import cProfile
+    os.makedirs(args.profile_dir, exist_ok=True)
+    path = os.path.join(args.profile_dir, f"{args.command or 'help'}-{int(time.time() * 1000)}-{os.getpid()}.prof")
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(execute, args, parser)
+    finally:
+        profiler.dump_stats(path)
+        print(f"Профиль команды: {path} (просмотр: python -m pstats {path})")
+
+
+# ===== REPL и batch-режим =====
+SHELL_HELP = "Команды как в CLI (buy --currency BTC --amount 0.1), а также: commit, help, exit"
+# строки оболочки, завершившиеся ошибкой, — для кода возврата --batch
+failed_lines = 0
+
+
+def report_rejected():
+    """Сделки, отменённые при сбросе: портфель изменил другой процесс, средств не хватило"""
+    for entry in take_rejected():
+        legs = ", ".join(f"{code} {delta:+d}" for code, delta in entry["legs"].items())
+        print(f"Сделка отменена ({entry.get('type')}: {legs} мин. ед.): недостаточно средств "
+              f"после изменений портфеля другим процессом")
+
+
+def run_line(line: str, parser) -> bool:
+    """Выполняет строку оболочки; False — пора выходить. Ошибки считаются в failed_lines"""
+    global failed_lines
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return True
+    if line in ("exit", "quit"):
+        return False
+    if line == "commit":
+        try:
+            print(f"Сохранено портфелей: {commit()}")
+        except Exception as e:
+            print(f"Ошибка: {e}")
+            failed_lines += 1
+        report_rejected()
+        return True
+    if line == "help":
+        print(SHELL_HELP)
+        parser.print_help()
+        return True
+    try:
+        args = parser.parse_args(shlex.split(line))
+    except SystemExit as e:
+        # argparse уже вывел сообщение об ошибке (код 0 — это --help)
+        if e.code not in (0, None):
+            failed_lines += 1
+        return True
+    if args.command in ("repl", None) or args.batch:
+        print("Вложенные repl/--batch не поддерживаются")
+        failed_lines += 1
+        return True
+    try:
+        if not run_command(args, parser):
+            failed_lines += 1
+    except SystemExit as e:
+        # команда завершилась с ошибкой (например, не выполнен login)
+        if e.code not in (0, None):
+            failed_lines += 1
+    return True
+
+
+def run_repl(parser):
+    """
+    Интерактивная оболочка: модули, сессия, кеш курсов и портфели
+    загружаются один раз; изменения портфелей пишутся на диск по commit/exit.
+    """
+    begin_batch()
+    print(SHELL_HELP)
+    try:
+        while True:
+            try:
+                line = input("valutatrade> ")
+            except EOFError:
+                print()
+                break
+            if not run_line(line, parser):
+                break
+    except KeyboardInterrupt:
+        print()
+    finally:
+        print(f"Сохранено портфелей: {end_batch()}")
+        report_rejected()
+
+
+def run_batch(path: str, parser) -> int:
+    """
+    Выполняет команды из файла; запись на диск — по строкам commit и в конце.
+    Строка с ошибкой не прерывает пакет. Возвращает число строк с ошибкой.
+    """
+    global failed_lines
+    failed_lines = 0
+    begin_batch()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not run_line(line, parser):
+                    break
+    finally:
+        end_batch()
+        report_rejected()
+    if failed_lines:
+        print(f"Строк с ошибкой: {failed_lines}")
+    return failed_lines
+
+
+# ===== MAIN CLI =====
+def main():
+    global current_user
+    current_user = load_session()
+
+    parser = build_parser()
+    args = parser.parse_args()
+
+    if args.batch:
+        # ненулевой код возврата, если хотя бы одна строка пакета не выполнена
+        sys.exit(1 if run_batch(args.batch, parser) else 0)
+    elif args.command == "repl":
+        run_repl(parser)
+    else:
+        run_command(args, parser)
 
 
 if __name__ == "__main__":
@@ -1,7 +1,17 @@
 from abc import ABC, abstractmethod
 from .exceptions import CurrencyNotFoundError
 
+# Точность для валют, которых нет в реестре
+DEFAULT_PRECISION = 8
+# 10 ** n заранее: множитель берётся из кортежа, а не считается на каждой операции
+SCALES = tuple(10 ** n for n in range(19))
+
+
 class Currency(ABC):
+    # Число знаков после запятой. Балансы хранятся целым числом минимальных
+    # единиц (10 ** -precision), поэтому сумма сделок всегда точная.
+    precision = DEFAULT_PRECISION
+
     def __init__(self, name: str, code: str):
         if not name:
             raise ValueError("Имя валюты не может быть пустым")
@@ -16,6 +26,8 @@ class Currency(ABC):
 
 
 class FiatCurrency(Currency):
+    precision = 2
+
     def __init__(self, name: str, code: str, issuing_country: str):
         super().__init__(name, code)
         self.issuing_country = issuing_country
@@ -25,6 +37,8 @@ class FiatCurrency(Currency):
 
 
 class CryptoCurrency(Currency):
+    precision = 8
+
     def __init__(self, name: str, code: str, algorithm: str, market_cap: float):
         super().__init__(name, code)
         self.algorithm = algorithm
@@ -47,3 +61,62 @@ def get_currency(code: str) -> Currency:
     if code not in CURRENCY_REGISTRY:
         raise CurrencyNotFoundError(f"Неизвестная валюта '{code}'")
     return CURRENCY_REGISTRY[code]
+
+
+def get_precision(code: str) -> int:
+    currency = CURRENCY_REGISTRY.get(code.upper())
+    return currency.precision if currency else DEFAULT_PRECISION
+
+
+def to_minor(amount, precision: int) -> int:
+    """
+    Сумма → целое число минимальных единиц, банковское округление.
+    float переводится через свою десятичную запись (repr): 0.0065 даёт
+    ровно 650000 единиц при precision=8, а не 649999.99999...
+    """
+    if isinstance(amount, int):
+        return amount * SCALES[precision]
+    # decimal (~7 мс импорта) нужен только на границе ввода, не при старте CLI
+    from decimal import ROUND_HALF_EVEN, Decimal, InvalidOperation
+    try:
+        value = Decimal(repr(amount) if isinstance(amount, float) else amount)
+    except (InvalidOperation, TypeError):
+        raise ValueError(f"Некорректная сумма: {amount!r}")
+    if not value.is_finite():
+        raise ValueError(f"Некорректная сумма: {amount!r}")
+    return int(value.scaleb(precision).to_integral_value(ROUND_HALF_EVEN))
+
+
+def format_minor(units: int, precision: int) -> str:
+    """Точная десятичная запись без хвостовых нулей: (650000, 8) → '0.0065'"""
+    whole, frac = divmod(abs(units), SCALES[precision])
+    sign = "-" if units < 0 else ""
+    digits = str(frac).rjust(precision, "0").rstrip("0") if precision else ""
+    return f"{sign}{whole}.{digits}" if digits else f"{sign}{whole}"
+
+
+def record_units(code: str, info: dict) -> int:
+    """
+    Минимальные единицы из записи кошелька в хранилище. Формат записи
+    определяется по её полям, а не по значению balance:
+    - только balance — старая запись, округляется до точности валюты;
+    - units без precision — записаны в текущей точности валюты;
+    - units с precision — если точность валюты с тех пор сменилась
+      (валюту перенесли в реестр), units пересчитываются с банковским округлением.
+    """
+    precision = get_precision(code)
+    units = info.get("units")
+    if units is None:
+        return to_minor(info.get("balance", 0.0), precision)
+    stored = info.get("precision", precision)
+    if stored == precision:
+        return units
+    if stored < precision:
+        return units * SCALES[precision - stored]
+    return to_minor(format_minor(units, stored), precision)
+
+
+def units_record(code: str, units: int) -> dict:
+    """Запись кошелька для хранилища: units — точно, balance — для чтения и оценки"""
+    precision = get_precision(code)
+    return {"balance": units / SCALES[precision], "units": units, "precision": precision}
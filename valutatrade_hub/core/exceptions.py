@@ -8,3 +8,11 @@ class CurrencyNotFoundError(Exception):
 
 class ApiRequestError(Exception):
     pass
+
+
+class RateUnavailableError(Exception):
+    pass
+
+
+class ConcurrentModificationError(Exception):
+    pass
@@ -1,4 +1,11 @@
+import atexit
+import fcntl
+import json
 import logging
+import os
+import queue
+from contextlib import contextmanager
+from datetime import datetime, timezone
 
 
 def get_logger(name: str) -> logging.Logger:
@@ -15,4 +22,196 @@ def get_logger(name: str) -> logging.Logger:
 
         logger.addHandler(handler)
 
-    return logger
\ No newline at end of file
+    return logger
+
+
+# ===== Журнал действий (JSON Lines) =====
+ACTION_LOGGER = "valutatrade.actions"
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Запись — одна строка JSON: ts, level, action и поля из extra={"fields": {...}}"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "pid": record.process,
+        }
+        entry.update(getattr(record, "fields", None) or {"message": record.getMessage()})
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RecordQueueHandler(logging.Handler):
+    """
+    Кладёт запись в очередь как есть: форматирует поток записи. Стандартный
+    QueueHandler форматирует запись в вызывающем потоке (prepare) и требует
+    импорта logging.handlers при старте, поэтому здесь свой обработчик.
+    """
+
+    def __init__(self, records):
+        super().__init__()
+        self._records = records
+
+    def emit(self, record):
+        try:
+            self._records.put_nowait(record)
+        except Exception:
+            self.handleError(record)
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Эксклюзивная advisory-блокировка (fcntl) файла журнала между процессами"""
+    with open(path + ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class JsonLinesFileHandler(logging.FileHandler):
+    """
+    Файл журнала с ротацией по размеру для потока QueueListener: размер
+    считается по записанному (без tell() на каждую запись), буфер
+    сбрасывается, когда очередь опустела, — пачка записей уходит
+    на диск одним write.
+
+    Файл дописывают несколько процессов (CLI, repl, serve), поэтому
+    после сброса размер и inode сверяются с файлом на диске, а ротация
+    идёт под блокировкой <path>.lock и повторно проверяет размер: файл,
+    уже повёрнутый другим процессом, не поворачивается второй раз.
+    """
+
+    def __init__(self, path, records, max_bytes, backup_count):
+        super().__init__(path, encoding="utf-8", delay=True)
+        self.maxBytes = max_bytes
+        self.backupCount = backup_count
+        self._records = records
+        self._size = os.path.getsize(path) if os.path.exists(path) else 0
+
+    def shouldRollover(self):
+        return self.backupCount > 0 and 0 < self.maxBytes <= self._size
+
+    def doRollover(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        base = self.baseFilename
+        with _file_lock(base):
+            if os.path.exists(base) and os.path.getsize(base) >= self.maxBytes:
+                for i in range(self.backupCount - 1, 0, -1):
+                    if os.path.exists(f"{base}.{i}"):
+                        os.replace(f"{base}.{i}", f"{base}.{i + 1}")
+                os.replace(base, base + ".1")
+            self.stream = self._open()
+        self._size = os.fstat(self.stream.fileno()).st_size
+
+    def _follow(self):
+        """Реальный размер файла; если другой процесс его повернул — переход на новый"""
+        opened = os.fstat(self.stream.fileno())
+        try:
+            current = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            current = None
+        if current is None or (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino):
+            self.stream.close()
+            self.stream = self._open()
+            opened = os.fstat(self.stream.fileno())
+        self._size = opened.st_size
+
+    def emit(self, record):
+        try:
+            if self.shouldRollover():
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            line = self.format(record) + "\n"
+            self.stream.write(line)
+            self._size += len(line.encode("utf-8"))
+            if self._records.empty():
+                self.stream.flush()
+                self._follow()
+        except Exception:
+            self.handleError(record)
+
+
+_listener = None
+_listener_pid = None
+_listener_path = None
+
+
+def configure_action_log(path: str = None):
+    """
+    (Пере)запускает журнал действий: логгер кладёт записи в очередь
+    (RecordQueueHandler — без форматирования, в отличие от стандартного
+    QueueHandler), а поток QueueListener сериализует их и пишет
+    в path (по умолчанию log_path из настроек) с ротацией по размеру:
+    log_max_bytes, log_backup_count. Вызывающий поток не ждёт диск.
+    """
+    global _listener, _listener_pid, _listener_path
+    from logging.handlers import QueueListener
+    from ..infra.settings import SettingsLoader
+
+    settings = SettingsLoader()
+    path = path or settings.get("log_path", "logs/actions.log")
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    records = queue.SimpleQueue()
+    file_handler = JsonLinesFileHandler(
+        path, records,
+        max_bytes=settings.get("log_max_bytes", 10 * 1024 * 1024),
+        backup_count=settings.get("log_backup_count", 5),
+    )
+    file_handler.setFormatter(JsonLinesFormatter())
+
+    logger = logging.getLogger(ACTION_LOGGER)
+    _stop_listener()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(RecordQueueHandler(records))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    _listener = QueueListener(records, file_handler)
+    _listener.start()
+    _listener_pid = os.getpid()
+    _listener_path = path
+    return logger
+
+
+def _stop_listener():
+    """Дописывает накопленные записи и закрывает файл журнала"""
+    global _listener
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+    _listener = None
+
+
+def get_action_logger() -> logging.Logger:
+    """Логгер журнала действий; после fork в дочернем процессе поток записи запускается заново"""
+    if _listener is None or _listener_pid != os.getpid():
+        return configure_action_log(_listener_path)
+    return logging.getLogger(ACTION_LOGGER)
+
+
+def log_event(fields: dict, level: int = None):
+    """
+    Запись журнала действий из полей fields (обязательно "action");
+    уровень по умолчанию — ERROR для result=ERROR, иначе INFO.
+    В вызывающем потоке — только LogRecord и постановка в очередь:
+    без поиска места вызова (findCaller) и без форматирования.
+    """
+    if level is None:
+        level = logging.ERROR if fields.get("result") == "ERROR" else logging.INFO
+    logger = get_action_logger()
+    if logger.isEnabledFor(level):
+        logger.handle(logger.makeRecord(
+            ACTION_LOGGER, level, "", 0, fields["action"], None, None, extra={"fields": fields},
+        ))
+
+
+atexit.register(_stop_listener)
@@ -0,0 +1,286 @@
+"""
+Метрики времени выполнения: гистограммы длительностей с фиксированными
+бакетами (как в Prometheus), накопление в памяти процесса и экспорт
+в локальный файл в текстовом формате Prometheus.
+
+Замер — два вызова perf_counter и bisect по границам бакетов под
+неоспариваемой блокировкой, поэтому метрики включены всегда
+(metrics_enabled: false — отключить). Настройки читаются при первом
+замере или сливе, а не при импорте. Процесс сливает накопленное
+в файл metrics_path при выходе (и периодически — serve, rates-daemon):
+файл суммирует все процессы, его читает команда stats.
+"""
+import atexit
+import bisect
+import fcntl
+import os
+import re
+import threading
+import time
+from functools import wraps
+
+# верхние границы бакетов, с: 10 мкс … 60 с, шесть на декаду
+BUCKETS = tuple(
+    round(m * 10.0 ** e, 9) for e in range(-5, 1) for m in (1, 1.5, 2, 3, 5, 7)
+) + (10.0, 15.0, 20.0, 30.0, 60.0)
+_LE = tuple(repr(b) for b in BUCKETS) + ("+Inf",)
+
+# шаблоны разбора файла экспорта; компилируются при первом разборе (stats), а не при импорте
+_LINE = r'^([a-zA-Z_:][a-zA-Z0-9_:]*)_(bucket|sum|count)\{(.*)\} (\S+)$'
+_LABEL = r'(\w+)="((?:[^"\\]|\\.)*)"'
+
+
+class Histogram:
+    """Распределение длительностей одной серии (имя метрики + метки)"""
+
+    __slots__ = ("counts", "total", "count", "_lock")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # последний — +Inf
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        i = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.total += seconds
+            self.count += 1
+
+    def merge(self, counts, total: float, count: int):
+        with self._lock:
+            for i, n in enumerate(counts):
+                self.counts[i] += n
+            self.total += total
+            self.count += count
+
+    def quantile(self, q: float) -> float:
+        """Квантиль по бакетам: линейная интерполяция внутри бакета, с"""
+        if not self.count:
+            return float("nan")
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = BUCKETS[i - 1] if i > 0 else 0.0
+                if i == len(BUCKETS):
+                    return lower
+                return lower + (BUCKETS[i] - lower) * (rank - seen) / n
+            seen += n
+        return BUCKETS[-1]
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else float("nan")
+
+
+class _Timer:
+    """Контекстный менеджер замера: серия outcome="ok" или outcome="error" по исключению"""
+
+    __slots__ = ("ok", "error", "began")
+
+    def __init__(self, ok: Histogram, error: Histogram):
+        self.ok = ok
+        self.error = error
+
+    def __enter__(self):
+        self.began = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if _enabled is True or _active():
+            (self.ok if exc_type is None else self.error).observe(time.perf_counter() - self.began)
+        return False
+
+
+# ===== Реестр процесса =====
+_series = {}
+_series_lock = threading.Lock()
+_path = None
+_enabled = None  # None — ещё не настроено: configure() при первом замере
+# относительный metrics_path — от корня проекта (как DATA_DIR), а не от текущего каталога
+_ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), "../.."))
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+def histogram(name: str, **labels) -> Histogram:
+    key = _key(name, labels)
+    series = _series.get(key)
+    if series is None:
+        with _series_lock:
+            series = _series.setdefault(key, Histogram())
+    return series
+
+
+def timer(name: str, **labels) -> _Timer:
+    """with timer("storage_json_seconds", op="load"): ..."""
+    return _Timer(histogram(name, **labels, outcome="ok"), histogram(name, **labels, outcome="error"))
+
+
+def timed(name: str, **labels):
+    """
+    Декоратор замера вызовов. Без меток серия получает метку
+    function=<имя функции>. Серии разрешаются один раз при декорировании.
+    """
+    def decorator(func):
+        series = labels or {"function": func.__name__}
+        ok = histogram(name, **series, outcome="ok")
+        error = histogram(name, **series, outcome="error")
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _enabled is not True and not _active():
+                return func(*args, **kwargs)
+            began = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                error.observe(time.perf_counter() - began)
+                raise
+            ok.observe(time.perf_counter() - began)
+            return result
+        return wrapper
+    return decorator
+
+
+def configure(path: str = None, enabled: bool = None):
+    """Файл экспорта и включение метрик; по умолчанию — metrics_path и metrics_enabled из настроек"""
+    global _path, _enabled
+    from ..infra.settings import SettingsLoader
+    settings = SettingsLoader()
+    _path = path or os.path.join(_ROOT, settings.get("metrics_path", "logs/metrics.prom"))
+    _enabled = bool(settings.get("metrics_enabled", True) if enabled is None else enabled)
+
+
+def _active() -> bool:
+    if _enabled is None:
+        configure()
+    return _enabled
+
+
+def metrics_path() -> str:
+    if _path is None:
+        configure()
+    return _path
+
+
+# ===== Экспорт в текстовом формате Prometheus =====
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _unescape(value: str) -> str:
+    return re.sub(r"\\(.)", lambda m: "\n" if m.group(1) == "n" else m.group(1), value)
+
+
+def render(series: dict) -> str:
+    """{(имя, метки): Histogram} -> текст Prometheus (бакеты кумулятивные)"""
+    lines = []
+    typed = set()
+    for (name, labels), h in sorted(series.items()):
+        if not h.count:
+            continue
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        base = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+        prefix = base + "," if base else ""
+        cumulative = 0
+        for le, n in zip(_LE, h.counts):
+            cumulative += n
+            lines.append(f'{name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{base}}} {h.total!r}")
+        lines.append(f"{name}_count{{{base}}} {h.count}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def parse(text: str) -> dict:
+    """Текст Prometheus, записанный render(), -> {(имя, метки): Histogram}"""
+    series = {}
+    cumulative = {}
+    line_re, label_re = re.compile(_LINE), re.compile(_LABEL)
+    for line in text.splitlines():
+        match = line_re.match(line)
+        if not match:
+            continue
+        name, kind, raw_labels, value = match.groups()
+        labels = {k: _unescape(v) for k, v in label_re.findall(raw_labels)}
+        le = labels.pop("le", None)
+        key = _key(name, labels)
+        h = series.setdefault(key, Histogram())
+        if kind == "sum":
+            h.total = float(value)
+        elif kind == "count":
+            h.count = int(float(value))
+        elif le in _LE:
+            cumulative.setdefault(key, {})[_LE.index(le)] = int(float(value))
+    for key, buckets in cumulative.items():
+        previous = 0
+        for i in range(len(_LE)):
+            current = buckets.get(i, previous)
+            series[key].counts[i] = current - previous
+            previous = current
+    return series
+
+
+def load(path: str = None) -> dict:
+    """Серии из файла экспорта"""
+    path = path or metrics_path()
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return parse(f.read())
+
+
+def flush(path: str = None) -> int:
+    """
+    Сливает накопленное процессом в файл экспорта (под flock, атомарной
+    заменой) и обнуляет счётчики процесса. Возвращает число серий.
+    """
+    local = {}
+    with _series_lock:
+        items = list(_series.items())
+    for key, h in items:
+        with h._lock:
+            if not h.count:
+                continue
+            delta = Histogram()
+            delta.counts, delta.total, delta.count = h.counts, h.total, h.count
+            h.counts, h.total, h.count = [0] * len(h.counts), 0.0, 0
+        local[key] = delta
+    if not local:
+        return 0
+    path = path or metrics_path()
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        merged = load(path)
+        for key, delta in local.items():
+            merged.setdefault(key, Histogram()).merge(delta.counts, delta.total, delta.count)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(render(merged))
+        os.replace(tmp, path)
+    return len(local)
+
+
+def _reset():
+    """В дочернем процессе после fork: накопленное принадлежит родителю"""
+    for h in _series.values():
+        h.counts, h.total, h.count = [0] * len(h.counts), 0.0, 0
+
+
+def _flush_at_exit():
+    try:
+        flush()
+    except OSError:
+        pass  # метрики не должны ронять завершение команды
+
+
+os.register_at_fork(after_in_child=_reset)
+atexit.register(_flush_at_exit)
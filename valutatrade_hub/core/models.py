@@ -1,24 +1,51 @@
 # valutatrade_hub/core/models.py
-import hashlib
-import os
+import sys
 from datetime import datetime
 from typing import Dict
 
+from .currencies import SCALES, format_minor, get_precision, to_minor
+
 
 class User:
+    # __slots__: без __dict__ у каждого экземпляра — миллионы объектов занимают в разы меньше памяти
+    __slots__ = ("_user_id", "_username", "_salt", "_hashed_password", "_registration_date")
+
     def __init__(self, user_id: int, username: str, password: str,
                  registration_date: str = None):
         self._user_id = user_id
         self.username = username
-        self._salt = os.urandom(8).hex()
-        self._hashed_password = self._hash_password(password)
+        self.set_password(password)
         self._registration_date = registration_date or datetime.now().isoformat()
 
+    @classmethod
+    def from_record(cls, record: dict) -> "User":
+        """Пользователь из записи хранилища — без пересчёта хеша пароля"""
+        user = cls.__new__(cls)
+        user._user_id = record["user_id"]
+        user.username = record["username"]
+        user._salt = record["salt"]
+        user._hashed_password = record["hashed_password"]
+        user._registration_date = record.get("registration_date")
+        return user
+
     def _hash_password(self, password: str) -> str:
-        return hashlib.sha256((password + self._salt).encode()).hexdigest()
+        from . import security  # hashlib — при первом обращении к паролю, а не при импорте CLI
+        return security.hash_password(password, self._salt)
+
+    def set_password(self, password: str):
+        """Новая соль и хеш пароля текущим KDF из настроек"""
+        from . import security
+        self._salt = security.new_salt()
+        self._hashed_password = self._hash_password(password)
 
     def verify_password(self, password: str) -> bool:
-        return self._hash_password(password) == self._hashed_password
+        from . import security
+        return security.verify_password(password, self._salt, self._hashed_password)
+
+    def needs_rehash(self) -> bool:
+        """Хеш пароля посчитан не текущим KDF или с прежними параметрами"""
+        from . import security
+        return security.needs_rehash(self._hashed_password)
 
     @property
     def user_id(self):
@@ -40,40 +67,78 @@ class User:
 
 
 class Wallet:
-    def __init__(self, currency_code: str, balance: float = 0.0):
-        self.currency_code = currency_code.upper()
-        self._balance = balance
+    """
+    Баланс хранится целым числом минимальных единиц валюты (см.
+    Currency.precision): сложение и вычитание точные и дешевле Decimal.
+    balance — float для отображения и оценки, units — точное значение.
+    """
 
-    def deposit(self, amount: float):
+    __slots__ = ("currency_code", "_units", "_precision")
+
+    def __init__(self, currency_code: str, balance: float = 0.0, units: int = None):
+        # один объект строки на код валюты для всех кошельков
+        self.currency_code = sys.intern(currency_code.upper())
+        self._precision = get_precision(self.currency_code)
+        self._units = units if units is not None else to_minor(balance, self._precision)
+
+    def _to_units(self, amount, action: str) -> int:
         if amount <= 0:
-            raise ValueError("Сумма пополнения должна быть положительной")
-        self._balance += amount
+            raise ValueError(f"Сумма {action} должна быть положительной")
+        units = to_minor(amount, self._precision)
+        if units == 0:
+            raise ValueError(
+                f"Сумма {action} меньше минимальной единицы {self.currency_code} "
+                f"({format_minor(1, self._precision)})"
+            )
+        return units
+
+    def deposit(self, amount: float):
+        self.deposit_units(self._to_units(amount, "пополнения"))
 
     def withdraw(self, amount: float):
-        if amount <= 0:
-            raise ValueError("Сумма снятия должна быть положительной")
-        if amount > self._balance:
-            raise ValueError(f"Недостаточно средств: доступно {self._balance} {self.currency_code}, требуется {amount} {self.currency_code}")
-        self._balance -= amount
+        self.withdraw_units(self._to_units(amount, "снятия"))
+
+    def deposit_units(self, units: int):
+        self._units += units
+
+    def withdraw_units(self, units: int):
+        if units > self._units:
+            raise ValueError(
+                f"Недостаточно средств: доступно {format_minor(self._units, self._precision)} "
+                f"{self.currency_code}, требуется {format_minor(units, self._precision)} {self.currency_code}"
+            )
+        self._units -= units
 
     @property
-    def balance(self):
-        return self._balance
+    def balance(self) -> float:
+        return self._units / SCALES[self._precision]
 
     @balance.setter
     def balance(self, value):
         if value < 0:
             raise ValueError("Баланс не может быть отрицательным")
-        self._balance = value
+        self._units = to_minor(value, self._precision)
+
+    @property
+    def units(self) -> int:
+        return self._units
+
+    @property
+    def precision(self) -> int:
+        return self._precision
 
     def get_balance_info(self) -> float:
-        return self._balance
+        return self.balance
 
 
 class Portfolio:
-    def __init__(self, user: User, wallets: Dict[str, Wallet] = None):
+    __slots__ = ("_user", "_wallets", "version")
+
+    def __init__(self, user: User, wallets: Dict[str, Wallet] = None, version: int = 0):
         self._user = user
         self._wallets = wallets or {}
+        # версия записи в хранилище — для оптимистичной блокировки
+        self.version = version
 
     @property
     def user(self) -> User:
@@ -94,7 +159,8 @@ class Portfolio:
 
     def get_total_value(self, base_currency="USD", exchange_rates=None) -> float:
         if exchange_rates is None:
-            exchange_rates = {"USD": 1.0, "EUR": 1.1, "BTC": 60000.0}
+            from .rate_engine import get_resolver
+            exchange_rates = get_resolver().rates_to(base_currency)
         total = 0.0
         for wallet in self._wallets.values():
             rate = exchange_rates.get(wallet.currency_code, 0)
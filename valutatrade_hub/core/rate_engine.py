@@ -0,0 +1,229 @@
+import json
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from . import metrics
+from .exceptions import RateUnavailableError
+from ..infra.settings import SettingsLoader
+
+
+def build_closure(pairs: dict) -> dict:
+    """
+    Строит замыкание графа курсов: для каждой достижимой пары (A, B)
+    считает курс A→B через прямые, обратные и кросс-курсы.
+    pairs — словарь из snapshot'а: {"BTC_USD": {"rate": ...}, ...}
+    """
+    graph = {}
+    for pair, info in pairs.items():
+        rate = info.get("rate") if isinstance(info, dict) else info
+        if not rate or "_" not in pair:
+            continue
+        src, dst = pair.upper().split("_", 1)
+        graph.setdefault(src, {})[dst] = float(rate)
+        graph.setdefault(dst, {}).setdefault(src, 1.0 / float(rate))
+
+    closure = {}
+    for start in graph:
+        # BFS: кратчайший по числу пересчётов путь
+        closure[(start, start)] = 1.0
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            base = closure[(start, node)]
+            for neighbour, rate in graph[node].items():
+                if (start, neighbour) not in closure:
+                    closure[(start, neighbour)] = base * rate
+                    queue.append(neighbour)
+    return closure
+
+
+def _timestamp(value) -> float:
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class RateResolver:
+    """
+    Курсы из snapshot'а rates.json с кешем в памяти процесса.
+
+    Файл читается один раз, замыкание строится один раз на snapshot,
+    после чего get_rate — поиск в словаре. Пока snapshot свежий, кеш
+    используется без обращения к диску; затем проверяется mtime файла,
+    и замыкание перестраивается, только если сменился last_refresh.
+
+    Stale-while-revalidate: snapshot старше rates_ttl_seconds (по
+    last_refresh или по подтверждению курсов источниками) отдаётся
+    сразу, а обновление запускается в фоне — одно на все процессы
+    (parser_service.refresh); is_stale() — признак для вывода.
+    Жёсткая граница — по желанию и только для сделок: если задан
+    rates_stale_grace_seconds, get_rate и rates_to со strict=True
+    (TradeEngine) бросают RateUnavailableError для курсов старше
+    ttl + grace, пока фоновое обновление не принесёт новые. Просмотр
+    (get-rate, show-portfolio, valuation-report) получает последний курс.
+    """
+
+    # пока snapshot устарел, файл перечитывается чаще, чтобы подхватить обновление
+    STALE_RECHECK_SECONDS = 1.0
+
+    def __init__(self, rates_file: str = None, ttl_seconds: float = None, grace_seconds=None,
+                 confirmations_file: str = None, refresh=None):
+        from_config = rates_file is None
+        if from_config:
+            # конфиг парсера (dataclasses) нужен только при первом обращении к курсам
+            from ..parser_service.config import config
+            rates_file = config.RATES_FILE_PATH
+            confirmations_file = confirmations_file or config.CONFIRMATIONS_FILE_PATH
+        self.rates_file = rates_file
+        self.confirmations_file = confirmations_file
+        settings = SettingsLoader()
+        if ttl_seconds is None:
+            ttl_seconds = settings.get("rates_ttl_seconds", 3600)
+        self.ttl_seconds = ttl_seconds
+        if grace_seconds is None:
+            grace_seconds = settings.get("rates_stale_grace_seconds")
+        self.grace_seconds = grace_seconds
+        self.retry_seconds = settings.get("rates_refresh_retry_seconds", 60)
+        # фоновое обновление — только для snapshot'а из конфига (или явно переданное)
+        self._refresh = refresh if refresh is not None else (self._refresh_rates if from_config else None)
+        self._closure = {}
+        self._pairs = {}
+        self._last_refresh = None
+        self._mtime = None
+        self._confirmed = None
+        self._confirmed_mtime = None
+        self._checked_at = None
+        self._next_check = None
+
+    @property
+    def last_refresh(self):
+        self._ensure_fresh()
+        return self._last_refresh
+
+    @property
+    def pairs(self) -> dict:
+        """Пары snapshot'а как есть: {"BTC_USD": {"rate": ..., ...}}"""
+        self._ensure_fresh()
+        return self._pairs
+
+    def invalidate(self):
+        self._checked_at = None
+        self._mtime = None
+        self._confirmed_mtime = None
+
+    def get_rate(self, from_code: str, to_code: str, strict: bool = False) -> float:
+        """Курс from→to; strict — не старше ttl + grace (для сделок)"""
+        self._ensure_usable(strict)
+        key = (from_code.upper(), to_code.upper())
+        if key[0] == key[1]:
+            return 1.0
+        rate = self._closure.get(key)
+        if rate is None:
+            raise RateUnavailableError(f"Курс {key[0]}→{key[1]} недоступен")
+        return rate
+
+    def rates_to(self, base: str, strict: bool = False) -> dict:
+        """Курсы всех известных валют к base: {"BTC": 64491.0, ...}"""
+        self._ensure_usable(strict)
+        base = base.upper()
+        rates = {src: rate for (src, dst), rate in self._closure.items() if dst == base}
+        rates[base] = 1.0
+        return rates
+
+    def age_seconds(self):
+        """Возраст курсов: с last_refresh или последнего подтверждения источниками; None — курсов нет"""
+        self._ensure_fresh()
+        stamps = [_timestamp(s) for s in (self._last_refresh, self._confirmed) if s]
+        if not self._pairs or not stamps:
+            return None
+        return max(0.0, time.time() - max(stamps))
+
+    def is_stale(self) -> bool:
+        """Snapshot старше rates_ttl_seconds"""
+        age = self.age_seconds()
+        return age is None or age > self.ttl_seconds
+
+    def _ensure_usable(self, strict: bool):
+        self._ensure_fresh()
+        if not strict or self.grace_seconds is None:
+            return
+        age = self.age_seconds()
+        if age is not None and age > self.ttl_seconds + self.grace_seconds:
+            raise RateUnavailableError(
+                f"Курсы устарели (обновлены {self._last_refresh}): "
+                f"запущено фоновое обновление, повторите позже"
+            )
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now < self._next_check:
+            return
+        self._checked_at = now
+        self._load_snapshot()
+        self._load_confirmed()
+        stamps = [_timestamp(s) for s in (self._last_refresh, self._confirmed) if s]
+        fresh_for = self.ttl_seconds - (time.time() - max(stamps)) if self._pairs and stamps else 0
+        if fresh_for > 0:
+            self._next_check = now + min(self.ttl_seconds, fresh_for)
+            return
+        self._next_check = now + min(self.ttl_seconds, self.STALE_RECHECK_SECONDS)
+        if self._refresh is not None:
+            # читатель не ждёт источники: обновление идёт в фоне, дедуплицируется там же
+            self._refresh()
+
+    def _refresh_rates(self):
+        from ..parser_service.refresh import refresh_in_background
+        try:
+            refresh_in_background(self.retry_seconds)
+        except OSError:
+            pass  # не удалось запустить — повторим при следующей проверке
+
+    def _load_snapshot(self):
+        try:
+            mtime = os.stat(self.rates_file).st_mtime_ns
+        except FileNotFoundError:
+            self._closure, self._pairs, self._last_refresh, self._mtime = {}, {}, None, None
+            return
+        if mtime == self._mtime:
+            return
+        with metrics.timer("rates_snapshot_load_seconds"):
+            with open(self.rates_file, "r", encoding="utf-8") as f:
+                content = f.read().strip()
+            snapshot = json.loads(content) if content else {}
+        self._mtime = mtime
+        last_refresh = snapshot.get("last_refresh")
+        if last_refresh is not None and last_refresh == self._last_refresh:
+            return
+        self._last_refresh = last_refresh
+        self._pairs = snapshot.get("pairs", {})
+        self._closure = build_closure(self._pairs)
+
+    def _load_confirmed(self):
+        """Обновление без изменений курсов не трогает rates.json, а только подтверждает их"""
+        if not self.confirmations_file:
+            return
+        try:
+            mtime = os.stat(self.confirmations_file).st_mtime_ns
+        except FileNotFoundError:
+            self._confirmed, self._confirmed_mtime = None, None
+            return
+        if mtime == self._confirmed_mtime:
+            return
+        with open(self.confirmations_file, "r", encoding="utf-8") as f:
+            content = f.read().strip()
+        self._confirmed_mtime = mtime
+        self._confirmed = (json.loads(content) if content else {}).get("last_confirmed")
+
+
+_resolver = None
+
+
+def get_resolver() -> RateResolver:
+    """Общий на процесс экземпляр RateResolver"""
+    global _resolver
+    if _resolver is None:
+        _resolver = RateResolver()
+    return _resolver
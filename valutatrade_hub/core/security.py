@@ -0,0 +1,179 @@
+"""
+Хеширование паролей и подписанные токены сессии.
+
+Пароль хешируется KDF из настроек (password_kdf: scrypt или pbkdf2_sha256)
+с параметрами стоимости; параметры записываются в сам хеш:
+
+    scrypt$n=32768,r=8,p=1$<hex>
+    pbkdf2_sha256$i=600000$<hex>
+
+Хеш с прежними параметрами проверяется по ним же, а при входе
+пересчитывается с текущими (needs_rehash). Хеш без префикса — старый
+формат: один проход SHA-256 от пароля с солью.
+
+Токен сессии — user_id и срок действия, подписанные HMAC-SHA256 ключом
+из data/session.key вместе с хешем пароля: смена пароля или параметров
+KDF отзывает выданные токены, а проверка токена — микросекунды вместо KDF.
+"""
+import hashlib
+import hmac
+import os
+import tempfile
+import time
+
+from . import metrics
+
+DEFAULT_KDF = "scrypt"
+SCRYPT_DEFAULTS = {"n": 32768, "r": 8, "p": 1}
+PBKDF2_DEFAULT_ITERATIONS = 600000
+LEGACY_KDF = "sha256"
+SALT_BYTES = 16
+KEY_BYTES = 32
+TOKEN_VERSION = "v1"
+
+
+# ===== Хеширование паролей =====
+def kdf_params() -> tuple:
+    """(kdf, {параметр: значение}) из настроек"""
+    from ..infra.settings import SettingsLoader
+    settings = SettingsLoader()
+    kdf = settings.get("password_kdf", DEFAULT_KDF)
+    if kdf == "scrypt":
+        return kdf, {
+            "n": settings.get("password_scrypt_n", SCRYPT_DEFAULTS["n"]),
+            "r": settings.get("password_scrypt_r", SCRYPT_DEFAULTS["r"]),
+            "p": settings.get("password_scrypt_p", SCRYPT_DEFAULTS["p"]),
+        }
+    if kdf == "pbkdf2_sha256":
+        return kdf, {"i": settings.get("password_pbkdf2_iterations", PBKDF2_DEFAULT_ITERATIONS)}
+    raise ValueError(f"Неизвестный password_kdf: {kdf} (scrypt или pbkdf2_sha256)")
+
+
+def _derive(kdf: str, params: dict, password: str, salt: str) -> str:
+    secret, salt = password.encode("utf-8"), salt.encode("utf-8")
+    if kdf == "scrypt":
+        n, r, p = params["n"], params["r"], params["p"]
+        # память scrypt — 128 * r * (n + p + 2) байт; лимит OpenSSL по умолчанию — 32 МБ
+        digest = hashlib.scrypt(secret, salt=salt, n=n, r=r, p=p, maxmem=128 * r * (n + p + 2) + (1 << 20))
+    elif kdf == "pbkdf2_sha256":
+        digest = hashlib.pbkdf2_hmac("sha256", secret, salt, params["i"])
+    elif kdf == LEGACY_KDF:
+        digest = hashlib.sha256(secret + salt).digest()
+    else:
+        raise ValueError(f"Неизвестный KDF в хеше пароля: {kdf}")
+    return digest.hex()
+
+
+def _parse(encoded: str) -> tuple:
+    """Хеш пароля -> (kdf, параметры, hex-дайджест)"""
+    if "$" not in encoded:
+        return LEGACY_KDF, {}, encoded
+    kdf, params, digest = encoded.split("$")
+    return kdf, {k: int(v) for k, v in (item.split("=") for item in params.split(",") if item)}, digest
+
+
+def new_salt() -> str:
+    return os.urandom(SALT_BYTES).hex()
+
+
+def hash_password(password: str, salt: str, kdf: str = None, params: dict = None) -> str:
+    """Хеш пароля с параметрами KDF; по умолчанию — текущие из настроек"""
+    if kdf is None:
+        kdf, params = kdf_params()
+    with metrics.timer("password_hash_seconds", kdf=kdf):
+        digest = _derive(kdf, params, password, salt)
+    return f"{kdf}${','.join(f'{k}={v}' for k, v in params.items())}${digest}"
+
+
+def verify_password(password: str, salt: str, encoded: str) -> bool:
+    kdf, params, expected = _parse(encoded)
+    with metrics.timer("password_hash_seconds", kdf=kdf):
+        digest = _derive(kdf, params, password, salt)
+    return hmac.compare_digest(digest, expected)
+
+
+def needs_rehash(encoded: str) -> bool:
+    """Хеш посчитан не текущим KDF или не с текущими параметрами"""
+    kdf, params, _ = _parse(encoded)
+    return (kdf, params) != kdf_params()
+
+
+def hash_many(items: list) -> list:
+    """[(пароль, соль, kdf, параметры)] -> хеши; выполняется в процессах пула при массовой регистрации"""
+    return [hash_password(password, salt, kdf, params) for password, salt, kdf, params in items]
+
+
+def calibrate(kdf: str, target_seconds: float) -> dict:
+    """
+    Параметры KDF, при которых хеш на этой машине считается не меньше
+    target_seconds: n у scrypt (память 128 * r * n) и число итераций
+    у pbkdf2_sha256 удваиваются, пока время не достигнет цели.
+    """
+    if kdf == "scrypt":
+        params = dict(SCRYPT_DEFAULTS, n=1024)
+        grow = "n"
+    elif kdf == "pbkdf2_sha256":
+        params = {"i": 10000}
+        grow = "i"
+    else:
+        raise ValueError(f"Неизвестный KDF: {kdf} (scrypt или pbkdf2_sha256)")
+    salt = new_salt()
+    while True:
+        began = time.perf_counter()
+        _derive(kdf, params, "calibration", salt)
+        elapsed = time.perf_counter() - began
+        if elapsed >= target_seconds or params[grow] >= 1 << 30:
+            return {**params, "seconds": elapsed}
+        params[grow] *= 2
+
+
+# ===== Токены сессии =====
+def load_key(path: str) -> bytes:
+    """Ключ подписи токенов; при первом обращении создаётся с правами 0600"""
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # ключ появляется целиком: временный файл (mkstemp — 0600) и link, который не перезаписывает
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(os.urandom(KEY_BYTES))
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass  # ключ успел создать другой процесс — используем его
+    finally:
+        os.remove(tmp_path)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _signature(key: bytes, body: str, password_hash: str) -> str:
+    return hmac.new(key, f"{body}.{password_hash}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def issue_token(key: bytes, user_id: int, password_hash: str, ttl_seconds: float) -> str:
+    """Токен v1.<user_id>.<срок, unix>.<HMAC>"""
+    body = f"{TOKEN_VERSION}.{user_id}.{int(time.time() + ttl_seconds)}"
+    return f"{body}.{_signature(key, body, password_hash)}"
+
+
+def token_user_id(token: str):
+    """user_id из токена — до проверки подписи, чтобы найти хеш пароля; None — не токен"""
+    parts = token.split(".")
+    if len(parts) != 4 or parts[0] != TOKEN_VERSION or not parts[1].isdigit():
+        return None
+    return int(parts[1])
+
+
+def verify_token(key: bytes, token: str, password_hash: str) -> bool:
+    body, _, signature = token.rpartition(".")
+    parts = body.split(".")
+    if len(parts) != 3 or not parts[2].isdigit() or int(parts[2]) < time.time():
+        return False
+    return hmac.compare_digest(signature, _signature(key, body, password_hash))
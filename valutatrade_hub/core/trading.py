@@ -0,0 +1,168 @@
+import csv
+import json
+import os
+from decimal import ROUND_CEILING, ROUND_FLOOR, Decimal
+
+from .currencies import format_minor, get_precision, to_minor
+from .models import Wallet
+from .rate_engine import get_resolver
+from ..infra.settings import SettingsLoader
+
+BUY = "buy"
+SELL = "sell"
+
+
+def default_quote() -> str:
+    """Валюта расчёта по умолчанию — default_base из настроек"""
+    return SettingsLoader().get("default_base", "USD").upper()
+
+
+class Order:
+    """
+    Ордер пользователя: купить или продать amount валюты currency
+    с расчётом в валюте quote (по умолчанию default_base).
+    """
+
+    __slots__ = ("user_id", "side", "currency", "amount", "quote")
+
+    def __init__(self, user_id: int, side: str, currency: str, amount, quote: str = None):
+        side = side.strip().lower()
+        if side not in (BUY, SELL):
+            raise ValueError(f"Неизвестный тип ордера '{side}': ожидается buy или sell")
+        self.user_id = int(user_id)
+        self.side = side
+        self.currency = currency.strip().upper()
+        self.amount = amount
+        self.quote = (quote or default_quote()).strip().upper()
+        if self.currency == self.quote:
+            raise ValueError(f"Валюта ордера и валюта расчёта совпадают: {self.currency}")
+
+
+class Fill:
+    """Исполненный ордер: цена и суммы обеих ног в минимальных единицах"""
+
+    __slots__ = ("order", "price", "units", "quote_units")
+
+    def __init__(self, order: Order, price: Decimal, units: int, quote_units: int):
+        self.order = order
+        self.price = price
+        self.units = units
+        self.quote_units = quote_units
+
+    @property
+    def amount(self) -> str:
+        return format_minor(self.units, get_precision(self.order.currency))
+
+    @property
+    def cost(self) -> str:
+        return format_minor(self.quote_units, get_precision(self.order.quote))
+
+    def ledger_entry(self) -> dict:
+        """Запись журнала операций: обе ноги сделки в минимальных единицах"""
+        order = self.order
+        sign = 1 if order.side == BUY else -1
+        return {
+            "user_id": order.user_id, "type": order.side,
+            "legs": {order.currency: sign * self.units, order.quote: -sign * self.quote_units},
+            "price": str(self.price),
+        }
+
+
+class TradeEngine:
+    """
+    Исполнение ордеров по курсам snapshot'а.
+
+    Цена каждой пары берётся из RateResolver один раз и фиксируется
+    на время жизни движка — вся партия ордеров исполняется по одним
+    ценам. Стоимость считается точно в минимальных единицах валюты
+    расчёта и округляется в пользу системы: стоимость покупки — вверх,
+    выручка продажи — вниз, так что округление не создаёт денег.
+    """
+
+    def __init__(self, resolver=None):
+        self.resolver = resolver or get_resolver()
+        self._prices = {}
+
+    def price(self, currency: str, quote: str) -> Decimal:
+        key = (currency, quote)
+        price = self._prices.get(key)
+        if price is None:
+            price = self._prices[key] = Decimal(repr(self.resolver.get_rate(currency, quote, strict=True)))
+        return price
+
+    def quote(self, order: Order) -> Fill:
+        if order.amount <= 0:
+            raise ValueError("Сумма ордера должна быть больше 0")
+        precision, quote_precision = get_precision(order.currency), get_precision(order.quote)
+        units = to_minor(order.amount, precision)
+        if units == 0:
+            raise ValueError(f"Сумма ордера меньше минимальной единицы {order.currency}")
+        price = self.price(order.currency, order.quote)
+        rounding = ROUND_CEILING if order.side == BUY else ROUND_FLOOR
+        quote_units = int((units * price).scaleb(quote_precision - precision).to_integral_value(rounding))
+        if quote_units == 0:
+            raise ValueError(f"Стоимость ордера меньше минимальной единицы {order.quote}")
+        return Fill(order, price, units, quote_units)
+
+    def execute(self, wallets: dict, order: Order) -> Fill:
+        """
+        Проводит обе ноги сделки на кошельках портфеля: сначала списание
+        (при нехватке средств — исключение, ничего не изменено), затем зачисление.
+        """
+        fill = self.quote(order)
+        if order.side == BUY:
+            debit, debit_units, credit, credit_units = order.quote, fill.quote_units, order.currency, fill.units
+        else:
+            debit, debit_units, credit, credit_units = order.currency, fill.units, order.quote, fill.quote_units
+        source = wallets.get(debit)
+        if source is None:
+            raise ValueError(f"Нет кошелька для валюты {debit}")
+        source.withdraw_units(debit_units)
+        target = wallets.get(credit)
+        if target is None:
+            target = wallets[credit] = Wallet(credit)
+        target.deposit_units(credit_units)
+        return fill
+
+
+class BatchReport:
+    """Итог партии ордеров: исполненные, отклонённые (номер, ордер, причина), время"""
+
+    def __init__(self, fills: list, rejected: list, elapsed: float):
+        self.fills = fills
+        self.rejected = rejected
+        self.elapsed = elapsed
+
+    @property
+    def total(self) -> int:
+        return len(self.fills) + len(self.rejected)
+
+    @property
+    def orders_per_second(self) -> float:
+        return self.total / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def load_orders(path: str, quote: str = None) -> list:
+    """
+    Ордера из CSV (заголовок user_id,side,currency,amount[,quote])
+    или JSON Lines ({"user_id": 1, "side": "buy", ...}) — по расширению файла.
+    Ошибка в любой строке — ValueError с номером строки, партия не исполняется.
+    """
+    if not os.path.exists(path):
+        raise ValueError(f"Файл ордеров не найден: {path}")
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        jsonl = path.endswith((".jsonl", ".json"))
+        rows = ((n, line) for n, line in enumerate(f, 1) if line.strip()) if jsonl else enumerate(csv.DictReader(f), 2)
+        orders = []
+        for line_no, row in rows:
+            try:
+                if jsonl:
+                    row = json.loads(row)
+                orders.append(Order(
+                    row["user_id"], row["side"], row["currency"],
+                    float(row["amount"]), row.get("quote") or quote,
+                ))
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"{path}:{line_no}: некорректный ордер ({e})")
+    return orders
+
@@ -1,113 +1,621 @@
-import json
 import os
+import random
+import threading
+import time
 from datetime import datetime
+
+from . import metrics
+from .currencies import record_units, units_record
 from .models import User, Portfolio, Wallet
+from .exceptions import ConcurrentModificationError, RateUnavailableError
+from .rate_engine import get_resolver
+from ..infra.database import DatabaseManager
+from ..infra.journal import PortfolioJournal, recover_journals
+from ..infra.settings import SettingsLoader
+from ..decorators import log_action
 
-DATA_DIR = os.path.join(os.path.dirname(__file__), "../../data")
-USERS_FILE = os.path.join(DATA_DIR, "users.json")
-PORTFOLIOS_FILE = os.path.join(DATA_DIR, "portfolios.json")
+# Сколько раз повторять сделку при конфликте версий портфеля
+MAX_TRADE_RETRIES = 50
+# Сколько раз сброс отложенной записи переносит сделки на новые версии портфелей
+MAX_FLUSH_RETRIES = 5
 
 
-def _load_json(file_path: str):
-    if not os.path.exists(file_path):
-        return []
-    with open(file_path, "r", encoding="utf-8") as f:
-        content = f.read().strip()
-        if not content:
-            return []
-        return json.loads(content)
+_recovered_backend = None
 
+# Хранилище и кеш портфелей — общие для потоков процесса: в serve регистрация
+# и вход идут в пуле потоков, а сделки и сброс — в цикле событий. Обращения
+# к ним выполняются под этой блокировкой; KDF паролей — вне её.
+state_lock = threading.RLock()
 
-def _save_json(file_path: str, data):
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
 
+def _storage():
+    global _recovered_backend
+    db = DatabaseManager()
+    if _recovered_backend is not db.backend:
+        # при первом обращении доводим до портфелей журнал операций
+        # и доигрываем журналы отложенной записи упавших процессов
+        _recovered_backend = db.backend
+        db.backend.recover_ledger()
+        recover_journals(db.path, db.backend)
+    return db.backend
 
-def register_user(username: str, password: str) -> User:
-    users = _load_json(USERS_FILE)
-    if any(u["username"] == username for u in users):
-        raise ValueError(f"Имя пользователя '{username}' уже занято")
-    user_id = max((u["user_id"] for u in users), default=0) + 1
-    user = User(user_id=user_id, username=username, password=password)
-    users.append({
+
+def _user_from_record(u: dict) -> User:
+    return User.from_record(u)
+
+
+def _user_record(user: User) -> dict:
+    return {
         "user_id": user.user_id,
         "username": user.username,
         "hashed_password": user._hashed_password,
         "salt": user._salt,
         "registration_date": user.registration_date
-    })
-    _save_json(USERS_FILE, users)
+    }
 
-    portfolios = _load_json(PORTFOLIOS_FILE)
-    portfolios.append({"user_id": user.user_id, "wallets": {}})
-    _save_json(PORTFOLIOS_FILE, portfolios)
-    return user
 
+# ===== Поля журнала действий =====
+def _user_fields(user: User) -> dict:
+    return {"user_id": user.user_id}
 
-def login_user(username: str, password: str) -> User:
-    users = _load_json(USERS_FILE)
-    for u in users:
-        if u["username"] == username:
-            user = User(
-                user_id=u["user_id"],
-                username=u["username"],
-                password=password,
-                registration_date=u.get("registration_date")
-            )
-            user._salt = u["salt"]
-            user._hashed_password = u["hashed_password"]
-            if user.verify_password(password):
+
+def _fill_fields(fill) -> dict:
+    return {"quote": fill.order.quote, "price": str(fill.price), "amount": fill.amount, "cost": fill.cost}
+
+
+def _batch_fields(report) -> dict:
+    return {"orders": report.total, "filled": len(report.fills), "rejected": len(report.rejected)}
+
+
+def _import_fields(result) -> dict:
+    return {"registered": len(result[0]), "skipped": len(result[1])}
+
+
+@log_action("REGISTER", _user_fields)
+@metrics.timed("usecase_seconds")
+def register_user(username: str, password: str) -> User:
+    with state_lock:
+        if _storage().get_user_by_username(username):
+            raise ValueError(f"Имя пользователя '{username}' уже занято")
+    # KDF — до выдачи user_id: пока считается хеш, номер не занят впустую
+    user = User(user_id=None, username=username, password=password)
+    retries = _registration_retries()
+    for attempt in range(retries):
+        with state_lock:
+            storage = _storage()
+            user._user_id = storage.next_user_id()
+            try:
+                storage.add_user(_user_record(user))
                 return user
-            else:
-                raise ValueError("Неверный пароль")
-    raise ValueError(f"Пользователь '{username}' не найден")
+            except ConcurrentModificationError:
+                # user_id занял другой процесс — берём следующий
+                if attempt == retries - 1:
+                    raise
+        time.sleep(random.uniform(0, 0.01))
+
+
+def _registration_retries() -> int:
+    """Сколько раз регистрация берёт новые user_id, если их заняла параллельная"""
+    return SettingsLoader().get("registration_max_retries", 10)
+
+
+def _hash_in_pool(items: list, workers: int = None) -> list:
+    """security.hash_many по чанкам в пуле процессов: KDF занимает ядро на десятки миллисекунд"""
+    from . import security  # hashlib и KDF — только командам, которым нужны пароли
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(items) < 2:
+        return security.hash_many(items)
+    from concurrent.futures import ProcessPoolExecutor  # пул нужен только массовой регистрации
+    size = -(-len(items) // (workers * 4))
+    chunks = [items[i:i + size] for i in range(0, len(items), size)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        return [h for hashes in pool.map(security.hash_many, chunks) for h in hashes]
+
+
+@log_action("REGISTER_BULK", _import_fields)
+@metrics.timed("usecase_seconds")
+def register_users(credentials: list, workers: int = None) -> tuple:
+    """
+    Массовая регистрация [(username, password)]: хеши паролей считаются
+    в пуле процессов (workers, по умолчанию — по числу ядер), пользователи
+    и их портфели добавляются одной записью хранилища.
+    Возвращает (зарегистрированные User, [(username, причина пропуска)]).
+    """
+    storage = _storage()
+    accepted, skipped, seen = [], [], set()
+    for username, password in credentials:
+        if not username or not password:
+            skipped.append((username, "пустое имя или пароль"))
+        elif username in seen or storage.get_user_by_username(username):
+            skipped.append((username, "имя уже занято"))
+        else:
+            seen.add(username)
+            accepted.append((username, password))
+    if not accepted:
+        return [], skipped
+
+    from . import security
+    kdf, params = security.kdf_params()
+    salts = [security.new_salt() for _ in accepted]
+    hashes = _hash_in_pool([(password, salt, kdf, params) for (_, password), salt in zip(accepted, salts)], workers)
+    registered = datetime.now().isoformat()
+    retries = _registration_retries()
+    for attempt in range(retries):
+        # user_id выдаются подряд; если их заняла параллельная регистрация — берём следующие
+        first_id = storage.next_user_id()
+        records = [
+            {"user_id": first_id + i, "username": username, "hashed_password": hashed,
+             "salt": salt, "registration_date": registered}
+            for i, ((username, _), hashed, salt) in enumerate(zip(accepted, hashes, salts))
+        ]
+        try:
+            storage.add_users(records)
+            break
+        except ConcurrentModificationError:
+            if attempt == retries - 1:
+                raise
+            time.sleep(random.uniform(0, 0.01))
+    return [_user_from_record(r) for r in records], skipped
+
+
+@log_action("LOGIN", _user_fields)
+@metrics.timed("usecase_seconds")
+def login_user(username: str, password: str) -> User:
+    with state_lock:
+        u = _storage().get_user_by_username(username)
+    if not u:
+        raise ValueError(f"Пользователь '{username}' не найден")
+    user = _user_from_record(u)
+    if not user.verify_password(password):
+        raise ValueError("Неверный пароль")
+    if user.needs_rehash():
+        # KDF или его параметры в настройках сменились — пересчитываем хеш, пока пароль известен
+        user.set_password(password)
+        with state_lock:
+            _storage().update_password(user.user_id, user._hashed_password, user._salt)
+    return user
+
+
+@metrics.timed("usecase_seconds")
+def get_user_by_id(user_id: int):
+    u = _storage().get_user_by_id(user_id)
+    return _user_from_record(u) if u else None
+
+
+# ===== Сессии =====
+SESSION_KEY_FILE = "session.key"
+_session_keys = {}
+
+
+def _session_key() -> bytes:
+    """Ключ подписи токенов сессии из каталога данных (читается один раз на процесс)"""
+    path = os.path.join(DatabaseManager().path, SESSION_KEY_FILE)
+    key = _session_keys.get(path)
+    if key is None:
+        from . import security
+        key = _session_keys[path] = security.load_key(path)
+    return key
+
+
+@metrics.timed("usecase_seconds")
+def issue_session(user: User) -> str:
+    """Подписанный токен сессии пользователя на session_ttl_seconds"""
+    from . import security
+    ttl = SettingsLoader().get("session_ttl_seconds", 7 * 86400)
+    return security.issue_token(_session_key(), user.user_id, user._hashed_password, ttl)
+
+
+@metrics.timed("usecase_seconds")
+def resume_session(token: str):
+    """
+    Пользователь по токену сессии: проверка HMAC и одно чтение записи
+    пользователя вместо KDF. None — токен подделан, истёк или выдан
+    до смены пароля.
+    """
+    from . import security
+    user_id = security.token_user_id(token)
+    u = _storage().get_user_by_id(user_id) if user_id is not None else None
+    if u is None or not security.verify_token(_session_key(), token, u["hashed_password"]):
+        return None
+    return _user_from_record(u)
+
+
+class _PortfolioCache:
+    """
+    Портфели, удерживаемые в памяти между командами (write-behind).
+    Изменённые портфели сбрасываются одной записью при commit() или
+    автоматически: после write_behind_interval_seconds с прошлого сброса
+    либо когда их набирается write_behind_max_dirty. До сброса каждая
+    сделка лежит в журнале, поэтому падение процесса её не теряет.
+    """
+
+    def __init__(self, group_sync: bool = False):
+        settings = SettingsLoader()
+        self.group_sync = group_sync
+        self.portfolios = {}
+        self.dirty = set()
+        # записи журнала операций по изменённым портфелям, ещё не проведённые
+        self.entries = {}
+        self.flush_interval = settings.get("write_behind_interval_seconds", 5.0)
+        self.max_dirty = settings.get("write_behind_max_dirty", 1000)
+        self.flushed_at = time.monotonic()
+        _storage()  # восстановление старых журналов — до открытия своего
+        self.journal = PortfolioJournal(DatabaseManager().path)
+
+
+_cache = None
+# подтверждённые сделки, отменённые при переносе на чужие изменения (нет средств)
+_rejected = []
+
+
+@metrics.timed("usecase_seconds")
+def begin_batch(group_sync: bool = False):
+    """
+    Включает отложенную запись: портфели читаются из хранилища один раз,
+    дальше изменяются в памяти и сохраняются при commit() или по порогам.
+    С group_sync=True журнал не fsync'ается на каждой сделке:
+    вызывающий подтверждает группу сделок после sync_journal().
+    """
+    global _cache
+    if _cache is None:
+        _cache = _PortfolioCache(group_sync)
+
 
+@metrics.timed("usecase_seconds")
+def sync_journal():
+    """Один fsync журнала на все сделки с прошлого вызова (group commit)"""
+    if _cache is not None:
+        _cache.journal.sync()
 
+
+@metrics.timed("usecase_seconds")
+def commit() -> int:
+    """
+    Сохраняет все изменённые портфели одной операцией хранилища.
+    Сделки в памяти уже подтверждены: при конфликте версий они
+    переносятся на сохранённые портфели (_rebase) и запись повторяется.
+    Если сброс так и не удался, изменения и журнал остаются до следующего.
+    """
+    if _cache is None or not _cache.dirty:
+        return 0
+    user_ids = sorted(_cache.dirty)
+    for attempt in range(MAX_FLUSH_RETRIES):
+        items = [
+            (uid, _wallets_payload(_cache.portfolios[uid]), _cache.portfolios[uid].version)
+            for uid in user_ids
+        ]
+        entries = [e for uid in user_ids for e in _cache.entries.get(uid, ())]
+        try:
+            versions = _storage().save_portfolios(items, entries)
+            break
+        except ConcurrentModificationError:
+            if attempt == MAX_FLUSH_RETRIES - 1:
+                raise
+            _rebase(user_ids)
+    for uid, version in zip(user_ids, versions):
+        _cache.portfolios[uid].version = version
+    _cache.dirty.clear()
+    _cache.entries.clear()
+    _cache.flushed_at = time.monotonic()
+    _cache.journal.truncate()
+    return len(items)
+
+
+def _rebase(user_ids: list) -> int:
+    """
+    Портфели, которые другой процесс сохранил после нашего чтения:
+    записи журнала операций из памяти проводятся поверх сохранённых
+    кошельков с проверкой средств, версия берётся сохранённая. Сделка,
+    которой после чужих изменений не хватает средств, отменяется
+    (take_rejected()). Новое состояние сначала пишется в журнал —
+    после падения доигрывается уже оно.
+    Возвращает число перенесённых портфелей.
+    """
+    from ..infra.ledger import rebase_entries
+    stored = {p["user_id"]: p for p in _storage().get_portfolios(user_ids)}
+    records = []
+    for uid in user_ids:
+        portfolio = _cache.portfolios[uid]
+        record = stored.get(uid, {})
+        if record.get("version", 0) == portfolio.version:
+            continue
+        units = {code: record_units(code, info) for code, info in record.get("wallets", {}).items()}
+        applied, rejected = rebase_entries(units, _cache.entries.get(uid, ()))
+        _cache.entries[uid] = applied
+        for entry in rejected:
+            _reject(entry)
+        # тот же объект портфеля: на него ссылаются вызывающие
+        portfolio.wallets.clear()
+        portfolio.wallets.update((code, Wallet(code, units=n)) for code, n in units.items())
+        portfolio.version = record.get("version", 0)
+        records.append({"user_id": uid, "wallets": _wallets_payload(portfolio), "version": portfolio.version,
+                        "entries": _cache.entries.get(uid, [])})
+    if records:
+        _cache.journal.append(records)
+    return len(records)
+
+
+def _reject(entry: dict):
+    """Отменённая при переносе сделка: в журнал действий и в список для вызывающего"""
+    from .logging_config import log_event
+    _rejected.append(entry)
+    log_event({"action": "TRADE_REVERTED", "user_id": entry["user_id"], "type": entry.get("type"),
+               "legs": entry["legs"], "result": "ERROR", "error_type": "InsufficientFundsError",
+               "error": "Недостаточно средств после изменений портфеля другим процессом"})
+
+
+def take_rejected() -> list:
+    """
+    Записи журнала операций подтверждённых сделок, отменённых при сбросе:
+    портфель изменил другой процесс, и средств на сделку больше нет.
+    Список очищается.
+    """
+    rejected = _rejected[:]
+    _rejected.clear()
+    return rejected
+
+
+def _maybe_flush():
+    if _cache is None or not _cache.dirty:
+        return
+    if (len(_cache.dirty) >= _cache.max_dirty
+            or time.monotonic() - _cache.flushed_at >= _cache.flush_interval):
+        commit()
+
+
+@metrics.timed("usecase_seconds")
+def end_batch() -> int:
+    """
+    commit() и выход из режима отложенной записи.
+    Если запись не удалась, журнал остаётся на диске и будет доигран
+    при следующем запуске.
+    """
+    global _cache
+    if _cache is None:
+        return 0
+    try:
+        flushed = commit()
+    except Exception:
+        _cache.journal.release()
+        _cache = None
+        raise
+    _cache.journal.close()
+    _cache = None
+    return flushed
+
+
+def _wallets_payload(portfolio: Portfolio) -> dict:
+    return _wallet_records(portfolio.wallets)
+
+
+def _wallet_records(wallets: dict) -> dict:
+    return {c: units_record(c, w.units) for c, w in wallets.items()}
+
+
+def _wallet_from_record(code: str, info: dict) -> Wallet:
+    return Wallet(code, units=record_units(code, info))
+
+
+@metrics.timed("usecase_seconds")
 def get_user_portfolio(user: User) -> Portfolio:
-    portfolios = _load_json(PORTFOLIOS_FILE)
-    data = next((p for p in portfolios if p["user_id"] == user.user_id), None)
+    if _cache is not None and user.user_id in _cache.portfolios:
+        return _cache.portfolios[user.user_id]
+    data = _storage().get_portfolio(user.user_id)
     wallets = {}
+    version = 0
     if data:
         for code, w in data.get("wallets", {}).items():
-            wallets[code] = Wallet(code, w.get("balance", 0.0))
-    return Portfolio(user, wallets)
+            wallets[code] = _wallet_from_record(code, w)
+        version = data.get("version", 0)
+    portfolio = Portfolio(user, wallets, version)
+    if _cache is not None:
+        _cache.portfolios[user.user_id] = portfolio
+    return portfolio
 
 
-def save_user_portfolio(portfolio: Portfolio):
-    portfolios = _load_json(PORTFOLIOS_FILE)
-    found = False
-    for p in portfolios:
-        if p["user_id"] == portfolio.user.user_id:
-            p["wallets"] = {c: {"balance": w.balance} for c, w in portfolio.wallets.items()}
-            found = True
-            break
-    if not found:
-        portfolios.append({
-            "user_id": portfolio.user.user_id,
-            "wallets": {c: {"balance": w.balance} for c, w in portfolio.wallets.items()}
-        })
-    _save_json(PORTFOLIOS_FILE, portfolios)
+@metrics.timed("usecase_seconds")
+def save_user_portfolio(portfolio: Portfolio, entries: list = None):
+    """
+    Сохраняет портфель, если его не изменили с момента чтения.
+    entries — записи журнала операций, которые привели к этим кошелькам.
+    """
+    entries = entries or []
+    if _cache is not None:
+        uid = portfolio.user.user_id
+        for entry in entries:
+            # по id восстановление журнала отличает уже проведённые записи от непроведённых
+            entry.setdefault("id", os.urandom(8).hex())
+        # сначала журнал, затем подтверждение сделки
+        _cache.journal.append(
+            [{"user_id": uid, "wallets": _wallets_payload(portfolio), "version": portfolio.version,
+              "entries": entries}],
+            sync=not _cache.group_sync,
+        )
+        _cache.portfolios[uid] = portfolio
+        _cache.dirty.add(uid)
+        _cache.entries.setdefault(uid, []).extend(entries)
+        return
+    portfolio.version = _storage().save_portfolio(
+        portfolio.user.user_id,
+        _wallets_payload(portfolio),
+        expected_version=portfolio.version,
+        entries=entries,
+    )
+
 
+def _trade(user: User, apply):
+    """
+    Оптимистичный цикл: чтение → изменение → запись с проверкой версии.
+    apply(portfolio) изменяет кошельки и возвращает запись журнала операций.
+    При конфликте с параллельной сделкой повторяет с новыми данными.
+    """
+    for attempt in range(MAX_TRADE_RETRIES):
+        portfolio = get_user_portfolio(user)
+        entry = apply(portfolio)
+        try:
+            save_user_portfolio(portfolio, [entry])
+        except ConcurrentModificationError:
+            # экспоненциальная задержка со случайным разбросом
+            time.sleep(random.uniform(0, min(0.05, 0.001 * 2 ** attempt)))
+            continue
+        # сброс по порогам — вне цикла повторов, чтобы конфликт не повторил чужие сделки
+        _maybe_flush()
+        return portfolio
+    raise ConcurrentModificationError(
+        f"Не удалось провести сделку за {MAX_TRADE_RETRIES} попыток: портфель постоянно изменяется"
+    )
 
-def buy_currency(user: User, currency_code: str, amount: float):
+
+@log_action("BUY", _fill_fields)
+@metrics.timed("usecase_seconds")
+def buy_currency(user: User, currency_code: str, amount: float, quote_code: str = None):
+    """Покупка по курсу snapshot'а: списание quote_code (по умолчанию default_base), зачисление currency_code"""
     if amount <= 0:
         raise ValueError("Сумма покупки должна быть больше 0")
-    portfolio = get_user_portfolio(user)
-    if currency_code not in portfolio.wallets:
-        portfolio.add_currency(currency_code)
-    wallet = portfolio.get_wallet(currency_code)
-    wallet.deposit(amount)
-    save_user_portfolio(portfolio)
+    from .trading import BUY, Order
+    return _execute_order(user, Order(user.user_id, BUY, currency_code, amount, quote_code))
+
+
+@log_action("SELL", _fill_fields)
+@metrics.timed("usecase_seconds")
+def sell_currency(user: User, currency_code: str, amount: float, quote_code: str = None):
+    """Продажа по курсу snapshot'а: списание currency_code, зачисление quote_code"""
+    from .trading import SELL, Order
+    return _execute_order(user, Order(user.user_id, SELL, currency_code, amount, quote_code))
+
+
+def _execute_order(user: User, order):
+    from .trading import TradeEngine
+    engine = TradeEngine()
+    fills = []
+
+    def apply(portfolio):
+        fills.append(engine.execute(portfolio.wallets, order))
+        return fills[-1].ledger_entry()
+
+    _trade(user, apply)
+    return fills[-1]
+
+
+@log_action("DEPOSIT")
+@metrics.timed("usecase_seconds")
+def deposit_currency(user: User, currency_code: str, amount: float):
+    """Пополнение кошелька извне (без второй ноги сделки)"""
+    def apply(portfolio):
+        if currency_code.upper() not in portfolio.wallets:
+            portfolio.add_currency(currency_code)
+        wallet = portfolio.get_wallet(currency_code)
+        before = wallet.units
+        wallet.deposit(amount)
+        return {"user_id": user.user_id, "type": "deposit", "legs": {wallet.currency_code: wallet.units - before}}
+
+    _trade(user, apply)
+
+
+@log_action("WITHDRAW")
+@metrics.timed("usecase_seconds")
+def withdraw_currency(user: User, currency_code: str, amount: float):
+    """Вывод средств из кошелька (без второй ноги сделки)"""
+    def apply(portfolio):
+        wallet = portfolio.get_wallet(currency_code)
+        if wallet is None:
+            raise ValueError(f"Нет кошелька для валюты {currency_code.upper()}")
+        before = wallet.units
+        wallet.withdraw(amount)
+        return {"user_id": user.user_id, "type": "withdraw", "legs": {wallet.currency_code: wallet.units - before}}
+
+    _trade(user, apply)
+
+
+@log_action("EXECUTE_ORDERS", _batch_fields)
+@metrics.timed("usecase_seconds")
+def execute_orders(orders: list):
+    """
+    Партия ордеров: портфели всех участников читаются одной операцией
+    хранилища, ордера исполняются в памяти по порядку и по одним ценам,
+    результат сохраняется одной групповой записью. Ордер, который нельзя
+    исполнить (нет средств, курса, пользователя), отклоняется — остальные
+    проводятся. При конфликте версий партия переигрывается на свежих данных.
+    """
+    from .trading import BatchReport, TradeEngine
+    if _cache is not None:
+        # отложенные сделки — в хранилище до чтения партии
+        commit()
+    began = time.perf_counter()
+    engine = TradeEngine()
+    storage = _storage()
+    user_ids = sorted({order.user_id for order in orders})
+    for attempt in range(MAX_TRADE_RETRIES):
+        records = {p["user_id"]: p for p in storage.get_portfolios(user_ids)}
+        wallets = {
+            uid: {code: _wallet_from_record(code, w) for code, w in record.get("wallets", {}).items()}
+            for uid, record in records.items()
+        }
+        fills, rejected, touched = [], [], set()
+        for number, order in enumerate(orders, 1):
+            if order.user_id not in wallets:
+                rejected.append((number, order, f"Пользователь {order.user_id} не найден"))
+                continue
+            try:
+                fills.append(engine.execute(wallets[order.user_id], order))
+                touched.add(order.user_id)
+            except (ValueError, RateUnavailableError) as e:
+                rejected.append((number, order, str(e)))
+        items = [
+            (uid, _wallet_records(wallets[uid]), records[uid].get("version", 0))
+            for uid in sorted(touched)
+        ]
+        try:
+            if items:
+                storage.save_portfolios(items, [fill.ledger_entry() for fill in fills])
+            break
+        except ConcurrentModificationError:
+            time.sleep(random.uniform(0, min(0.05, 0.001 * 2 ** attempt)))
+    else:
+        raise ConcurrentModificationError(
+            f"Не удалось провести партию за {MAX_TRADE_RETRIES} попыток: портфели постоянно изменяются"
+        )
+    if _cache is not None:
+        # в памяти остались прежние версии этих портфелей
+        for uid in touched:
+            _cache.portfolios.pop(uid, None)
+    return BatchReport(fills, rejected, time.perf_counter() - began)
+
+
+@metrics.timed("usecase_seconds")
+def get_balances_at(user: User, when) -> dict:
+    """
+    Балансы пользователя на момент when (ISO 8601 или datetime) по журналу
+    операций: ближайшая контрольная точка плюс хвост журнала до when.
+    {код: Wallet}, нулевые кошельки пропускаются.
+    """
+    if _cache is not None:
+        commit()
+    balances = _storage().ledger.balances_at(when, user.user_id)
+    return {code: Wallet(code, units=units) for code, units in sorted(balances.items()) if units}
+
+
+@metrics.timed("usecase_seconds")
+def get_ledger_entries(user: User, last: int = None) -> list:
+    """Проведённые операции пользователя по журналу, от старых к новым"""
+    if _cache is not None:
+        commit()
+    return _storage().ledger.entries(user.user_id, last)
+
+
+@metrics.timed("usecase_seconds")
+def value_all_portfolios(base_currency: str = "USD"):
+    """Оценка портфелей всех пользователей за один проход (numpy)"""
+    from .valuation import value_portfolios
+    return value_portfolios(_storage().load_portfolios(), base_currency)
 
 
-def sell_currency(user: User, currency_code: str, amount: float):
-    portfolio = get_user_portfolio(user)
-    wallet = portfolio.get_wallet(currency_code)
-    if not wallet:
-        raise ValueError(f"Нет кошелька для валюты {currency_code}")
-    wallet.withdraw(amount)
-    save_user_portfolio(portfolio)
+@metrics.timed("usecase_seconds")
+def list_usernames() -> dict:
+    """{user_id: username} для всех пользователей"""
+    return {u["user_id"]: u["username"] for u in _storage().load_users()}
 
 
+@metrics.timed("usecase_seconds")
 def get_rate(from_code: str, to_code: str) -> float:
-    return 1.0
\ No newline at end of file
+    return get_resolver().get_rate(from_code, to_code)
\ No newline at end of file
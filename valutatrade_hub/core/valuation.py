@@ -0,0 +1,55 @@
+import numpy as np
+
+from .rate_engine import get_resolver
+
+
+def build_balance_matrix(portfolios: list):
+    """
+    Упаковывает балансы в матрицу пользователи × валюты.
+    Возвращает (user_ids, codes, matrix).
+    """
+    codes = sorted({code for p in portfolios for code in p.get("wallets", {})})
+    column = {code: i for i, code in enumerate(codes)}
+    wallets = [p.get("wallets", {}) for p in portfolios]
+
+    # плоские массивы (строка, столбец, баланс) собираются через fromiter без промежуточных списков
+    user_ids = np.fromiter((p["user_id"] for p in portfolios), dtype=np.int64, count=len(portfolios))
+    counts = np.fromiter((len(w) for w in wallets), dtype=np.intp, count=len(wallets))
+    cols = np.fromiter((column[code] for w in wallets for code in w), dtype=np.intp)
+    values = np.fromiter(
+        (info.get("balance", 0.0) for w in wallets for info in w.values()), dtype=np.float64
+    )
+    rows = np.repeat(np.arange(len(wallets)), counts)
+
+    matrix = np.zeros((len(portfolios), len(codes)), dtype=np.float64)
+    matrix[rows, cols] = values
+    return user_ids, codes, matrix
+
+
+class ValuationReport:
+    """Оценка всех портфелей в базовой валюте, отсортированная по убыванию"""
+
+    def __init__(self, base: str, user_ids, totals, missing_rates):
+        self.base = base
+        self.user_ids = user_ids
+        self.totals = totals
+        # валюты без курса к base — в итог не вошли
+        self.missing_rates = missing_rates
+
+    def top(self, n: int = None) -> list:
+        return list(zip(self.user_ids[:n].tolist(), self.totals[:n].tolist()))
+
+
+def value_portfolios(portfolios: list, base: str = "USD", rates: dict = None) -> ValuationReport:
+    """Итоги всех портфелей одним умножением матрицы балансов на вектор курсов"""
+    base = base.upper()
+    if rates is None:
+        rates = get_resolver().rates_to(base)
+    user_ids, codes, matrix = build_balance_matrix(portfolios)
+
+    rate_vector = np.array([rates.get(code, 0.0) for code in codes], dtype=np.float64)
+    missing = [code for code in codes if code not in rates]
+    totals = matrix @ rate_vector
+
+    order = np.argsort(-totals, kind="stable")
+    return ValuationReport(base, user_ids[order], totals[order], missing)
@@ -1,19 +1,57 @@
+import time
 from functools import wraps
-from .logging_config import logger
 
-def log_action(action):
+
+def _subject(params: dict) -> dict:
+    """Кто и с чем действует: пользователь, валюта, сумма — из аргументов вызова"""
+    fields = {}
+    user = params.get("user")
+    if user is not None:
+        fields["user_id"] = getattr(user, "user_id", None)
+        fields["username"] = getattr(user, "username", None)
+    elif params.get("username") is not None:
+        fields["username"] = params["username"]
+    for name, field in (("currency_code", "currency"), ("quote_code", "quote")):
+        if params.get(name) is not None:
+            fields[field] = params[name]
+    if params.get("amount") is not None:
+        # сумма в журнале — всегда строка: как в записи OK (Fill.amount), так и в ERROR
+        fields["amount"] = str(params["amount"])
+    return fields
+
+
+def log_action(action, details=None):
+    """
+    Записывает вызов в журнал действий (JSON Lines, log_path):
+    action, пользователь, валюта, сумма, result OK/ERROR, текст и тип
+    ошибки, duration_ms, а для успешного вызова — поля details(result).
+    Запись только ставится в очередь: сериализация и диск — в потоке
+    QueueListener (core.logging_config), вызов их не ждёт.
+    """
     def decorator(func):
+        target = func
+        while hasattr(target, "__wrapped__"):
+            target = target.__wrapped__  # имена аргументов — у исходной функции, а не у обёрток
+        names = target.__code__.co_varnames[:target.__code__.co_argcount]
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            username = kwargs.get("username") or getattr(args[0], "username", None)
-            currency = kwargs.get("currency_code") or kwargs.get("code") or ""
-            amount = kwargs.get("amount", "")
+            params = dict(zip(names, args))
+            params.update(kwargs)
+            from .core.logging_config import log_event  # logging.handlers — только при первой записи
+            fields = {"action": action, **_subject(params)}
+            began = time.perf_counter()
             try:
                 result = func(*args, **kwargs)
-                logger.info(f"{action} user='{username}' currency='{currency}' amount={amount} result=OK")
-                return result
             except Exception as e:
-                logger.error(f"{action} user='{username}' currency='{currency}' amount={amount} result=ERROR error='{e}'")
+                fields.update(result="ERROR", error=str(e), error_type=type(e).__name__,
+                              duration_ms=round((time.perf_counter() - began) * 1e3, 3))
+                log_event(fields)
                 raise
+            fields.update(result="OK", duration_ms=round((time.perf_counter() - began) * 1e3, 3))
+            if details is not None:
+                fields.update(details(result))
+            log_event(fields)
+            return result
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
@@ -1,15 +1,355 @@
+import fcntl
 import json
 import os
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+from .settings import SettingsLoader
+from ..core import metrics
+from ..core.exceptions import ConcurrentModificationError
+
+DATA_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "../../data"))
+
+
+def _load_json(file_path: str):
+    if not os.path.exists(file_path):
+        return []
+    with metrics.timer("storage_json_seconds", op="load", file=os.path.basename(file_path)):
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = f.read().strip()
+            if not content:
+                return []
+            return json.loads(content)
+
+
+@contextmanager
+def _atomic_file(file_path: str):
+    """Бинарный временный файл в том же каталоге; при успехе — fsync и rename поверх file_path"""
+    import tempfile
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _record_text(record: dict) -> bytes:
+    """Запись массива так, как её выводит json.dump(indent=2), без отступа первой строки"""
+    return json.dumps(record, indent=2, ensure_ascii=False).replace("\n", "\n  ").encode("utf-8")
+
+
+def _save_records(file_path: str, records: list):
+    """
+    Атомарная запись массива записей тем же текстом, что json.dump(indent=2),
+    с байтовыми смещениями записей для индекса: запись начинается строкой
+    "  {" и заканчивается строкой "  }" — у вложенных объектов отступ
+    больше, а переводы строк внутри строк экранированы.
+    Возвращает [(запись, смещение, длина)] и stat нового файла.
+    """
+    entries = []
+    with metrics.timer("storage_json_seconds", op="save", file=os.path.basename(file_path)):
+        data = json.dumps(records, indent=2, ensure_ascii=False).encode("utf-8")
+        pos = 0
+        for record in records:
+            start = data.index(b"\n  {", pos) + 3
+            end = start + 2 if data.startswith(b"{}", start) else data.index(b"\n  }", start) + 4
+            entries.append((record, start, end - start))
+            pos = end
+        with _atomic_file(file_path) as f:
+            f.write(data)
+    return entries, os.stat(file_path)
+
+
+def _last_token(fd: int, end: int):
+    """Позиция и байт последнего непробельного символа до end; (-1, b"") — его нет"""
+    while end > 0:
+        start = max(0, end - 4096)
+        block = os.pread(fd, end - start, start).rstrip(b" \t\r\n")
+        if block:
+            return start + len(block) - 1, block[-1:]
+        end = start
+    return -1, b""
+
+
+def _append_records(file_path: str, records: list):
+    """
+    Дописывает записи в JSON-массив без разбора файла: байты до закрывающей
+    скобки копируются во временный файл, за ними — записи в формате
+    _save_records; замена атомарная, смещения прежних записей не меняются.
+    Возвращает [(запись, смещение, длина)] и stat нового файла.
+    """
+    entries = []
+    with metrics.timer("storage_json_seconds", op="append", file=os.path.basename(file_path)):
+        with _atomic_file(file_path) as f:
+            separator = b"[\n  "
+            if os.path.exists(file_path):
+                with open(file_path, "rb") as src:
+                    close, token = _last_token(src.fileno(), os.fstat(src.fileno()).st_size)
+                    if token:
+                        last, before = _last_token(src.fileno(), close)
+                        if token != b"]" or not before:
+                            raise ValueError(f"Файл {file_path} — не JSON-массив записей")
+                        separator = b"\n  " if before == b"[" else b",\n  "
+                        remaining = last + 1
+                        while remaining:
+                            block = src.read(min(remaining, 1 << 20))
+                            if not block:
+                                raise ValueError(f"Файл {file_path} изменён во время дозаписи")
+                            f.write(block)
+                            remaining -= len(block)
+            for record in records:
+                text = _record_text(record)
+                f.write(separator)
+                entries.append((record, f.tell(), len(text)))
+                f.write(text)
+                separator = b",\n  "
+            f.write(b"\n]")
+    return entries, os.stat(file_path)
+
+
+@contextmanager
+def _file_lock(file_path: str):
+    """Эксклюзивная advisory-блокировка (fcntl) на время цикла чтение-изменение-запись"""
+    with open(file_path + ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class StorageBackend(ABC):
+    """
+    Хранилище пользователей и портфелей.
+    Пользователь — словарь с ключами user_id, username, hashed_password,
+    salt, registration_date; портфель — {"user_id": ..., "wallets": {...},
+    "version": ...}. Версия растёт на единицу при каждом сохранении.
+
+    Портфели — материализованное представление журнала операций
+    (infra.ledger): изменения балансов передаются в save_portfolios()
+    записями журнала и проводятся в той же критической секции.
+    """
+
+    ledger = None
+
+    @abstractmethod
+    def get_user_by_username(self, username: str):
+        pass
+
+    @abstractmethod
+    def get_user_by_id(self, user_id: int):
+        pass
+
+    @abstractmethod
+    def next_user_id(self) -> int:
+        pass
+
+    def add_user(self, record: dict):
+        """Добавляет пользователя вместе с пустым портфелем"""
+        self.add_users([record])
+
+    @abstractmethod
+    def add_users(self, records: list):
+        """
+        Добавляет пользователей с пустыми портфелями одной записью: либо
+        всех, либо никого. Занятое имя — ValueError, занятый user_id —
+        ConcurrentModificationError (его выдали параллельной регистрации).
+        """
+        pass
+
+    @abstractmethod
+    def update_password(self, user_id: int, hashed_password: str, salt: str):
+        """Новый хеш пароля пользователя (смена пароля или параметров KDF)"""
+        pass
+
+    @abstractmethod
+    def load_users(self) -> list:
+        pass
+
+    @abstractmethod
+    def get_portfolio(self, user_id: int):
+        pass
+
+    def get_portfolios(self, user_ids) -> list:
+        """Портфели нескольких пользователей одним чтением"""
+        wanted = set(user_ids)
+        return [p for p in self.load_portfolios() if p["user_id"] in wanted]
+
+    def save_portfolio(self, user_id: int, wallets: dict, expected_version: int = None,
+                       entries: list = None) -> int:
+        """
+        Сохраняет кошельки и возвращает новую версию портфеля.
+        Если expected_version задана и не совпадает с текущей —
+        ConcurrentModificationError (запись по устаревшим данным).
+        """
+        return self.save_portfolios([(user_id, wallets, expected_version)], entries)[0]
+
+    @abstractmethod
+    def save_portfolios(self, items: list, entries: list = None) -> list:
+        """
+        Групповая запись [(user_id, wallets, expected_version), ...] одной
+        операцией: либо сохраняются все портфели, либо ни один.
+        entries — записи журнала операций, которые приводят к этим кошелькам
+        ({"user_id", "type", "legs", ...}); они проводятся вместе с портфелями.
+        Возвращает новые версии в том же порядке.
+        """
+        pass
+
+    @abstractmethod
+    def ledger_position(self) -> tuple:
+        """Позиция журнала операций, до которой материализованы портфели"""
+        pass
+
+    def recover_ledger(self):
+        """
+        Доводит до портфелей записи журнала, проведённые процессом, который
+        упал до сохранения портфелей, и при первом запуске создаёт нулевую
+        контрольную точку. В остальных случаях — одна проверка позиций.
+        """
+        if self.ledger.end() != self.ledger_position() or not self.ledger.checkpoints():
+            self.save_portfolios([])
+
+    @abstractmethod
+    def load_portfolios(self) -> list:
+        pass
+
+
+class JsonStorageBackend(StorageBackend):
+    """
+    Прежний формат: users.json и portfolios.json. Поиск пользователя
+    и портфеля идёт по хеш-индексам рядом с файлами (users.json.idx,
+    portfolios.json.idx), регистрация дописывает запись в конец массива;
+    сохранение портфелей переписывает файл целиком и индекс по нему.
+    """
+
+    def __init__(self, data_dir: str):
+        # индексы и журнал операций (hashlib, tempfile) — только когда хранилище создаётся, а не при импорте CLI
+        from .ledger import Ledger
+        from .record_index import RecordIndex
+        self.users_file = os.path.join(data_dir, "users.json")
+        self.portfolios_file = os.path.join(data_dir, "portfolios.json")
+        self.users = RecordIndex(self.users_file, ("username", "user_id"),
+                                 lambda: _file_lock(self.users_file))
+        self.portfolios = RecordIndex(self.portfolios_file, ("user_id",),
+                                      lambda: _file_lock(self.portfolios_file))
+        self.ledger = Ledger(os.path.join(data_dir, "ledger"))
+
+    def get_user_by_username(self, username):
+        return self.users.get("username", username)
+
+    def get_user_by_id(self, user_id):
+        return self.users.get("user_id", user_id)
+
+    def next_user_id(self):
+        return self.users.max_id() + 1
+
+    def add_users(self, records):
+        with _file_lock(self.users_file):
+            names, ids = set(), set()
+            for record in records:
+                if record["username"] in names or self.users.get("username", record["username"], locked=True):
+                    raise ValueError(f"Имя пользователя '{record['username']}' уже занято")
+                if record["user_id"] in ids or self.users.get("user_id", record["user_id"], locked=True):
+                    raise ConcurrentModificationError(f"user_id {record['user_id']} уже занят")
+                names.add(record["username"])
+                ids.add(record["user_id"])
+            # сначала портфели: регистрация, прерванная между записями, оставляет только
+            # пустой портфель без пользователя — его занимает следующая с тем же user_id
+            with _file_lock(self.portfolios_file):
+                self.portfolios.ensure()
+                portfolios = [{"user_id": r["user_id"], "wallets": {}, "version": 0} for r in records
+                              if self.portfolios.get("user_id", r["user_id"], locked=True) is None]
+                if portfolios:
+                    self.portfolios.appended(*_append_records(self.portfolios_file, portfolios))
+            self.users.appended(*_append_records(self.users_file, records))
+
+    def update_password(self, user_id, hashed_password, salt):
+        # редкая операция (раз на пользователя при смене параметров KDF) — файл переписывается целиком
+        with _file_lock(self.users_file):
+            users = _load_json(self.users_file)
+            for record in users:
+                if record["user_id"] == user_id:
+                    record.update(hashed_password=hashed_password, salt=salt)
+            self.users.rebuilt(*_save_records(self.users_file, users))
+
+    def load_users(self):
+        return _load_json(self.users_file)
+
+    def get_portfolio(self, user_id):
+        return self.portfolios.get("user_id", user_id)
+
+    def save_portfolios(self, items, entries=None):
+        with _file_lock(self.portfolios_file):
+            portfolios = _load_json(self.portfolios_file)
+            by_id = {p["user_id"]: p for p in portfolios}
+            from .ledger import apply_entries
+            # записи журнала, проведённые без сохранения портфелей (процесс упал между ними)
+            recovered = apply_entries(by_id, list(self.ledger.read(self.ledger_position())))
+            self.ledger.ensure_genesis(lambda: portfolios)
+            # сначала проверяем все версии, затем пишем — всё или ничего
+            for user_id, _, expected_version in items:
+                current = by_id.get(user_id, {}).get("version", 0)
+                if expected_version is not None and current != expected_version:
+                    raise ConcurrentModificationError(
+                        f"Портфель {user_id} изменён другим процессом (версия {current}, ожидалась {expected_version})"
+                    )
+            if not items and not recovered:
+                return []
+            versions = []
+            for user_id, wallets, _ in items:
+                record = by_id.get(user_id)
+                if record is None:
+                    record = by_id[user_id] = {"user_id": user_id, "wallets": {}, "version": 0}
+                    portfolios.append(record)
+                record["wallets"] = wallets
+                record["version"] = record.get("version", 0) + 1
+                versions.append(record["version"])
+            start = self.ledger.end()
+            end = self.ledger.append(entries or [], {uid: by_id[uid]["version"] for uid, _, _ in items})
+            try:
+                self.portfolios.rebuilt(*_save_records(self.portfolios_file, portfolios))
+            except BaseException:
+                self.ledger.truncate(start)
+                raise
+            self.ledger.save_view_position(end)
+        self.ledger.maybe_checkpoint(end)
+        return versions
+
+    def ledger_position(self):
+        return self.ledger.load_view_position()
+
+    def load_portfolios(self):
+        return _load_json(self.portfolios_file)
+
 
 class DatabaseManager:
     _instance = None
 
-    def __new__(cls, path="data"):
+    def __new__(cls, path=None, engine=None):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
-            cls._instance.path = path
+            cls._instance.path = path or DATA_DIR
+            cls._instance.backend = cls._instance._create_backend(engine)
         return cls._instance
 
+    def _create_backend(self, engine=None) -> StorageBackend:
+        settings = SettingsLoader()
+        engine = engine or settings.get("storage_backend", "sqlite")
+        if engine == "sqlite":
+            # sqlite3 импортируется только для этого движка
+            from .sqlite_backend import SqliteStorageBackend
+            db_path = os.path.join(self.path, settings.get("sqlite_file", "valutatrade.db"))
+            return SqliteStorageBackend(db_path, json_dir=self.path)
+        if engine == "json":
+            return JsonStorageBackend(self.path)
+        raise ValueError(f"Неизвестный storage_backend: {engine}")
+
     def read_json(self, filename):
         full_path = os.path.join(self.path, filename)
         if not os.path.exists(full_path):
@@ -21,4 +361,4 @@ class DatabaseManager:
     def write_json(self, filename, data):
         full_path = os.path.join(self.path, filename)
         with open(full_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
\ No newline at end of file
+            json.dump(data, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,171 @@
+import fcntl
+import glob
+import json
+import os
+
+from ..core.exceptions import ConcurrentModificationError
+
+JOURNAL_PREFIX = "portfolios."
+JOURNAL_SUFFIX = ".journal"
+
+
+class PortfolioJournal:
+    """
+    Журнал упреждающей записи (WAL) для отложенной записи портфелей.
+
+    Каждый процесс пишет в свой файл portfolios.<pid>.journal и держит
+    на нём эксклюзивный flock, пока журнал открыт. Запись — строка JSON
+    {"user_id", "wallets", "version", "entries"} с состоянием портфеля
+    после сделки, версией в хранилище, от которой оно получено, и записями
+    журнала операций этой сделки. append() возвращает
+    управление после fsync; с sync=False вызывающий сам делает sync()
+    для группы записей перед тем, как подтвердить их.
+    """
+
+    def __init__(self, data_dir: str):
+        self.path = os.path.join(data_dir, f"{JOURNAL_PREFIX}{os.getpid()}{JOURNAL_SUFFIX}")
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+    def append(self, records: list, sync: bool = True):
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+        os.write(self._fd, data)
+        if sync:
+            os.fsync(self._fd)
+
+    def sync(self):
+        os.fsync(self._fd)
+
+    def truncate(self):
+        """Всё из журнала уже в хранилище"""
+        os.ftruncate(self._fd, 0)
+        os.fsync(self._fd)
+
+    def close(self):
+        if self._fd is None:
+            return
+        os.unlink(self.path)
+        os.close(self._fd)
+        self._fd = None
+
+    def release(self):
+        """Закрывает журнал, оставляя файл: несохранённые сделки доиграет recover_journals"""
+        if self._fd is None:
+            return
+        os.fsync(self._fd)
+        os.close(self._fd)
+        self._fd = None
+
+
+def _read_records(fd) -> list:
+    with os.fdopen(os.dup(fd), "r", encoding="utf-8") as f:
+        f.seek(0)
+        records = []
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # оборванная последняя строка: fsync не завершился, сделка не подтверждена
+                break
+        return records
+
+
+def _pid_alive(path: str) -> bool:
+    pid = os.path.basename(path)[len(JOURNAL_PREFIX):-len(JOURNAL_SUFFIX)]
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def recover_journals(data_dir: str, backend) -> int:
+    """
+    Доигрывает журналы процессов, завершившихся без commit().
+    Журнал живого процесса заблокирован и пропускается. Если версия
+    портфеля в хранилище всё ещё та, от которой вёлся журнал, портфель
+    восстанавливается из журнала как есть. Если портфель с тех пор
+    сохраняли, непроведённые записи журнала операций (их id ещё нет
+    в журнале операций) переносятся на сохранённые кошельки с проверкой
+    средств, как при сбросе (usecases.commit). Записи, которым средств
+    не хватило, попадают в журнал действий как TRADE_REVERTED.
+    Возвращает число восстановленных портфелей.
+    """
+    restored = 0
+    for path in sorted(glob.glob(os.path.join(data_dir, f"{JOURNAL_PREFIX}*{JOURNAL_SUFFIX}"))):
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except FileNotFoundError:
+            continue
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            records = _read_records(fd)
+            # пустой журнал мог быть только что создан, но ещё не заблокирован владельцем
+            if not records and _pid_alive(path):
+                continue
+
+            latest, operations = {}, {}
+            for record in records:
+                latest[record["user_id"]] = record
+                # операции всех сделок, накопленных от одной версии в хранилище
+                key = (record["user_id"], record["version"])
+                operations.setdefault(key, []).extend(record.get("entries", ()))
+            stored = {p["user_id"]: p for p in backend.get_portfolios(sorted(latest))} if latest else {}
+            items, entries, rejected = [], [], []
+            for user_id, record in sorted(latest.items()):
+                pending = operations[(user_id, record["version"])]
+                current = stored.get(user_id, {})
+                if current.get("version", 0) == record["version"]:
+                    items.append((user_id, record["wallets"], record["version"]))
+                    entries.extend(pending)
+                    continue
+                wallets, applied, reverted = _rebase(backend, user_id, current, record["version"], pending)
+                rejected.extend(reverted)
+                if applied:
+                    items.append((user_id, wallets, current.get("version", 0)))
+                    entries.extend(applied)
+            if items:
+                try:
+                    backend.save_portfolios(items, entries)
+                except ConcurrentModificationError:
+                    # портфель меняют прямо сейчас — журнал остаётся до следующего запуска
+                    continue
+                restored += len(items)
+            for entry in rejected:
+                _log_reverted(entry)
+            os.unlink(path)
+        finally:
+            os.close(fd)
+    return restored
+
+
+def _rebase(backend, user_id: int, current: dict, base_version: int, pending: list) -> tuple:
+    """
+    Записи журнала, сделанные от версии base_version, поверх сохранённого
+    портфеля current. Записи, уже проведённые в журнале операций (процесс
+    упал между сохранением портфелей и очисткой журнала), пропускаются.
+    Возвращает (кошельки, проведённые записи, отклонённые записи).
+    """
+    from ..core.currencies import record_units, units_record
+    from .ledger import rebase_entries
+    # записи без id (журналы прежних версий) отличить от проведённых нельзя — считаем проведёнными
+    posted = {e.get("id") for e in backend.ledger.entries(user_id) if e.get("version", 0) > base_version}
+    pending = [e for e in pending if e.get("id") and e["id"] not in posted]
+    units = {code: record_units(code, info) for code, info in current.get("wallets", {}).items()}
+    applied, rejected = rebase_entries(units, pending)
+    return {code: units_record(code, n) for code, n in units.items()}, applied, rejected
+
+
+def _log_reverted(entry: dict):
+    from ..core.logging_config import get_logger, log_event
+    get_logger("journal").error(
+        f"Journaled {entry.get('type')} of user {entry['user_id']} reverted on recovery: "
+        f"insufficient funds after a concurrent change {entry['legs']}")
+    log_event({"action": "TRADE_REVERTED", "user_id": entry["user_id"], "type": entry.get("type"),
+               "legs": entry["legs"], "result": "ERROR", "error_type": "InsufficientFundsError",
+               "error": "Недостаточно средств после изменений портфеля другим процессом"})
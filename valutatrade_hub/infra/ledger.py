@@ -0,0 +1,338 @@
+import fcntl
+import json
+import os
+import tempfile
+from collections import deque
+from datetime import datetime, timezone
+
+from .settings import SettingsLoader
+from ..core.currencies import record_units, units_record
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".jsonl"
+CHECKPOINT_INDEX = "checkpoints.jsonl"
+VIEW_FILE = "view.json"
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _timestamp(value) -> float:
+    """ISO-строка или datetime -> unix timestamp (наивное время считается UTC)"""
+    dt = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _repair_tail(fd):
+    """Обрезает оборванную последнюю строку (запись, упавшая до fsync)"""
+    size = os.fstat(fd).st_size
+    if size == 0 or os.pread(fd, 1, size - 1) == b"\n":
+        return
+    pos = size
+    while pos > 0:
+        start = max(0, pos - 4096)
+        idx = os.pread(fd, pos - start, start).rfind(b"\n")
+        if idx != -1:
+            os.ftruncate(fd, start + idx + 1)
+            return
+        pos = start
+    os.ftruncate(fd, 0)
+
+
+def _write_atomic(path: str, data, sync: bool = True):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _user_needle(user_id: int) -> str:
+    # ключ user_id в записи никогда не последний (см. Ledger.append)
+    return f'"user_id": {user_id},'
+
+
+def apply_entries(portfolios: dict, entries) -> set:
+    """
+    Проводит записи журнала по портфелям хранилища {user_id: record}:
+    только записи с версией новее версии портфеля (ещё не материализованные).
+    Возвращает user_id изменённых портфелей.
+    """
+    changed = set()
+    for entry in entries:
+        record = portfolios.get(entry["user_id"])
+        if record is None or entry["version"] <= record.get("version", 0):
+            continue
+        wallets = record.setdefault("wallets", {})
+        for code, delta in entry["legs"].items():
+            units = record_units(code, wallets[code]) if code in wallets else 0
+            wallets[code] = units_record(code, units + delta)
+        changed.add(entry["user_id"])
+    # версию ставим после всех записей: у записей одного сохранения она общая
+    for entry in entries:
+        record = portfolios.get(entry["user_id"])
+        if entry["user_id"] in changed and entry["version"] > record.get("version", 0):
+            record["version"] = entry["version"]
+    return changed
+
+
+def rebase_entries(units: dict, entries) -> tuple:
+    """
+    Проводит записи поверх балансов units ({код: минимальные единицы},
+    изменяется на месте) с той же проверкой средств, что Wallet.withdraw:
+    запись, после которой списываемый баланс ушёл бы в минус, отклоняется
+    целиком. Возвращает (проведённые записи, отклонённые записи).
+    """
+    applied, rejected = [], []
+    for entry in entries:
+        legs = entry["legs"]
+        if any(delta < 0 and units.get(code, 0) + delta < 0 for code, delta in legs.items()):
+            rejected.append(entry)
+            continue
+        for code, delta in legs.items():
+            units[code] = units.get(code, 0) + delta
+        applied.append(entry)
+    return applied, rejected
+
+
+class Ledger:
+    """
+    Журнал операций: append-only JSON Lines в data/ledger/segment-*.jsonl.
+
+    Запись — {"user_id", "type" (deposit/withdraw/buy/sell),
+    "legs": {"BTC": +units, "USD": -units}, "price", "ts", "version"}:
+    изменения балансов в минимальных единицах, время проводки и версия
+    портфеля, в которой они материализованы. Позиция в журнале — (номер сегмента, смещение).
+
+    Портфели в хранилище — материализованное представление журнала:
+    хранилище дописывает записи в той же критической секции, что и
+    сохраняет портфели, и запоминает позицию, до которой представление
+    актуально. Контрольные точки (полные балансы на позицию журнала)
+    строятся инкрементально — прошлая точка плюс хвост журнала, — поэтому
+    баланс на момент времени не требует проигрывать всю историю.
+    """
+
+    def __init__(self, ledger_dir: str):
+        settings = SettingsLoader()
+        self.dir = ledger_dir
+        self.segment_max_bytes = settings.get("ledger_segment_max_bytes", 64 * 2 ** 20)
+        self.checkpoint_bytes = settings.get("ledger_checkpoint_bytes", 4 * 2 ** 20)
+        self._has_genesis = False
+
+    # ===== Сегменты =====
+    def segment_path(self, number: int) -> str:
+        return os.path.join(self.dir, f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}")
+
+    def segments(self) -> list:
+        if not os.path.isdir(self.dir):
+            return []
+        return sorted(
+            int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.dir)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def end(self) -> tuple:
+        """Позиция конца журнала"""
+        segments = self.segments()
+        if not segments:
+            return (1, 0)
+        return (segments[-1], os.path.getsize(self.segment_path(segments[-1])))
+
+    def append(self, entries: list, versions: dict) -> tuple:
+        """
+        Проводит записи: ставит время проводки и версию портфеля (versions —
+        {user_id: новая версия}), дописывает одним write + fsync и возвращает
+        новый конец журнала. Вызывается хранилищем под его блокировкой
+        записи — писатель один, время проводки в журнале не убывает.
+        """
+        number, size = self.end()
+        if not entries:
+            return (number, size)
+        ts = now_iso()
+        for entry in entries:
+            entry["ts"] = ts
+            entry["version"] = versions[entry["user_id"]]
+        os.makedirs(self.dir, exist_ok=True)
+        payload = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries).encode("utf-8")
+        if size and size + len(payload) > self.segment_max_bytes:
+            number += 1
+        fd = os.open(self.segment_path(number), os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            _repair_tail(fd)
+            view = memoryview(payload)
+            while view:
+                view = view[os.write(fd, view):]
+            os.fsync(fd)
+            return (number, os.fstat(fd).st_size)
+        finally:
+            os.close(fd)
+
+    def truncate(self, position: tuple):
+        """Откат append(): всё после position удаляется (сохранение портфелей не удалось)"""
+        for number in self.segments():
+            if number > position[0]:
+                os.remove(self.segment_path(number))
+            elif number == position[0]:
+                os.truncate(self.segment_path(number), position[1])
+
+    def read(self, start: tuple = (1, 0), stop: tuple = None):
+        """Записи с позиции start (включительно) до stop (не включая)"""
+        for number in self.segments():
+            if number < start[0] or (stop and number > stop[0]):
+                continue
+            pos = start[1] if number == start[0] else 0
+            with open(self.segment_path(number), "rb") as f:
+                f.seek(pos)
+                for line in f:
+                    if stop and (number, pos) >= tuple(stop):
+                        return
+                    if not line.endswith(b"\n"):
+                        break  # оборванная запись
+                    pos += len(line)
+                    yield json.loads(line)
+
+    # ===== Позиция представления (для файлового хранилища) =====
+    def load_view_position(self) -> tuple:
+        """
+        До какой позиции журнал материализован в portfolios.json. Позиция —
+        только подсказка, с какого места искать непроведённые записи:
+        проведение идемпотентно по версиям, поэтому без файла (или после
+        сбоя на его записи) журнал просматривается с начала.
+        """
+        try:
+            with open(os.path.join(self.dir, VIEW_FILE), "r", encoding="utf-8") as f:
+                return tuple(json.load(f)["position"])
+        except (FileNotFoundError, ValueError, KeyError):
+            return (1, 0)
+
+    def save_view_position(self, position: tuple):
+        _write_atomic(os.path.join(self.dir, VIEW_FILE), {"position": list(position)}, sync=False)
+
+    # ===== Контрольные точки =====
+    def checkpoints(self) -> list:
+        """[{"file", "position", "ts"}, ...] в порядке создания"""
+        try:
+            with open(os.path.join(self.dir, CHECKPOINT_INDEX), "r", encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.endswith("\n")]
+        except FileNotFoundError:
+            return []
+
+    def write_checkpoint(self, position: tuple, ts: str, balances: dict):
+        os.makedirs(self.dir, exist_ok=True)
+        name = f"checkpoint-{position[0]:06d}-{position[1]:012d}.json"
+        _write_atomic(os.path.join(self.dir, name), {
+            "position": list(position), "ts": ts,
+            "balances": {str(uid): wallets for uid, wallets in balances.items()},
+        })
+        line = json.dumps({"file": name, "position": list(position), "ts": ts}) + "\n"
+        with open(os.path.join(self.dir, CHECKPOINT_INDEX), "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load_checkpoint(self, checkpoint: dict) -> dict:
+        """Балансы контрольной точки: {user_id: {code: units}}"""
+        with open(os.path.join(self.dir, checkpoint["file"]), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return {int(uid): wallets for uid, wallets in data["balances"].items()}
+
+    def ensure_genesis(self, load_portfolios):
+        """
+        Нулевая контрольная точка — балансы портфелей на момент включения
+        журнала (load_portfolios() вызывается, только если точки ещё нет).
+        Вызывается хранилищем под блокировкой записи.
+        """
+        if self._has_genesis or self.checkpoints():
+            self._has_genesis = True
+            return
+        balances = {
+            p["user_id"]: {code: record_units(code, info) for code, info in p.get("wallets", {}).items()}
+            for p in load_portfolios()
+        }
+        self.write_checkpoint(self.end(), now_iso(), balances)
+        self._has_genesis = True
+
+    def maybe_checkpoint(self, end: tuple):
+        """
+        Новая контрольная точка на позиции end (конец проведённых записей),
+        если хвост журнала после прошлой точки вырос до ledger_checkpoint_bytes
+        или начался новый сегмент. Строится из прошлой точки и хвоста,
+        вне блокировки хранилища; параллельно точку строит один процесс.
+        """
+        checkpoints = self.checkpoints()
+        if not checkpoints:
+            return
+        last = tuple(checkpoints[-1]["position"])
+        if tuple(end) <= last or (end[0] == last[0] and end[1] - last[1] < self.checkpoint_bytes):
+            return
+        with open(os.path.join(self.dir, "checkpoint.lock"), "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return  # точку уже строит другой процесс
+            checkpoints = self.checkpoints()
+            if tuple(checkpoints[-1]["position"]) != last:
+                return
+            balances = self.load_checkpoint(checkpoints[-1])
+            ts = checkpoints[-1]["ts"]
+            for entry in self.read(last, end):
+                wallets = balances.setdefault(entry["user_id"], {})
+                for code, delta in entry["legs"].items():
+                    wallets[code] = wallets.get(code, 0) + delta
+                ts = entry["ts"]
+            self.write_checkpoint(end, ts, balances)
+
+    # ===== Запросы =====
+    def balances_at(self, when, user_id: int = None) -> dict:
+        """
+        Балансы на момент when: ближайшая контрольная точка не позже when
+        плюс записи журнала до следующей точки. {user_id: {code: units}}
+        либо {code: units} для одного пользователя.
+        """
+        moment = _timestamp(when)
+        checkpoints = self.checkpoints()
+        index = None
+        for i, checkpoint in enumerate(checkpoints):
+            if _timestamp(checkpoint["ts"]) <= moment:
+                index = i
+        if index is None:
+            since = checkpoints[0]["ts"] if checkpoints else "—"
+            raise ValueError(f"Журнал операций ведётся с {since}: более ранних балансов нет")
+        balances = self.load_checkpoint(checkpoints[index])
+        if user_id is not None:
+            balances = {user_id: balances.get(user_id, {})}
+        # записи между точками упорядочены по времени проводки: хвост до следующей точки
+        stop = tuple(checkpoints[index + 1]["position"]) if index + 1 < len(checkpoints) else None
+        for entry in self.read(tuple(checkpoints[index]["position"]), stop):
+            if user_id is not None and entry["user_id"] != user_id:
+                continue
+            if _timestamp(entry["ts"]) > moment:
+                break
+            wallets = balances.setdefault(entry["user_id"], {})
+            for code, delta in entry["legs"].items():
+                wallets[code] = wallets.get(code, 0) + delta
+        return balances[user_id] if user_id is not None else balances
+
+    def entries(self, user_id: int = None, last: int = None) -> list:
+        """Записи журнала (всего или одного пользователя); last — только последние N"""
+        needle = _user_needle(user_id) if user_id is not None else None
+        result = deque(maxlen=last)
+        for number in self.segments():
+            with open(self.segment_path(number), "r", encoding="utf-8") as f:
+                for line in f:
+                    # быстрый отсев по подстроке до разбора JSON
+                    if needle and needle not in line:
+                        continue
+                    if line.endswith("\n"):
+                        result.append(json.loads(line))
+        return list(result)
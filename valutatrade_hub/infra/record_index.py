@@ -0,0 +1,279 @@
+"""
+Постоянный хеш-индекс записей JSON-массива (users.json, portfolios.json):
+значение поля (username, user_id) -> смещение и длина записи в файле.
+
+Индекс лежит рядом с файлом (<файл>.idx): заголовок и таблица с открытой
+адресацией фиксированного размера. Поиск — хеш ключа, несколько pread
+по таблице и один pread записи из самого файла, без разбора массива.
+Заголовок хранит inode, mtime и размер файла, по которому построен
+индекс: файл, заменённый в обход индекса, обнаруживается сразу, и индекс
+перестраивается одним проходом. Найденная запись сверяется с ключом,
+поэтому ни коллизия хешей, ни гонка с писателем не дают чужую запись.
+"""
+import hashlib
+import json
+import os
+import re
+import struct
+import tempfile
+
+MAGIC = b"VTIDX001"
+# magic, inode, mtime_ns и размер файла, ёмкость таблицы, число ключей, наибольший user_id
+HEADER = struct.Struct("<8sQqQQQq")
+# хеш ключа (0 — пустой слот), смещение и длина записи в файле
+SLOT = struct.Struct("<QQI")
+MIN_CAPACITY = 64
+ID_FIELD = "user_id"
+
+_WS = re.compile(r"[ \t\r\n]*")
+_STALE = object()
+
+
+def _hash(field: str, value) -> int:
+    """64-битный хеш ключа, одинаковый во всех процессах (0 зарезервирован под пустой слот)"""
+    if type(value) is int:
+        # мультипликативный хеш: младшие биты перемешаны, подряд идущие user_id не сталкиваются
+        return (value * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF or 1
+    key = f"{field}={value!r}".encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+
+def _capacity(keys: int) -> int:
+    """Степень двойки с заполнением таблицы не больше половины"""
+    capacity = MIN_CAPACITY
+    while capacity < keys * 2:
+        capacity *= 2
+    return capacity
+
+
+def _place(table: bytearray, capacity: int, key: int, offset: int, length: int):
+    slot = key & (capacity - 1)
+    while SLOT.unpack_from(table, slot * SLOT.size)[0]:
+        slot = (slot + 1) & (capacity - 1)
+    SLOT.pack_into(table, slot * SLOT.size, key, offset, length)
+
+
+def scan_records(data: bytes, fields: tuple):
+    """
+    Записи JSON-массива data: ({поле: значение}, смещение, длина) в байтах.
+    Массив разбирается как latin-1, чтобы позиции символов совпадали
+    с байтовыми; не-ASCII значения ключей перечитываются из байтов записи.
+    """
+    text = data.decode("latin-1")
+    decoder = json.JSONDecoder()
+    pos = _WS.match(text).end()
+    if pos == len(text):
+        return
+    if text[pos] != "[":
+        raise ValueError("Ожидался JSON-массив записей")
+    pos = _WS.match(text, pos + 1).end()
+    while not text.startswith("]", pos):
+        record, end = decoder.raw_decode(text, pos)
+        keys = {f: record.get(f) for f in fields}
+        if any(isinstance(v, str) and not v.isascii() for v in keys.values()):
+            record = json.loads(data[pos:end])
+            keys = {f: record.get(f) for f in fields}
+        yield keys, pos, end - pos
+        pos = _WS.match(text, end).end()
+        if text.startswith(",", pos):
+            pos = _WS.match(text, pos + 1).end()
+        elif not text.startswith("]", pos):
+            raise ValueError(f"Некорректный JSON-массив: позиция {pos}")
+
+
+class RecordIndex:
+    """
+    Индекс файла source по полям fields. Читатели работают без блокировок;
+    устаревший индекс перестраивается под lock — блокировкой писателей
+    файла (контекстный менеджер). Писатель, держащий lock, передаёт
+    locked=True и после записи файла сообщает индексу о новых смещениях:
+    appended() для дозаписи в конец, rebuilt() для полной перезаписи.
+    """
+
+    def __init__(self, source: str, fields: tuple, lock):
+        self.source = source
+        self.path = source + ".idx"
+        self.fields = fields
+        self.lock = lock
+
+    # ===== Чтение =====
+    def get(self, field: str, value, locked: bool = False):
+        """Запись с record[field] == value или None"""
+        return self._read(lambda: self._probe(field, value), locked)
+
+    def max_id(self, locked: bool = False) -> int:
+        """Наибольший user_id в файле, 0 — записей нет"""
+        return self._read(self._max_id, locked)
+
+    def _read(self, read, locked):
+        result = read()
+        if result is _STALE:
+            if locked:
+                self.ensure()
+                result = read()
+            else:
+                with self.lock():
+                    self.ensure()
+                    result = read()
+        if result is _STALE:
+            raise OSError(f"Индекс {self.path} не соответствует {self.source}")
+        return result
+
+    def _header(self, idx_fd, st):
+        """Заголовок индекса, если он построен по файлу с этим stat, иначе None"""
+        data = os.pread(idx_fd, HEADER.size, 0)
+        if len(data) != HEADER.size:
+            return None
+        header = HEADER.unpack(data)
+        if header[:4] != (MAGIC, st.st_ino, st.st_mtime_ns, st.st_size):
+            return None
+        return header
+
+    def _open(self):
+        """(fd файла, fd индекса); None — файла нет, _STALE — нет индекса"""
+        try:
+            src = os.open(self.source, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        try:
+            return src, os.open(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            os.close(src)
+            return _STALE
+
+    def _probe(self, field, value):
+        fds = self._open()
+        if fds is None or fds is _STALE:
+            return fds
+        src, idx = fds
+        try:
+            st = os.fstat(src)
+            header = self._header(idx, st)
+            if header is None:
+                return _STALE
+            capacity = header[4]
+            key = _hash(field, value)
+            slot = key & (capacity - 1)
+            for _ in range(capacity):
+                found, offset, length = SLOT.unpack(os.pread(idx, SLOT.size, HEADER.size + slot * SLOT.size))
+                if not found:
+                    return None
+                if found == key and offset + length <= st.st_size:
+                    record = json.loads(os.pread(src, length, offset))
+                    if record.get(field) == value:
+                        return record
+                slot = (slot + 1) & (capacity - 1)
+            return None
+        except (struct.error, ValueError, AttributeError):
+            return _STALE  # индекс или файл меняются параллельно — перечитаем под блокировкой
+        finally:
+            os.close(src)
+            os.close(idx)
+
+    def _max_id(self):
+        fds = self._open()
+        if fds is None or fds is _STALE:
+            return 0 if fds is None else fds
+        src, idx = fds
+        try:
+            header = self._header(idx, os.fstat(src))
+            return _STALE if header is None else header[6]
+        finally:
+            os.close(src)
+            os.close(idx)
+
+    # ===== Запись (под блокировкой писателей файла) =====
+    def ensure(self):
+        """Перестраивает индекс, если он построен не по текущему файлу"""
+        try:
+            src = os.open(self.source, os.O_RDONLY)
+        except FileNotFoundError:
+            return
+        try:
+            st = os.fstat(src)
+            try:
+                with open(self.path, "rb") as f:
+                    if self._header(f.fileno(), st) is not None:
+                        return
+            except FileNotFoundError:
+                pass
+            with os.fdopen(os.dup(src), "rb") as f:
+                data = f.read()
+        finally:
+            os.close(src)
+        self.rebuilt(scan_records(data, self.fields), st)
+
+    def rebuilt(self, entries, st):
+        """Индекс заново по записям файла: [({поле: значение}, смещение, длина)], stat файла"""
+        entries = entries if isinstance(entries, list) else list(entries)
+        capacity = _capacity(len(entries) * len(self.fields))
+        table = bytearray(capacity * SLOT.size)
+        count = max_id = 0
+        for record, offset, length in entries:
+            for field in self.fields:
+                value = record.get(field)
+                if value is None:
+                    continue
+                _place(table, capacity, _hash(field, value), offset, length)
+                count += 1
+                if field == ID_FIELD and value > max_id:
+                    max_id = value
+        self._write(table, capacity, count, max_id, st)
+
+    def appended(self, entries: list, st):
+        """
+        Записи дописаны в конец файла (смещения прежних не изменились):
+        их ключи добавляются в таблицу на месте. entries — [(запись,
+        смещение, длина)]; индекс должен соответствовать файлу до дозаписи
+        (ensure() под той же блокировкой).
+        """
+        slots = [(_hash(field, value), offset, length)
+                 for record, offset, length in entries for field, value in self._keys(record)]
+        ids = [record[ID_FIELD] for record, _, _ in entries if record.get(ID_FIELD) is not None]
+        if not os.path.exists(self.path):
+            self.ensure()  # первые записи нового файла
+            return
+        with open(self.path, "r+b") as f:
+            fd = f.fileno()
+            _, _, _, _, capacity, count, max_id = HEADER.unpack(os.pread(fd, HEADER.size, 0))
+            max_id = max([max_id, *ids])
+            if (count + len(slots)) * 2 > capacity:
+                self._grow(bytearray(os.pread(fd, capacity * SLOT.size, HEADER.size)), slots, count, max_id, st)
+                return
+            for key, offset, length in slots:
+                slot = key & (capacity - 1)
+                while SLOT.unpack(os.pread(fd, SLOT.size, HEADER.size + slot * SLOT.size))[0]:
+                    slot = (slot + 1) & (capacity - 1)
+                os.pwrite(fd, SLOT.pack(key, offset, length), HEADER.size + slot * SLOT.size)
+            # слоты — на диск раньше заголовка, который объявляет индекс актуальным
+            os.fsync(fd)
+            os.pwrite(fd, HEADER.pack(MAGIC, st.st_ino, st.st_mtime_ns, st.st_size,
+                                      capacity, count + len(slots), max_id), 0)
+
+    def _grow(self, table, slots, count, max_id, st):
+        """Таблица большего размера: хеши прежних слотов переносятся без чтения файла"""
+        capacity = _capacity(count + len(slots))
+        grown = bytearray(capacity * SLOT.size)
+        for slot in SLOT.iter_unpack(table):
+            if slot[0]:
+                _place(grown, capacity, *slot)
+        for slot in slots:
+            _place(grown, capacity, *slot)
+        self._write(grown, capacity, count + len(slots), max_id, st)
+
+    def _keys(self, record) -> list:
+        return [(f, record.get(f)) for f in self.fields if record.get(f) is not None]
+
+    def _write(self, table, capacity, count, max_id, st):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(HEADER.pack(MAGIC, st.st_ino, st.st_mtime_ns, st.st_size, capacity, count, max_id))
+                f.write(table)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
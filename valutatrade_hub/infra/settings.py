@@ -18,8 +18,29 @@ class SettingsLoader:
         else:
             self._data = {
                 "rates_ttl_seconds": 3600,
+                "rates_stale_grace_seconds": None,
+                "rates_refresh_retry_seconds": 60,
                 "default_base": "USD",
-                "log_path": "logs/actions.log"
+                "log_path": "logs/actions.log",
+                "log_max_bytes": 10485760,
+                "log_backup_count": 5,
+                "metrics_path": "logs/metrics.prom",
+                "metrics_enabled": True,
+                "storage_backend": "sqlite",
+                "sqlite_file": "valutatrade.db",
+                "api_flush_interval_seconds": 1.0,
+                "api_token_ttl_seconds": 86400,
+                "session_ttl_seconds": 604800,
+                "registration_max_retries": 10,
+                "password_kdf": "scrypt",
+                "password_scrypt_n": 32768,
+                "password_scrypt_r": 8,
+                "password_scrypt_p": 1,
+                "password_pbkdf2_iterations": 600000,
+                "write_behind_interval_seconds": 5.0,
+                "write_behind_max_dirty": 1000,
+                "ledger_segment_max_bytes": 67108864,
+                "ledger_checkpoint_bytes": 4194304
             }
 
     def get(self, key, default=None):
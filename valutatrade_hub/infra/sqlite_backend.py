@@ -0,0 +1,299 @@
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+
+from .database import JsonStorageBackend, StorageBackend
+from .ledger import Ledger, apply_entries
+from ..core.exceptions import ConcurrentModificationError
+
+
+class SqliteStorageBackend(StorageBackend):
+    """
+    SQLite-хранилище: поиск по user_id и username через индексы,
+    сделка обновляет только строки своих кошельков.
+    При первом запуске один раз переносит данные из JSON-файлов.
+    Позиция материализации журнала операций хранится в meta
+    и обновляется в одной транзакции с кошельками.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL UNIQUE,
+            hashed_password TEXT NOT NULL,
+            salt TEXT NOT NULL,
+            registration_date TEXT,
+            portfolio_version INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS wallets (
+            user_id INTEGER NOT NULL REFERENCES users(user_id),
+            currency_code TEXT NOT NULL,
+            balance REAL NOT NULL,
+            units INTEGER,
+            precision INTEGER,
+            PRIMARY KEY (user_id, currency_code)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    USER_COLUMNS = "user_id, username, hashed_password, salt, registration_date"
+
+    def __init__(self, db_path: str, json_dir: str = None):
+        self.db_path = db_path
+        self.ledger = Ledger(os.path.join(os.path.dirname(db_path), "ledger"))
+        # одно соединение на процесс; потоки (пул serve) обращаются к нему под usecases.state_lock
+        self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(users)")}
+        if "portfolio_version" not in columns:
+            self._conn.execute(
+                "ALTER TABLE users ADD COLUMN portfolio_version INTEGER NOT NULL DEFAULT 0"
+            )
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(wallets)")}
+        if "units" not in columns:
+            self._conn.execute("ALTER TABLE wallets ADD COLUMN units INTEGER")
+        if "precision" not in columns:
+            self._conn.execute("ALTER TABLE wallets ADD COLUMN precision INTEGER")
+        if json_dir:
+            self.migrate_from_json(json_dir)
+
+    @contextmanager
+    def _transaction(self, mode="IMMEDIATE", undo=None):
+        """
+        Транзакция, включая сам COMMIT: если он не прошёл (SQLITE_BUSY,
+        ошибка диска), транзакция откатывается. undo — действия вне базы
+        (откат журнала операций), которые выполняются, когда транзакция
+        не зафиксирована, — до ROLLBACK, пока блокировка записи ещё держится.
+        """
+        self._conn.execute(f"BEGIN {mode}")
+        try:
+            yield
+            self._conn.execute("COMMIT")
+        except BaseException:
+            for action in reversed(undo or ()):
+                action()
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            raise
+
+    def migrate_from_json(self, json_dir: str):
+        """Одноразовый перенос users.json и portfolios.json"""
+        if self._conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_from_json'").fetchone():
+            return
+        source = JsonStorageBackend(json_dir)
+        with self._transaction():
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_from_json'").fetchone():
+                return
+            portfolios = source.load_portfolios()
+            self._conn.executemany(
+                f"INSERT OR IGNORE INTO users ({self.USER_COLUMNS}) VALUES (?, ?, ?, ?, ?)",
+                [(u["user_id"], u["username"], u["hashed_password"], u["salt"],
+                  u.get("registration_date")) for u in source.load_users()],
+            )
+            self._conn.executemany(
+                "UPDATE users SET portfolio_version = ? WHERE user_id = ?",
+                [(p.get("version", 0), p["user_id"]) for p in portfolios],
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO wallets (user_id, currency_code, balance, units, precision) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(p["user_id"], code, w.get("balance", 0.0), w.get("units"), w.get("precision"))
+                 for p in portfolios
+                 for code, w in p.get("wallets", {}).items()],
+            )
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('migrated_from_json', '1')")
+
+    def _user(self, row):
+        return dict(row) if row else None
+
+    @staticmethod
+    def _wallet(row) -> dict:
+        # units нет у строк, записанных до перехода на минимальные единицы
+        if row["units"] is None:
+            return {"balance": row["balance"]}
+        wallet = {"balance": row["balance"], "units": row["units"]}
+        # precision нет у строк, записанных до появления метки точности
+        if row["precision"] is not None:
+            wallet["precision"] = row["precision"]
+        return wallet
+
+    def get_user_by_username(self, username):
+        row = self._conn.execute(
+            f"SELECT {self.USER_COLUMNS} FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        return self._user(row)
+
+    def get_user_by_id(self, user_id):
+        row = self._conn.execute(
+            f"SELECT {self.USER_COLUMNS} FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return self._user(row)
+
+    def next_user_id(self):
+        return self._conn.execute("SELECT COALESCE(MAX(user_id), 0) + 1 FROM users").fetchone()[0]
+
+    def add_users(self, records):
+        try:
+            with self._transaction():
+                self._conn.executemany(
+                    f"INSERT INTO users ({self.USER_COLUMNS}) VALUES (?, ?, ?, ?, ?)",
+                    [(r["user_id"], r["username"], r["hashed_password"], r["salt"], r.get("registration_date"))
+                     for r in records],
+                )
+        except sqlite3.IntegrityError:
+            names = set()
+            for record in records:
+                if record["username"] in names or self.get_user_by_username(record["username"]):
+                    raise ValueError(f"Имя пользователя '{record['username']}' уже занято")
+                names.add(record["username"])
+            raise ConcurrentModificationError("user_id уже занят параллельной регистрацией")
+
+    def update_password(self, user_id, hashed_password, salt):
+        self._conn.execute(
+            "UPDATE users SET hashed_password = ?, salt = ? WHERE user_id = ?", (hashed_password, salt, user_id)
+        )
+
+    def load_users(self):
+        return [dict(row) for row in self._conn.execute(
+            f"SELECT {self.USER_COLUMNS} FROM users ORDER BY user_id"
+        )]
+
+    def get_portfolio(self, user_id):
+        # версия и кошельки читаются в одной транзакции — согласованный снимок
+        with self._transaction("DEFERRED"):
+            row = self._conn.execute(
+                "SELECT portfolio_version FROM users WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT currency_code, balance, units, precision FROM wallets WHERE user_id = ?", (user_id,)
+            ).fetchall()
+        return {
+            "user_id": user_id,
+            "wallets": {r["currency_code"]: self._wallet(r) for r in rows},
+            "version": row["portfolio_version"],
+        }
+
+    def get_portfolios(self, user_ids):
+        with self._transaction("DEFERRED"):
+            return self._select_portfolios(list(user_ids))
+
+    def _select_portfolios(self, user_ids: list) -> list:
+        portfolios = {}
+        # SQLite ограничивает число параметров запроса — читаем пачками
+        for start in range(0, len(user_ids), 500):
+            chunk = user_ids[start:start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            for row in self._conn.execute(
+                f"SELECT user_id, portfolio_version FROM users WHERE user_id IN ({placeholders})", chunk
+            ):
+                portfolios[row["user_id"]] = {
+                    "user_id": row["user_id"], "wallets": {}, "version": row["portfolio_version"]
+                }
+            for row in self._conn.execute(
+                f"SELECT user_id, currency_code, balance, units, precision FROM wallets "
+                f"WHERE user_id IN ({placeholders})",
+                chunk,
+            ):
+                portfolios[row["user_id"]]["wallets"][row["currency_code"]] = self._wallet(row)
+        return list(portfolios.values())
+
+    def save_portfolios(self, items, entries=None):
+        versions = []
+        undo = []
+        with self._transaction(undo=undo):
+            self._recover_ledger()
+            self.ledger.ensure_genesis(self._select_all_portfolios)
+            for user_id, wallets, expected_version in items:
+                versions.append(self._save_portfolio_row(user_id, wallets, expected_version))
+            start = self.ledger.end()
+            # записи, проведённые в незафиксированной транзакции, иначе доиграл бы _recover_ledger
+            undo.append(lambda: self.ledger.truncate(start))
+            end = self.ledger.append(entries or [], {item[0]: v for item, v in zip(items, versions)})
+            self._set_ledger_position(end)
+        self.ledger.maybe_checkpoint(end)
+        return versions
+
+    def _recover_ledger(self):
+        """Записи журнала после позиции из meta, не дошедшие до кошельков (процесс упал до COMMIT)"""
+        pending = list(self.ledger.read(self._ledger_position()))
+        if not pending:
+            return
+        by_id = {p["user_id"]: p for p in self._select_portfolios(sorted({e["user_id"] for e in pending}))}
+        for user_id in apply_entries(by_id, pending):
+            record = by_id[user_id]
+            self._write_wallets(user_id, record["wallets"])
+            self._conn.execute(
+                "UPDATE users SET portfolio_version = ? WHERE user_id = ?", (record["version"], user_id)
+            )
+
+    def _ledger_position(self) -> tuple:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'ledger_position'").fetchone()
+        return tuple(json.loads(row["value"])) if row else (1, 0)
+
+    def _set_ledger_position(self, position: tuple):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('ledger_position', ?)", (json.dumps(list(position)),)
+        )
+
+    def ledger_position(self):
+        return self._ledger_position()
+
+    def _save_portfolio_row(self, user_id, wallets, expected_version):
+        if expected_version is None:
+            updated = self._conn.execute(
+                "UPDATE users SET portfolio_version = portfolio_version + 1 WHERE user_id = ?",
+                (user_id,),
+            ).rowcount
+        else:
+            updated = self._conn.execute(
+                "UPDATE users SET portfolio_version = portfolio_version + 1 "
+                "WHERE user_id = ? AND portfolio_version = ?",
+                (user_id, expected_version),
+            ).rowcount
+        if not updated:
+            # версия портфеля — столбец users: портфеля без пользователя здесь не бывает
+            if not self._conn.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,)).fetchone():
+                raise ValueError(f"Пользователь {user_id} не найден")
+            raise ConcurrentModificationError(
+                f"Портфель {user_id} изменён другим процессом (ожидалась версия {expected_version})"
+            )
+        self._write_wallets(user_id, wallets)
+        return self._conn.execute(
+            "SELECT portfolio_version FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone()[0]
+
+    def _write_wallets(self, user_id, wallets):
+        self._conn.executemany(
+            "INSERT INTO wallets (user_id, currency_code, balance, units, precision) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (user_id, currency_code) DO UPDATE SET "
+            "balance = excluded.balance, units = excluded.units, precision = excluded.precision",
+            [(user_id, code, w["balance"], w.get("units"), w.get("precision")) for code, w in wallets.items()],
+        )
+        placeholders = ", ".join("?" * len(wallets))
+        self._conn.execute(
+            f"DELETE FROM wallets WHERE user_id = ? AND currency_code NOT IN ({placeholders})",
+            (user_id, *wallets.keys()),
+        )
+
+    def load_portfolios(self):
+        with self._transaction("DEFERRED"):
+            return self._select_all_portfolios()
+
+    def _select_all_portfolios(self) -> list:
+        portfolios = {}
+        for row in self._conn.execute("SELECT user_id, portfolio_version FROM users ORDER BY user_id"):
+            portfolios[row["user_id"]] = {
+                "user_id": row["user_id"], "wallets": {}, "version": row["portfolio_version"]
+            }
+        for row in self._conn.execute("SELECT user_id, currency_code, balance, units, precision FROM wallets"):
+            portfolios[row["user_id"]]["wallets"][row["currency_code"]] = self._wallet(row)
+        return list(portfolios.values())
@@ -0,0 +1,243 @@
+"""
+Аналитика по истории курсов: OHLC-бары, скользящие средние и волатильность.
+
+История читается потоком — конвейером генераторов поверх индекса
+RateHistory: чанки точек (iter_points) → чанки баров (iter_bars) →
+склейка баров на границах чанков. В памяти одновременно только чанк
+точек и готовые бары. Бары кешируются в data/history/bars/ и при
+появлении новой истории достраиваются с последней учтённой точки.
+"""
+import math
+import os
+import re
+import tempfile
+
+import numpy as np
+
+from .history import RateHistory, parse_timestamp
+
+BARS_DIR = "bars"
+# столбцы массива баров
+BAR_FIELDS = ("start", "open", "high", "low", "close", "count")
+INTERVAL_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def parse_interval(value) -> int:
+    """'15m', '1h', '1d' или число секунд -> секунды"""
+    match = re.fullmatch(r"\s*(\d+)\s*([smhdw]?)\s*", str(value).lower())
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"Некорректный интервал '{value}': ожидается, например, 15m, 1h, 1d")
+    return int(match.group(1)) * INTERVAL_UNITS[match.group(2) or "s"]
+
+
+def _empty_bars():
+    return np.empty((0, len(BAR_FIELDS)), dtype=np.float64)
+
+
+# ===== Конвейер =====
+def iter_bars(chunks, interval: int):
+    """
+    Чанки точек (timestamps, rates), упорядоченные по времени, -> чанки баров.
+    Внутри чанка бары считаются векторно; бар на границе двух чанков
+    приходит двумя частями, их склеивает merge_bars.
+    """
+    for ts, rates in chunks:
+        if not len(ts):
+            continue
+        buckets = np.floor_divide(ts, interval)
+        starts = np.flatnonzero(np.diff(buckets)) + 1
+        first = np.concatenate(([0], starts))
+        last = np.concatenate((starts, [len(ts)])) - 1
+        bars = np.empty((len(first), len(BAR_FIELDS)), dtype=np.float64)
+        bars[:, 0] = buckets[first] * interval
+        bars[:, 1] = rates[first]
+        bars[:, 2] = np.maximum.reduceat(rates, first)
+        bars[:, 3] = np.minimum.reduceat(rates, first)
+        bars[:, 4] = rates[last]
+        bars[:, 5] = last - first + 1
+        yield bars
+
+
+def merge_bars(parts: list, tail):
+    """
+    Добавляет чанк баров tail к списку массивов баров parts; бар, начатый
+    в конце последнего массива, продолжается первым баром tail (на месте).
+    """
+    head = parts[-1] if parts else None
+    if head is not None and len(head) and len(tail) and head[-1, 0] == tail[0, 0]:
+        head[-1, 2] = max(head[-1, 2], tail[0, 2])
+        head[-1, 3] = min(head[-1, 3], tail[0, 3])
+        head[-1, 4] = tail[0, 4]
+        head[-1, 5] += tail[0, 5]
+        tail = tail[1:]
+    if len(tail):
+        parts.append(tail)
+
+
+def collect_bars(chunks, interval: int, bars=None):
+    """Бары по потоку чанков точек, продолжая уже посчитанные bars"""
+    parts = [bars if bars is not None else _empty_bars()]
+    for chunk in iter_bars(chunks, interval):
+        merge_bars(parts, chunk)
+    return np.concatenate(parts)
+
+
+# ===== Индикаторы (векторно по массиву цен закрытия) =====
+def sma(values, window: int):
+    """Простое скользящее среднее; первые window - 1 значений — nan"""
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(len(values), np.nan)
+    if window <= 0 or len(values) < window:
+        return result
+    sums = np.cumsum(np.concatenate(([0.0], values)))
+    result[window - 1:] = (sums[window:] - sums[:-window]) / window
+    return result
+
+
+def ema(values, span: int):
+    """
+    Экспоненциальное скользящее среднее, alpha = 2 / (span + 1),
+    начальное значение — первая цена. Рекуррентность раскрыта в явную
+    формулу и считается векторно по блокам такой длины, чтобы
+    множители (1 - alpha)^-k не переполнялись.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = np.empty(len(values))
+    if not len(values):
+        return result
+    alpha = 2.0 / (span + 1)
+    decay = 1.0 - alpha
+    if decay <= 0:
+        return values.copy()
+    block = max(1, int(300 / -math.log(decay)))
+    prev = values[0]
+    for lo in range(0, len(values), block):
+        chunk = values[lo:lo + block]
+        powers = decay ** np.arange(len(chunk))
+        # ema_t = decay^(t+1) * prev + alpha * decay^t * sum_k x_k / decay^k
+        weighted = np.cumsum(chunk / powers)
+        result[lo:lo + len(chunk)] = powers * decay * prev + alpha * powers * weighted
+        prev = result[lo + len(chunk) - 1]
+    return result
+
+
+def volatility(values, window: int):
+    """
+    Скользящая волатильность: стандартное отклонение лог-доходностей
+    за window баров; значение на баре i — по доходностям, заканчивающимся
+    на нём. Первые window значений — nan.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(len(values), np.nan)
+    if window < 2 or len(values) <= window:
+        return result
+    returns = np.diff(np.log(values))
+    s1 = np.cumsum(np.concatenate(([0.0], returns)))
+    s2 = np.cumsum(np.concatenate(([0.0], returns ** 2)))
+    total = s1[window:] - s1[:-window]
+    squares = s2[window:] - s2[:-window]
+    variance = np.maximum((squares - total ** 2 / window) / (window - 1), 0.0)
+    result[window:] = np.sqrt(variance)
+    return result
+
+
+# ===== Кеш баров =====
+class _OutOfOrder(Exception):
+    pass
+
+
+class BarCache:
+    """
+    Бары пар по интервалам, посчитанные по истории, в файлах
+    data/history/bars/<PAIR>.<интервал>s.npz: массив баров и отметка,
+    сколько точек индекса пары в них учтено (и время последней из них).
+
+    bars() достраивает кеш только по новым точкам: последний бар
+    продолжается, остальные не пересчитываются. Если индекс пары
+    перестроен (запоздавшие записи, пересборка после потери сегмента),
+    отметка не совпадёт и бары считаются заново.
+    """
+
+    def __init__(self, history: RateHistory = None, chunk_size: int = 65536):
+        self.history = history or RateHistory()
+        self.bars_dir = os.path.join(self.history.storage.history_dir, BARS_DIR)
+        self.chunk_size = chunk_size
+
+    def bars(self, pair: str, interval: int):
+        """Массив баров пары (столбцы BAR_FIELDS), по возрастанию времени"""
+        pair = pair.upper()
+        self.history.refresh_index()
+        total = self.history.count(pair)
+        bars, done, last_ts = self._load(pair, interval)
+        if done > total or (done and self.history.timestamp_at(pair, done - 1) != last_ts):
+            bars, done = _empty_bars(), 0
+        if done == total:
+            return bars
+
+        chunks = self.history.iter_points(pair, done, self.chunk_size)
+        if done:
+            chunks = self._check_order(chunks, last_ts)
+        try:
+            bars = collect_bars(chunks, interval, bars)
+        except _OutOfOrder:
+            bars = collect_bars(self.history.iter_points(pair, 0, self.chunk_size), interval)
+        self._save(pair, interval, bars, total, self.history.timestamp_at(pair, total - 1))
+        return bars
+
+    @staticmethod
+    def _check_order(chunks, last_ts):
+        """Новые точки не должны быть раньше уже учтённых — иначе индекс перестроен"""
+        for ts, rates in chunks:
+            if len(ts) and ts[0] < last_ts:
+                raise _OutOfOrder()
+            last_ts = ts[-1] if len(ts) else last_ts
+            yield ts, rates
+
+    def _path(self, pair, interval):
+        return os.path.join(self.bars_dir, f"{pair}.{interval}s.npz")
+
+    def _load(self, pair, interval):
+        path = self._path(pair, interval)
+        if not os.path.exists(path):
+            return _empty_bars(), 0, None
+        try:
+            with np.load(path) as data:
+                done, last_ts = data["meta"].tolist()
+                return data["bars"], int(done), last_ts
+        except (OSError, ValueError, KeyError):
+            return _empty_bars(), 0, None
+
+    def _save(self, pair, interval, bars, done, last_ts):
+        os.makedirs(self.bars_dir, exist_ok=True)
+        # у каждого писателя свой временный файл: общий path + ".tmp" два процесса
+        # перезаписывали бы одновременно, и os.replace поставил бы смесь двух кешей
+        fd, tmp_path = tempfile.mkstemp(dir=self.bars_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, bars=bars, meta=np.array([done, last_ts], dtype=np.float64))
+            os.replace(tmp_path, self._path(pair, interval))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def analyze(pair: str, interval, start=None, end=None, sma_window: int = 20, ema_span: int = 20,
+            vol_window: int = 20, cache: BarCache = None) -> dict:
+    """
+    Бары пары за [start, end] с индикаторами. Индикаторы считаются по
+    всем барам кеша, поэтому в начале интервала они уже «разогреты».
+    Возвращает {"bars": массив баров, "sma": ..., "ema": ..., "volatility": ...}.
+    """
+    interval = parse_interval(interval)
+    bars = (cache or BarCache()).bars(pair, interval)
+    closes = bars[:, 4]
+    result = {
+        "bars": bars,
+        "sma": sma(closes, sma_window),
+        "ema": ema(closes, ema_span),
+        "volatility": volatility(closes, vol_window),
+    }
+    lo = 0 if start is None else np.searchsorted(bars[:, 0], parse_timestamp(start) // interval * interval)
+    hi = len(bars) if end is None else np.searchsorted(bars[:, 0], parse_timestamp(end), side="right")
+    return {key: values[lo:hi] for key, values in result.items()}
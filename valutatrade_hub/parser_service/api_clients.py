@@ -1,20 +1,119 @@
+import threading
+
 import requests
 from abc import ABC, abstractmethod
 from datetime import datetime, timezone
+from requests.adapters import HTTPAdapter
 
 from .config import config
 from ..core.exceptions import ApiRequestError
 
 
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Общая на процесс HTTP-сессия с пулом keep-alive соединений:
+    повторные запросы к тому же хосту не платят за TCP/TLS рукопожатие.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=config.HTTP_POOL_CONNECTIONS,
+                pool_maxsize=config.HTTP_POOL_MAXSIZE,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def _unix_iso(value) -> str:
+    return datetime.fromtimestamp(value, timezone.utc).isoformat()
+
+
 class BaseApiClient(ABC):
+    # имя источника для --source, расписания и настроек; label — для provenance
+    name = None
+    label = None
+
+    def __init__(self, session: requests.Session = None, deadline: float = None):
+        self.session = session or get_session()
+        # предельное время на весь fetch_rates этого клиента
+        self.deadline = deadline if deadline is not None else config.REQUEST_TIMEOUT
+        # по каждому запросу (URL и параметры): ETag, Last-Modified и тело последнего ответа 200
+        self._conditional = {}
+
+    @property
+    def timeout(self) -> float:
+        return min(config.REQUEST_TIMEOUT, self.deadline)
+
+    @property
+    def weight(self) -> float:
+        """Вес источника во взвешенной агрегации"""
+        return config.PROVIDER_WEIGHTS.get(self.name, 1.0)
+
+    @property
+    def available(self) -> bool:
+        """Можно ли опрашивать источник (например, задан ли API-ключ)"""
+        return True
+
+    @property
+    @abstractmethod
+    def pairs(self) -> frozenset:
+        """Пары вида BTC_USD, которые покрывает источник"""
+        pass
+
+    def _get_json(self, params: dict):
+        """
+        GET и разбор JSON. Валидаторы хранятся по запросу (URL и параметры):
+        If-None-Match / If-Modified-Since уходят, только если источник отдавал
+        их на этот же запрос, а при 304 Not Modified возвращается тело
+        прошлого ответа именно на него — другой набор пар запрашивается заново.
+        """
+        key = (self.url, tuple(sorted(params.items())))
+        cached = self._conditional.get(key)
+        headers = {}
+        if cached is not None:
+            etag, last_modified, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        response = self.session.get(self.url, params=params, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and cached is not None:
+            return cached[2]
+        if response.status_code != 200:
+            raise ApiRequestError(f"{self.label} error: {response.status_code}")
+        data = response.json()
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if etag or last_modified:
+            self._conditional[key] = (etag, last_modified, data)
+        else:
+            self._conditional.pop(key, None)
+        return data
+
+    def _quote(self, rate, fetched_at: str, as_of: str = None) -> dict:
+        return {"rate": float(rate), "updated_at": fetched_at, "source": self.label, "as_of": as_of or fetched_at}
+
+    def _wanted_codes(self, pairs) -> list:
+        """Коды валют запрошенных пар, которые покрывает источник"""
+        covered = self.pairs if pairs is None else self.pairs & set(pairs)
+        return sorted(pair.split("_")[0] for pair in covered)
+
     @abstractmethod
-    def fetch_rates(self) -> dict:
+    def fetch_rates(self, pairs=None) -> dict:
         """
-        Должен вернуть словарь в формате:
+        Курсы пар из pairs (по умолчанию всех, что покрывает источник):
         {
             "BTC_USD": {
                 "rate": 59337.21,
-                "updated_at": "...",
+                "updated_at": "...",   # время получения
+                "as_of": "...",        # время курса по данным источника
                 "source": "CoinGecko"
             }
         }
@@ -23,45 +122,39 @@ class BaseApiClient(ABC):
 
 
 class CoinGeckoClient(BaseApiClient):
-    def fetch_rates(self) -> dict:
-        try:
-            ids = ",".join(
-                config.CRYPTO_ID_MAP[code]
-                for code in config.CRYPTO_CURRENCIES
-                if code in config.CRYPTO_ID_MAP
-            )
+    name = "coingecko"
+    label = "CoinGecko"
 
+    def __init__(self, url: str = None, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url or config.COINGECKO_URL
+
+    @property
+    def pairs(self) -> frozenset:
+        return frozenset(
+            f"{code}_{config.BASE_CURRENCY}" for code in config.CRYPTO_CURRENCIES if code in config.CRYPTO_ID_MAP
+        )
+
+    def fetch_rates(self, pairs=None) -> dict:
+        try:
+            codes = self._wanted_codes(pairs)
             params = {
-                "ids": ids,
+                "ids": ",".join(config.CRYPTO_ID_MAP[code] for code in codes),
                 "vs_currencies": config.BASE_CURRENCY.lower(),
+                "include_last_updated_at": "true",
             }
 
-            response = requests.get(
-                config.COINGECKO_URL,
-                params=params,
-                timeout=config.REQUEST_TIMEOUT,
-            )
-
-            if response.status_code != 200:
-                raise ApiRequestError(
-                    f"CoinGecko error: {response.status_code}"
-                )
-
-            data = response.json()
+            data = self._get_json(params)
             result = {}
 
             timestamp = datetime.now(timezone.utc).isoformat()
 
-            for code, coin_id in config.CRYPTO_ID_MAP.items():
-                if coin_id in data:
-                    rate = data[coin_id].get(config.BASE_CURRENCY.lower())
-                    if rate:
-                        pair = f"{code}_{config.BASE_CURRENCY}"
-                        result[pair] = {
-                            "rate": float(rate),
-                            "updated_at": timestamp,
-                            "source": "CoinGecko",
-                        }
+            for code in codes:
+                coin = data.get(config.CRYPTO_ID_MAP[code], {})
+                rate = coin.get(config.BASE_CURRENCY.lower())
+                if rate:
+                    as_of = _unix_iso(coin["last_updated_at"]) if coin.get("last_updated_at") else None
+                    result[f"{code}_{config.BASE_CURRENCY}"] = self._quote(rate, timestamp, as_of)
 
             return result
 
@@ -71,48 +164,102 @@ class CoinGeckoClient(BaseApiClient):
 
 class ExchangeRateApiClient(BaseApiClient):
     """
-    Используем exchangerate.host — бесплатный API без ключа
+    ExchangeRate-API v6: {EXCHANGERATE_API_URL}/{ключ}/latest/{BASE}.
+    conversion_rates — сколько единиц валюты за 1 BASE, поэтому курс
+    пары X_BASE — обратная величина. Без EXCHANGERATE_API_KEY источник
+    недоступен и в опрос по умолчанию не попадает.
     """
 
-    def fetch_rates(self) -> dict:
+    name = "exchangerate"
+    label = "ExchangeRate"
+
+    def __init__(self, url: str = None, api_key: str = None, **kwargs):
+        super().__init__(**kwargs)
+        self.api_key = api_key or config.EXCHANGERATE_API_KEY
+        self._url = url
+
+    @property
+    def url(self) -> str:
+        return self._url or f"{config.EXCHANGERATE_API_URL}/{self.api_key}/latest/{config.BASE_CURRENCY}"
+
+    @property
+    def available(self) -> bool:
+        return bool(self._url or self.api_key)
+
+    @property
+    def pairs(self) -> frozenset:
+        return frozenset(f"{code}_{config.BASE_CURRENCY}" for code in config.FIAT_CURRENCIES)
+
+    def fetch_rates(self, pairs=None) -> dict:
+        if not self.available:
+            raise ApiRequestError("ExchangeRate: не задан EXCHANGERATE_API_KEY")
         try:
-            url = "https://api.exchangerate.host/latest"
+            data = self._get_json({})
 
-            params = {
-                "base": config.BASE_CURRENCY,
-                "symbols": ",".join(config.FIAT_CURRENCIES),
-            }
+            if data.get("result") != "success" or "conversion_rates" not in data:
+                raise ApiRequestError(f"Invalid response from ExchangeRate: {data.get('error-type', data.get('result'))}")
 
-            response = requests.get(
-                url,
-                params=params,
-                timeout=config.REQUEST_TIMEOUT,
-            )
+            result = {}
+            timestamp = datetime.now(timezone.utc).isoformat()
+            as_of = _unix_iso(data["time_last_update_unix"]) if data.get("time_last_update_unix") else None
 
-            if response.status_code != 200:
-                raise ApiRequestError(
-                    f"ExchangeRate error: {response.status_code}"
-                )
+            for code in self._wanted_codes(pairs):
+                rate = data["conversion_rates"].get(code)
+                if rate:
+                    result[f"{code}_{config.BASE_CURRENCY}"] = self._quote(1 / rate, timestamp, as_of)
+
+            return result
+
+        except requests.exceptions.RequestException as e:
+            raise ApiRequestError(f"ExchangeRate network error: {e}")
+
+
+class FrankfurterClient(BaseApiClient):
+    """Курсы ЕЦБ через frankfurter.app: без ключа, обновляются раз в рабочий день"""
 
-            data = response.json()
+    name = "frankfurter"
+    label = "Frankfurter"
+    # валюты, по которым ЕЦБ публикует курсы
+    CURRENCIES = frozenset((
+        "AUD", "BGN", "BRL", "CAD", "CHF", "CNY", "CZK", "DKK", "EUR", "GBP", "HKD", "HUF", "IDR",
+        "ILS", "INR", "ISK", "JPY", "KRW", "MXN", "MYR", "NOK", "NZD", "PHP", "PLN", "RON", "SEK",
+        "SGD", "THB", "TRY", "USD", "ZAR",
+    ))
 
+    def __init__(self, url: str = None, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url or config.FRANKFURTER_URL
+
+    @property
+    def pairs(self) -> frozenset:
+        if config.BASE_CURRENCY not in self.CURRENCIES:
+            return frozenset()
+        return frozenset(
+            f"{code}_{config.BASE_CURRENCY}" for code in config.FIAT_CURRENCIES if code in self.CURRENCIES
+        )
+
+    def fetch_rates(self, pairs=None) -> dict:
+        try:
+            codes = self._wanted_codes(pairs)
+            data = self._get_json({"from": config.BASE_CURRENCY, "to": ",".join(codes)})
             if "rates" not in data:
-                raise ApiRequestError("Invalid response from ExchangeRate")
+                raise ApiRequestError("Invalid response from Frankfurter")
 
             result = {}
             timestamp = datetime.now(timezone.utc).isoformat()
-
-            for code in config.FIAT_CURRENCIES:
+            # дата публикации ЕЦБ — без времени, считаем полночью UTC
+            as_of = f"{data['date']}T00:00:00+00:00" if data.get("date") else None
+            for code in codes:
                 rate = data["rates"].get(code)
                 if rate:
-                    pair = f"{code}_{config.BASE_CURRENCY}"
-                    result[pair] = {
-                        "rate": float(rate),
-                        "updated_at": timestamp,
-                        "source": "ExchangeRate",
-                    }
+                    result[f"{code}_{config.BASE_CURRENCY}"] = self._quote(1 / rate, timestamp, as_of)
 
             return result
 
         except requests.exceptions.RequestException as e:
-            raise ApiRequestError(f"ExchangeRate network error: {e}")
\ No newline at end of file
+            raise ApiRequestError(f"Frankfurter network error: {e}")
+
+
+def default_clients() -> list:
+    """Все известные источники курсов"""
+    return [CoinGeckoClient(), ExchangeRateApiClient(), FrankfurterClient()]
@@ -14,6 +14,8 @@ class ParserConfig:
 
     COINGECKO_URL: str = "https://api.coingecko.com/api/v3/simple/price"
     EXCHANGERATE_API_URL: str = "https://v6.exchangerate-api.com/v6"
+    # курсы ЕЦБ, без ключа
+    FRANKFURTER_URL: str = "https://api.frankfurter.app/latest"
 
     BASE_CURRENCY: str = "USD"
 
@@ -31,8 +33,57 @@ class ParserConfig:
 
   
     RATES_FILE_PATH: str = "data/rates.json"
+    # время последнего подтверждения курсов, не изменившихся с прошлого опроса
+    CONFIRMATIONS_FILE_PATH: str = "data/rates_confirmed.json"
     HISTORY_FILE_PATH: str = "data/exchange_rates.json"
 
+    # Append-only история: JSON Lines сегменты с ротацией по размеру
+    HISTORY_DIR_PATH: str = "data/history"
+    HISTORY_SEGMENT_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Порог изменения курса: ("abs", delta) или ("rel", доля от прежнего курса).
+    # Изменения в пределах порога не пишутся в историю и snapshot.
+    DEFAULT_RATE_EPSILON: tuple = ("rel", 0.0)
+    RATE_EPSILONS: dict = field(default_factory=dict)
+
     REQUEST_TIMEOUT: int = 10
 
+    # Расписание демона обновления курсов: интервал для каждого источника, с
+    REFRESH_INTERVALS: dict = field(
+        default_factory=lambda: {
+            "coingecko": 60,
+            "exchangerate": 3600,
+            "frankfurter": 3600,
+        }
+    )
+    DEFAULT_REFRESH_INTERVAL: int = 300
+
+    # Агрегация курсов нескольких источников: "median" или "weighted"
+    # (среднее, взвешенное по PROVIDER_WEIGHTS)
+    AGGREGATION_METHOD: str = "median"
+    PROVIDER_WEIGHTS: dict = field(default_factory=dict)
+    # Сколько источников опрашивать на пару, если её покрывают несколько;
+    # 1 — минимальный набор источников, покрывающий запрошенные пары
+    PROVIDERS_PER_PAIR: int = 3
+    # Котировка старше этого возраста (по времени источника) отбрасывается, с
+    MAX_QUOTE_AGE_SECONDS: dict = field(
+        default_factory=lambda: {
+            "coingecko": 600,
+            "exchangerate": 2 * 86400,
+            # ЕЦБ не публикует курсы в выходные
+            "frankfurter": 4 * 86400,
+        }
+    )
+    DEFAULT_MAX_QUOTE_AGE_SECONDS: int = 3600
+    # При трёх и более котировках отбрасываются отклонившиеся от медианы сильнее доли
+    OUTLIER_MAX_DEVIATION: float = 0.05
+
+    # Экспоненциальная задержка после ошибки источника, с
+    BACKOFF_BASE_SECONDS: float = 5.0
+    BACKOFF_MAX_SECONDS: float = 900.0
+
+    # Пул keep-alive соединений общей HTTP-сессии
+    HTTP_POOL_CONNECTIONS: int = 4
+    HTTP_POOL_MAXSIZE: int = 8
+
 config = ParserConfig()
\ No newline at end of file
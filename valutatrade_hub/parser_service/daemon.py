@@ -0,0 +1,92 @@
+import random
+import signal
+import threading
+import time
+
+from .config import config
+from .updater import RatesUpdater
+from ..core import metrics
+from ..core.logging_config import get_logger
+
+logger = get_logger("daemon")
+
+
+class _SourceSchedule:
+    def __init__(self, client, interval):
+        self.client = client
+        self.interval = interval
+        self.failures = 0
+        self.next_run = 0.0
+
+
+class RatesDaemon:
+    """
+    Долгоживущий процесс обновления курсов поверх RatesUpdater.
+
+    Каждый источник опрашивается со своим интервалом из
+    ParserConfig.REFRESH_INTERVALS. После ошибки следующий запрос
+    откладывается экспоненциально (с разбросом), пока источник не ответит.
+    Соединения и валидаторы условных запросов живут всё время работы.
+    """
+
+    def __init__(self, updater: RatesUpdater = None, intervals: dict = None):
+        self.updater = updater or RatesUpdater()
+        intervals = intervals or config.REFRESH_INTERVALS
+        self.schedules = [
+            _SourceSchedule(client, intervals.get(client.name, config.DEFAULT_REFRESH_INTERVAL))
+            for client in self.updater.clients
+            if getattr(client, "available", True)
+        ]
+        self._stop = threading.Event()
+
+    def stop(self, *_):
+        logger.info("Stopping rates daemon...")
+        self._stop.set()
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+    def backoff_delay(self, failures: int) -> float:
+        delay = min(config.BACKOFF_MAX_SECONDS, config.BACKOFF_BASE_SECONDS * 2 ** (failures - 1))
+        return random.uniform(delay / 2, delay)
+
+    def run_once(self):
+        """
+        Опрашивает источники, чей срок подошёл; возвращает паузу до следующего.
+        Ошибка самого обновления (например, записи snapshot'а) считается
+        ошибкой всех опрошенных источников: демон не падает, а ждёт backoff.
+        """
+        if not self.schedules:
+            return config.DEFAULT_REFRESH_INTERVAL
+        now = time.monotonic()
+        due = [s for s in self.schedules if s.next_run <= now]
+        if due:
+            try:
+                self.updater.run_update([s.client for s in due])
+                failed = set(self.updater.failed)
+            except Exception as e:
+                logger.error(f"Update failed: {e}")
+                failed = {s.client.name or s.client.__class__.__name__ for s in due}
+            finished = time.monotonic()
+            for s in due:
+                name = s.client.name or s.client.__class__.__name__
+                if name in failed:
+                    s.failures += 1
+                    delay = self.backoff_delay(s.failures)
+                    logger.warning(f"{name}: failure #{s.failures}, retry in {delay:.1f}s")
+                else:
+                    s.failures = 0
+                    delay = s.interval
+                s.next_run = finished + delay
+        return max(0.0, min(s.next_run for s in self.schedules) - time.monotonic())
+
+    def run(self):
+        if not self.schedules:
+            logger.warning("Rates daemon started without available sources")
+        logger.info(f"Rates daemon started: {', '.join(f'{s.client.name}={s.interval}s' for s in self.schedules)}")
+        while not self._stop.is_set():
+            pause = self.run_once()
+            metrics.flush()
+            self._stop.wait(pause)
+        logger.info("Rates daemon stopped")
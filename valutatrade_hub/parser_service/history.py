@@ -0,0 +1,313 @@
+import fcntl
+import json
+import os
+import re
+import struct
+from datetime import datetime, timezone
+
+from .storage import RatesStorage, SEGMENT_PREFIX, SEGMENT_SUFFIX
+
+# Запись индекса: (timestamp, номер сегмента, смещение строки в сегменте)
+ENTRY = struct.Struct("<dIQ")
+# та же запись для чтения индекса массивами numpy (упакованная, без выравнивания)
+ENTRY_DTYPE = [("ts", "<f8"), ("segment", "<u4"), ("offset", "<u8")]
+INDEX_SUFFIX = ".idx"
+STATE_FILE = "_state.json"
+# курс из строки сегмента без разбора всей записи (iter_points)
+RATE_FIELD = re.compile(rb'"rate":\s*(-?[0-9][0-9.eE+-]*)')
+
+
+def parse_timestamp(value) -> float:
+    """ISO-строка или datetime -> unix timestamp (наивное время считается UTC)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    dt = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _segment_number(name: str) -> int:
+    return int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+
+class RateHistory:
+    """
+    Запросы к истории курсов по persisted-индексу.
+
+    Для каждой пары в data/history/index/<PAIR>.idx хранится отсортированный
+    по времени массив записей фиксированной длины, поэтому поиск — бинарный
+    по файлу (O(log n)), а выдача k записей — k чтений по смещениям.
+    Индекс дописывается инкрементально: обрабатываются только байты
+    сегментов, появившиеся после прошлого обновления.
+    """
+
+    def __init__(self, storage: RatesStorage = None):
+        self.storage = storage or RatesStorage()
+        self.index_dir = os.path.join(self.storage.history_dir, "index")
+
+    # ===== Запросы =====
+    def range(self, pair: str, start=None, end=None) -> list:
+        """Записи пары в интервале [start, end]"""
+        self.refresh_index()
+        with self._open_index(pair) as idx:
+            if idx is None:
+                return []
+            lo = 0 if start is None else self._bisect(idx, parse_timestamp(start), left=True)
+            hi = idx.count if end is None else self._bisect(idx, parse_timestamp(end), left=False)
+            return self._read_records(idx, lo, hi)
+
+    def last(self, pair: str, n: int) -> list:
+        """Последние n точек пары"""
+        self.refresh_index()
+        with self._open_index(pair) as idx:
+            if idx is None or n <= 0:
+                return []
+            return self._read_records(idx, max(0, idx.count - n), idx.count)
+
+    def as_of(self, pair: str, when):
+        """Значение курса на момент when (последняя запись не позже when)"""
+        self.refresh_index()
+        with self._open_index(pair) as idx:
+            if idx is None:
+                return None
+            pos = self._bisect(idx, parse_timestamp(when), left=False)
+            if pos == 0:
+                return None
+            return self._read_records(idx, pos - 1, pos)[0]
+
+    def count(self, pair: str) -> int:
+        """Число точек пары в индексе (без обновления индекса)"""
+        path = self._index_path(pair)
+        return os.path.getsize(path) // ENTRY.size if os.path.exists(path) else 0
+
+    def timestamp_at(self, pair: str, position: int):
+        """Время точки пары по её номеру в индексе (без обновления индекса)"""
+        with self._open_index(pair) as idx:
+            if idx is None or not 0 <= position < idx.count:
+                return None
+            return idx.timestamp(position)
+
+    def iter_points(self, pair: str, start: int = 0, chunk_size: int = 65536):
+        """
+        Потоково отдаёт точки пары, начиная с номера start в индексе:
+        чанки (timestamps, rates) — массивы numpy не длиннее chunk_size.
+        Время берётся из индекса, курс — из строки сегмента по смещению.
+        Индекс не обновляется: перед чтением вызывается refresh_index().
+        """
+        import numpy as np
+
+        path = self._index_path(pair)
+        total = self.count(pair)
+        handles = {}
+        try:
+            for lo in range(start, total, chunk_size):
+                entries = np.fromfile(path, dtype=ENTRY_DTYPE, count=min(chunk_size, total - lo),
+                                      offset=lo * ENTRY.size)
+                rates = np.empty(len(entries), dtype=np.float64)
+                for i, (number, offset) in enumerate(zip(entries["segment"].tolist(), entries["offset"].tolist())):
+                    f = handles.get(number)
+                    if f is None:
+                        f = handles[number] = open(self.storage.segment_path(number), "rb")
+                    f.seek(offset)
+                    line = f.readline()
+                    match = RATE_FIELD.search(line)
+                    rates[i] = float(match.group(1)) if match else json.loads(line)["rate"]
+                yield entries["ts"], rates
+        finally:
+            for f in handles.values():
+                f.close()
+
+    def pairs(self) -> list:
+        self.refresh_index()
+        return sorted(
+            name[:-len(INDEX_SUFFIX)]
+            for name in os.listdir(self.index_dir)
+            if name.endswith(INDEX_SUFFIX)
+        )
+
+    # ===== Построение индекса =====
+    def refresh_index(self):
+        """Индексирует новые записи сегментов (под межпроцессной блокировкой)"""
+        self.storage.ensure_history_dir()
+        os.makedirs(self.index_dir, exist_ok=True)
+        with open(os.path.join(self.index_dir, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._refresh_locked()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _refresh_locked(self):
+        """
+        Состояние индекса (_state.json): сколько байт каждого сегмента
+        проиндексировано и сколько записей в файле каждой пары. Если файл
+        пары длиннее сохранённого (процесс упал после дописывания индекса,
+        но до сохранения состояния), уже внесённые точки не дублируются.
+        """
+        original = self._load_state()
+        # прежний формат — только смещения сегментов, число записей пар неизвестно
+        state = dict(original["segments"] if "segments" in original else original)
+        counts = original.get("counts")
+        segments = {os.path.basename(p): p for p in self.storage.list_segments()}
+
+        # сегмент исчез или укоротился — индекс строим заново
+        if any(name not in segments or os.path.getsize(segments[name]) < offset
+               for name, offset in state.items()):
+            self._drop_index()
+            state, counts = {}, {}
+
+        new_entries = {}
+        for name, path in segments.items():
+            start = state.get(name, 0)
+            if os.path.getsize(path) <= start:
+                continue
+            number = _segment_number(name)
+            with open(path, "rb") as f:
+                f.seek(start)
+                offset = start
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    record = json.loads(line)
+                    pair = self._pair_of(record)
+                    if pair and record.get("updated_at"):
+                        ts = parse_timestamp(record["updated_at"])
+                        new_entries.setdefault(pair, []).append((ts, number, offset))
+                    offset += len(line)
+            state[name] = offset
+
+        for pair, entries in new_entries.items():
+            self._append_entries(pair, entries, None if counts is None else counts.get(pair, 0))
+        updated = {"segments": state, "counts": {
+            name[:-len(INDEX_SUFFIX)]: os.path.getsize(os.path.join(self.index_dir, name)) // ENTRY.size
+            for name in os.listdir(self.index_dir) if name.endswith(INDEX_SUFFIX)
+        }}
+        if updated != original:
+            self._save_state(updated)
+
+    def _append_entries(self, pair, entries, known_count):
+        """known_count — число записей пары по сохранённому состоянию (None — неизвестно)"""
+        path = self._index_path(pair)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size and (known_count is None or size != known_count * ENTRY.size):
+            # индекс дописан после последнего сохранения состояния: уже внесённые точки пропускаем
+            with open(path, "rb") as f:
+                data = f.read(size - size % ENTRY.size)
+            indexed = {ENTRY.unpack_from(data, i)[1:] for i in range(0, len(data), ENTRY.size)}
+            entries = [e for e in entries if e[1:] not in indexed]
+            if size % ENTRY.size:
+                os.truncate(path, len(data))  # оборванная запись индекса
+            if not entries:
+                return
+        entries.sort()
+        last_ts = None
+        if os.path.exists(path) and os.path.getsize(path) >= ENTRY.size:
+            with open(path, "rb") as f:
+                f.seek(-ENTRY.size, os.SEEK_END)
+                last_ts = ENTRY.unpack(f.read(ENTRY.size))[0]
+
+        if last_ts is None or entries[0][0] >= last_ts:
+            # обычный случай: время растёт — просто дописываем
+            with open(path, "ab") as f:
+                f.write(b"".join(ENTRY.pack(*e) for e in entries))
+            return
+
+        # запоздавшие записи — пересобираем файл пары целиком
+        with open(path, "rb") as f:
+            data = f.read()
+        merged = [ENTRY.unpack_from(data, i) for i in range(0, len(data), ENTRY.size)]
+        merged.extend(entries)
+        merged.sort()
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"".join(ENTRY.pack(*e) for e in merged))
+        os.replace(tmp, path)
+
+    def _drop_index(self):
+        for name in os.listdir(self.index_dir):
+            if name.endswith(INDEX_SUFFIX) or name == STATE_FILE:
+                os.remove(os.path.join(self.index_dir, name))
+
+    def _load_state(self) -> dict:
+        path = os.path.join(self.index_dir, STATE_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_state(self, state):
+        path = os.path.join(self.index_dir, STATE_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _pair_of(record):
+        if record.get("from_currency") and record.get("to_currency"):
+            return f"{record['from_currency']}_{record['to_currency']}"
+        return None
+
+    def _index_path(self, pair):
+        return os.path.join(self.index_dir, pair.upper() + INDEX_SUFFIX)
+
+    # ===== Чтение индекса =====
+    def _open_index(self, pair):
+        return _IndexFile(self._index_path(pair))
+
+    @staticmethod
+    def _bisect(idx, ts, left):
+        lo, hi = 0, idx.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = idx.timestamp(mid)
+            if value < ts or (not left and value == ts):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _read_records(self, idx, lo, hi):
+        records = []
+        handles = {}
+        try:
+            for i in range(lo, hi):
+                _, number, offset = idx.entry(i)
+                f = handles.get(number)
+                if f is None:
+                    path = self.storage.segment_path(number)
+                    f = handles[number] = open(path, "rb")
+                f.seek(offset)
+                records.append(json.loads(f.readline()))
+        finally:
+            for f in handles.values():
+                f.close()
+        return records
+
+
+class _IndexFile:
+    """Доступ к записям индекса пары по номеру без чтения файла целиком"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self.count = 0
+
+    def __enter__(self):
+        if not os.path.exists(self.path):
+            return None
+        self._file = open(self.path, "rb")
+        self.count = os.fstat(self._file.fileno()).st_size // ENTRY.size
+        return self
+
+    def __exit__(self, *exc):
+        if self._file:
+            self._file.close()
+
+    def entry(self, i):
+        self._file.seek(i * ENTRY.size)
+        return ENTRY.unpack(self._file.read(ENTRY.size))
+
+    def timestamp(self, i):
+        return self.entry(i)[0]
@@ -0,0 +1,126 @@
+import statistics
+from datetime import datetime, timezone
+
+from .config import config
+
+
+class ProviderRegistry:
+    """
+    Реестр источников курсов. Каждый клиент объявляет покрываемые пары
+    (BaseApiClient.pairs); реестр выбирает, кого опрашивать для набора
+    пар и источников: не больше PROVIDERS_PER_PAIR источников на пару,
+    в порядке веса, и только тех, кто добавляет покрытие.
+    """
+
+    def __init__(self, clients: list):
+        self.clients = list(clients)
+
+    def names(self) -> list:
+        return [client.name for client in self.clients]
+
+    @staticmethod
+    def coverage(client) -> frozenset:
+        # клиент без объявленного покрытия (заглушки) считается покрывающим всё
+        return getattr(client, "pairs", None)
+
+    def select(self, pairs=None, sources=None) -> list:
+        """
+        Клиенты для опроса. sources — имена источников (--source):
+        неизвестное имя — ValueError; явно запрошенный источник опрашивается,
+        даже если недоступен (ошибка попадёт в RatesUpdater.failed).
+        """
+        if sources:
+            unknown = set(sources) - set(self.names())
+            if unknown:
+                raise ValueError(
+                    f"Неизвестный источник курсов: {', '.join(sorted(unknown))}. "
+                    f"Доступны: {', '.join(self.names())}"
+                )
+            candidates = [c for c in self.clients if c.name in sources]
+        else:
+            candidates = [c for c in self.clients if getattr(c, "available", True)]
+        if pairs is None:
+            wanted = set()
+            for client in candidates:
+                wanted |= self.coverage(client) or set()
+        else:
+            wanted = set(pairs)
+
+        need = dict.fromkeys(wanted, config.PROVIDERS_PER_PAIR)
+        chosen = []
+        # сначала более весомые источники, при равном весе — с большим покрытием
+        ranked = sorted(
+            candidates,
+            key=lambda c: (-getattr(c, "weight", 1.0), -len(self.coverage(c) or ())),
+        )
+        for client in ranked:
+            if self.coverage(client) is None:
+                chosen.append(client)
+                continue
+            covered = self.coverage(client) & wanted
+            if any(need[pair] > 0 for pair in covered):
+                chosen.append(client)
+                for pair in covered:
+                    need[pair] -= 1
+        return chosen
+
+
+def _age_seconds(quote: dict, now: datetime) -> float:
+    as_of = datetime.fromisoformat(quote.get("as_of") or quote["updated_at"])
+    if as_of.tzinfo is None:
+        as_of = as_of.replace(tzinfo=timezone.utc)
+    return (now - as_of).total_seconds()
+
+
+def aggregate_pair(quotes: dict, now: datetime = None, method: str = None):
+    """
+    Сводит котировки одной пары {имя источника: (котировка, вес)} в курс.
+
+    Отбрасываются котировки старше MAX_QUOTE_AGE_SECONDS источника,
+    а при трёх и более оставшихся — отклонившиеся от медианы сильнее
+    OUTLIER_MAX_DEVIATION. Оставшиеся сводятся медианой или средним,
+    взвешенным по весам источников. Возвращает запись курса с полем
+    provenance (метод, учтённые и отброшенные котировки) или None,
+    если учитывать нечего.
+    """
+    now = now or datetime.now(timezone.utc)
+    method = method or config.AGGREGATION_METHOD
+    accepted, rejected = [], []
+    for name, (quote, weight) in sorted(quotes.items()):
+        max_age = config.MAX_QUOTE_AGE_SECONDS.get(name, config.DEFAULT_MAX_QUOTE_AGE_SECONDS)
+        entry = {"source": quote["source"], "rate": quote["rate"], "as_of": quote.get("as_of") or quote["updated_at"]}
+        if _age_seconds(quote, now) > max_age:
+            rejected.append({**entry, "reason": "stale"})
+        else:
+            accepted.append((entry, weight))
+
+    if len(accepted) >= 3:
+        median = statistics.median(e["rate"] for e, _ in accepted)
+        kept = []
+        for entry, weight in accepted:
+            if abs(entry["rate"] - median) > config.OUTLIER_MAX_DEVIATION * abs(median):
+                rejected.append({**entry, "reason": "outlier"})
+            else:
+                kept.append((entry, weight))
+        accepted = kept
+    if not accepted:
+        return None
+
+    rates = [e["rate"] for e, _ in accepted]
+    if len(accepted) == 1:
+        method, rate = "single", rates[0]
+    elif method == "weighted":
+        total = sum(w for _, w in accepted)
+        rate = sum(e["rate"] * w for e, w in accepted) / total
+    else:
+        method, rate = "median", statistics.median(rates)
+    return {
+        "rate": rate,
+        "updated_at": now.isoformat(),
+        "source": ", ".join(e["source"] for e, _ in accepted),
+        "provenance": {
+            "method": method,
+            "quotes": [e for e, _ in accepted],
+            "rejected": rejected,
+        },
+    }
@@ -0,0 +1,94 @@
+"""
+Фоновое обновление курсов для stale-while-revalidate.
+
+Читатель устаревшего snapshot'а вызывает refresh_in_background():
+обновление идёт в отдельном процессе (python -m ...refresh), читатель
+сразу продолжает со старыми курсами. Дедупликация — через lock-файл
+рядом с rates.json: процесс обновления держит на нём flock, а mtime
+файла — время последней попытки, поэтому параллельные читатели
+(в том числе из разных процессов) не запускают второе обновление
+и не повторяют неудачное чаще раза в retry_seconds.
+"""
+import fcntl
+import json
+import os
+import subprocess
+import sys
+import time
+from dataclasses import fields
+
+from .config import ParserConfig, config
+from ..core.logging_config import get_logger
+
+logger = get_logger("parser")
+
+_PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _overrides() -> dict:
+    """Параметры config, изменённые в этом процессе (пути данных, URL источников) — для процесса обновления"""
+    defaults = ParserConfig()
+    return {
+        f.name: getattr(config, f.name) for f in fields(config)
+        if getattr(config, f.name) != getattr(defaults, f.name)
+    }
+
+
+def lock_path() -> str:
+    return config.RATES_FILE_PATH + ".refresh.lock"
+
+
+def refresh_in_background(retry_seconds: float) -> bool:
+    """
+    Запускает процесс обновления курсов и сразу возвращает управление.
+    Не запускает, если обновление уже идёт или последняя попытка была
+    меньше retry_seconds назад. True — процесс запущен.
+    """
+    path = lock_path()
+    try:
+        if time.time() - os.path.getmtime(path) < retry_seconds:
+            return False
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False  # обновление уже идёт
+        try:
+            # повторная проверка под блокировкой: попытку мог только что отметить другой читатель
+            if time.time() - os.path.getmtime(path) < retry_seconds and os.path.getsize(path):
+                return False
+            with open(path, "w") as stamp:
+                stamp.write(str(time.time()))
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, (_PACKAGE_ROOT, env.get("PYTHONPATH"))))
+    log_file = os.path.join(os.path.dirname(path) or ".", "rates_refresh.log")
+    with open(log_file, "ab") as log:
+        subprocess.Popen(
+            [sys.executable, "-m", __name__, json.dumps(_overrides())],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+            env=env, start_new_session=True,
+        )
+    logger.info("Rates are stale: background refresh started")
+    return True
+
+
+def main():
+    for key, value in (json.loads(sys.argv[1]) if len(sys.argv) > 1 else {}).items():
+        setattr(config, key, value)
+    with open(lock_path(), "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return  # курсы уже обновляет другой процесс
+        from .updater import RatesUpdater
+        RatesUpdater().run_update()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,181 @@
+import fcntl
 import json
 import os
+from contextlib import contextmanager
 from shutil import move
 from datetime import datetime
 from .config import config
+from ..core import metrics
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".jsonl"
+
 
 class RatesStorage:
     def __init__(self):
+        # exchange_rates.json — старый формат (JSON-массив), только для миграции
         self.history_file = config.HISTORY_FILE_PATH
+        self.history_dir = config.HISTORY_DIR_PATH
+        self.segment_max_bytes = config.HISTORY_SEGMENT_MAX_BYTES
         self.rates_file = config.RATES_FILE_PATH
+        self.confirmations_file = config.CONFIRMATIONS_FILE_PATH
 
+    # ===== История курсов (append-only JSON Lines) =====
     def save_history(self, pair_id, record):
-        history = []
-        if os.path.exists(self.history_file):
-            with open(self.history_file, "r", encoding="utf-8") as f:
-                content = f.read().strip()
-                if content:
-                    history = json.loads(content)
-        history.append(record)
-        tmp_file = self.history_file + ".tmp"
+        self.save_history_batch([record])
+
+    @metrics.timed("rates_storage_write_seconds", op="history")
+    def save_history_batch(self, records):
+        """
+        Дописывает пачку записей в активный сегмент одним вызовом write.
+        Стоимость не зависит от размера уже накопленной истории.
+        Недописанная (оборванная) последняя строка отбрасывается
+        при чтении и обрезается перед следующей записью.
+        Выбор сегмента, обрезка хвоста и запись идут под межпроцессной
+        блокировкой: иначе другой процесс может обрезать чужую строку,
+        пока она ещё дописывается.
+        """
+        if not records:
+            return
+        self.ensure_history_dir()
+        payload = "".join(
+            json.dumps(record, ensure_ascii=False) + "\n" for record in records
+        ).encode("utf-8")
+
+        with self._history_lock():
+            path = self._active_segment(len(payload))
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                self._repair_tail(fd)
+                view = memoryview(payload)
+                while view:
+                    written = os.write(fd, view)
+                    view = view[written:]
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    @contextmanager
+    def _history_lock(self):
+        """Эксклюзивная advisory-блокировка (fcntl) истории — файл рядом с каталогом"""
+        os.makedirs(os.path.dirname(self.history_dir) or ".", exist_ok=True)
+        with open(self.history_dir + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def list_segments(self):
+        """Пути сегментов истории в порядке записи"""
+        if not os.path.isdir(self.history_dir):
+            return []
+        names = sorted(
+            name for name in os.listdir(self.history_dir)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+        return [os.path.join(self.history_dir, name) for name in names]
+
+    def iter_history(self):
+        """Потоково отдаёт записи истории, не загружая её в память целиком"""
+        if not os.path.isdir(self.history_dir):
+            yield from self._load_legacy_history()
+            return
+        for path in self.list_segments():
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # оборванная запись
+                    yield json.loads(line)
+
+    def segment_path(self, number):
+        return os.path.join(
+            self.history_dir, f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}"
+        )
+
+    def _active_segment(self, incoming_size):
+        segments = self.list_segments()
+        if not segments:
+            return self.segment_path(1)
+        last = segments[-1]
+        size = os.path.getsize(last)
+        if size and size + incoming_size > self.segment_max_bytes:
+            number = int(os.path.basename(last)[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            return self.segment_path(number + 1)
+        return last
+
+    @staticmethod
+    def _repair_tail(fd):
+        size = os.fstat(fd).st_size
+        if size == 0 or os.pread(fd, 1, size - 1) == b"\n":
+            return
+        # ищем последний перевод строки с конца файла блоками
+        pos = size
+        chunk = 4096
+        while pos > 0:
+            start = max(0, pos - chunk)
+            data = os.pread(fd, pos - start, start)
+            idx = data.rfind(b"\n")
+            if idx != -1:
+                os.ftruncate(fd, start + idx + 1)
+                return
+            pos = start
+        os.ftruncate(fd, 0)
+
+    def ensure_history_dir(self):
+        if os.path.isdir(self.history_dir):
+            return
+        with self._history_lock():
+            # каталог мог создать другой процесс, пока мы ждали блокировку
+            if os.path.isdir(self.history_dir):
+                return
+            legacy = self._load_legacy_history()
+            tmp_dir = self.history_dir + ".tmp"
+            os.makedirs(tmp_dir, exist_ok=True)
+            if legacy:
+                # одноразовый перенос старого JSON-массива в первый сегмент
+                with open(os.path.join(tmp_dir, os.path.basename(self.segment_path(1))),
+                          "w", encoding="utf-8") as f:
+                    for record in legacy:
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_dir, self.history_dir)
+
+    def _load_legacy_history(self):
+        if not os.path.exists(self.history_file):
+            return []
+        with open(self.history_file, "r", encoding="utf-8") as f:
+            content = f.read().strip()
+        return json.loads(content) if content else []
+
+    # ===== Snapshot текущих курсов =====
+    def load_snapshot(self) -> dict:
+        if not os.path.exists(self.rates_file):
+            return {"pairs": {}, "last_refresh": None}
+        with open(self.rates_file, "r", encoding="utf-8") as f:
+            content = f.read().strip()
+        return json.loads(content) if content else {"pairs": {}, "last_refresh": None}
+
+    def load_confirmations(self) -> dict:
+        if not os.path.exists(self.confirmations_file):
+            return {"last_confirmed": None, "pairs": {}}
+        with open(self.confirmations_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @metrics.timed("rates_storage_write_seconds", op="confirmations")
+    def save_confirmations(self, confirmed_at: str, pairs: list):
+        """Отмечает, что курсы пар подтверждены источником в confirmed_at"""
+        data = self.load_confirmations()
+        data["last_confirmed"] = confirmed_at
+        for pair in pairs:
+            data["pairs"][pair] = confirmed_at
+        tmp_file = self.confirmations_file + ".tmp"
         with open(tmp_file, "w", encoding="utf-8") as f:
-            json.dump(history, f, indent=2)
-        move(tmp_file, self.history_file)
+            json.dump(data, f)
+        move(tmp_file, self.confirmations_file)
 
+    @metrics.timed("rates_storage_write_seconds", op="snapshot")
     def update_rates_snapshot(self, rates_dict):
         snapshot = {"pairs": {}, "last_refresh": datetime.utcnow().isoformat() + "Z"}
         for pair, info in rates_dict.items():
@@ -29,4 +183,4 @@ class RatesStorage:
         tmp_file = self.rates_file + ".tmp"
         with open(tmp_file, "w", encoding="utf-8") as f:
             json.dump(snapshot, f, indent=2)
-        move(tmp_file, self.rates_file)
\ No newline at end of file
+        move(tmp_file, self.rates_file)
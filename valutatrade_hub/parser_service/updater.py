@@ -1,35 +1,144 @@
-import logging
-from .api_clients import CoinGeckoClient, ExchangeRateApiClient
+import time
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+
+from .api_clients import default_clients
+from .config import config
+from .providers import ProviderRegistry, aggregate_pair
 from .storage import RatesStorage
+from ..core import metrics
 from ..core.logging_config import get_logger
 
 logger = get_logger("parser")
 
 class RatesUpdater:
-    def __init__(self, clients=None):
-        self.clients = clients or [CoinGeckoClient(), ExchangeRateApiClient()]
+    """
+    Опрос источников и агрегация курсов. Пара, которую покрывают несколько
+    источников, сводится из их котировок (providers.aggregate_pair),
+    а не берётся у ответившего последним. Последние котировки каждого
+    источника хранятся в памяти: в демоне источник, опрошенный в этом
+    цикле, сводится со свежими котировками остальных.
+    """
+
+    def __init__(self, clients=None, registry: ProviderRegistry = None):
+        self.registry = registry or ProviderRegistry(clients or default_clients())
+        self.clients = self.registry.clients
         self.storage = RatesStorage()
+        # имена клиентов, не ответивших при последнем опросе
+        self.failed = []
+        # {имя источника: {пара: котировка}} — последний ответ каждого источника
+        self.quotes = {}
+
+    def fetch_all(self, clients=None, pairs=None) -> dict:
+        """
+        Опрашивает клиентов (по умолчанию всех) параллельно и возвращает
+        сведённые курсы пар, по которым пришли котировки. Каждый клиент
+        ограничен своим deadline: медленный источник пропускается
+        и не задерживает остальных.
+        """
+        clients = self.clients if clients is None else clients
+        self.failed = []
+        if not clients:
+            return {}
+        executor = ThreadPoolExecutor(max_workers=len(clients), thread_name_prefix="rates")
+        started = time.monotonic()
+        received = set()
+        try:
+            futures = []
+            for client in clients:
+                logger.info(f"Fetching from {client.__class__.__name__}...")
+                fetch = metrics.timed("rates_fetch_seconds", source=client.name or client.__class__.__name__)(
+                    client.fetch_rates)
+                futures.append((client, executor.submit(fetch, pairs)))
+
+            for client, future in futures:
+                name = client.__class__.__name__
+                remaining = client.deadline - (time.monotonic() - started)
+                try:
+                    rates = future.result(timeout=max(0.0, remaining))
+                    if pairs is not None:
+                        rates = {pair: info for pair, info in rates.items() if pair in pairs}
+                    logger.info(f"{name}: OK ({len(rates)} rates)")
+                    self.quotes.setdefault(client.name or name, {}).update(rates)
+                    received.update(rates)
+                except FuturesTimeoutError:
+                    self.failed.append(client.name or name)
+                    logger.error(f"Failed to fetch from {name}: deadline {client.deadline}s exceeded")
+                except Exception as e:
+                    self.failed.append(client.name or name)
+                    logger.error(f"Failed to fetch from {name}: {e}")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return self.aggregate(received)
+
+    def aggregate(self, pairs) -> dict:
+        """Сводит котировки всех источников по каждой паре из pairs"""
+        weights = {client.name: getattr(client, "weight", 1.0) for client in self.clients}
+        now = datetime.now(timezone.utc)
+        result = {}
+        for pair in sorted(pairs):
+            quotes = {
+                source: (rates[pair], weights.get(source, 1.0))
+                for source, rates in self.quotes.items() if pair in rates
+            }
+            info = aggregate_pair(quotes, now)
+            if info is None:
+                logger.warning(f"{pair}: all quotes rejected ({', '.join(sorted(quotes))})")
+                continue
+            result[pair] = info
+        return result
+
+    @staticmethod
+    def is_changed(pair: str, old_rate, new_rate) -> bool:
+        """Изменился ли курс сильнее порога пары (RATE_EPSILONS / DEFAULT_RATE_EPSILON)"""
+        if old_rate is None:
+            return True
+        kind, epsilon = config.RATE_EPSILONS.get(pair, config.DEFAULT_RATE_EPSILON)
+        diff = abs(new_rate - old_rate)
+        if kind == "abs":
+            return diff > epsilon
+        return diff > epsilon * abs(old_rate)
+
+    def run_update(self, clients=None, sources=None, pairs=None) -> bool:
+        """
+        Опрашивает клиентов и вливает сведённые курсы в snapshot. Без явного
+        списка clients реестр выбирает минимальный набор источников для
+        sources (имена, --source) и pairs (подмножество пар).
+        В историю и snapshot попадают только пары, изменившиеся сильнее
+        порога; для остальных обновляется лишь время подтверждения.
+        Возвращает True, если snapshot был перезаписан.
+        """
+        if clients is None:
+            clients = self.registry.select(pairs, sources)
+        all_rates = self.fetch_all(clients, pairs)
+        if not all_rates:
+            logger.info("Update finished. No rates received")
+            return False
+        snapshot = self.storage.load_snapshot()
+        pairs = snapshot.get("pairs", {})
+
+        changed = {
+            pair: info for pair, info in all_rates.items()
+            if self.is_changed(pair, pairs.get(pair, {}).get("rate"), info["rate"])
+        }
+        confirmed_at = max(info["updated_at"] for info in all_rates.values())
+        self.storage.save_confirmations(confirmed_at, list(all_rates))
+        if not changed:
+            logger.info(f"Update finished. No rate changes ({len(all_rates)} rates confirmed)")
+            return False
 
-    def run_update(self):
-        all_rates = {}
-        for client in self.clients:
-            name = client.__class__.__name__
-            try:
-                logger.info(f"Fetching from {name}...")
-                rates = client.fetch_rates()
-                logger.info(f"{name}: OK ({len(rates)} rates)")
-                all_rates.update(rates)
-            except Exception as e:
-                logger.error(f"Failed to fetch from {name}: {e}")
-
-        # запись истории и snapshot
-        for pair, info in all_rates.items():
+        # запись истории (одной пачкой) и snapshot — только изменившиеся пары
+        records = []
+        for pair, info in changed.items():
             pair_id = f"{pair}_{info['updated_at']}"
-            self.storage.save_history(pair_id, {
+            records.append({
                 "id": pair_id,
                 "from_currency": pair.split("_")[0],
                 "to_currency": pair.split("_")[1],
                 **info
             })
-        self.storage.update_rates_snapshot(all_rates)
-        logger.info(f"Update finished. Total rates: {len(all_rates)}")
\ No newline at end of file
+        self.storage.save_history_batch(records)
+        pairs.update(changed)
+        self.storage.update_rates_snapshot(pairs)
+        logger.info(f"Update finished. Total rates: {len(all_rates)}, changed: {len(changed)}")
+        return True